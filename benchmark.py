@@ -0,0 +1,354 @@
+"""Usage:
+    benchmark.py [--sizes=<sizes>] [--only=<names>] [--repeat=<n>]
+                 [--seed=<s>] [--history=<path>] [--baseline=<path>]
+                 [--tolerance=<t>] [--min-seconds=<s>] [--save-baseline]
+    benchmark.py list
+
+   Time the planning tools at a range of sizes, append the results to a
+   history file, and compare them with a stored baseline, e.g.:
+
+    python benchmark.py --save-baseline
+    (make changes)
+    python benchmark.py
+
+   Each benchmark is timed --repeat times, keeping the fastest run, then run
+   once more under a Profiler for its peak memory. Sizes are item counts for
+   synthetic data from planning_tools.generate, or "samples" for the files in
+   sample_data. Sizes larger than a benchmark's limit are skipped, since
+   most benchmarks build a full matrix. To time parsing at larger sizes:
+
+    python benchmark.py --sizes=10000,50000 --only=cardsort-import
+
+   The exit status is 1 if any result is slower, or uses more memory, than
+   its baseline by more than --tolerance. Times under --min-seconds aren't
+   compared, since timer and scheduling noise swamps them.
+
+   Options:
+    --sizes=<sizes>    comma-separated sizes [default: samples,500,2000].
+    --only=<names>     comma-separated benchmarks to run, see "list".
+    --repeat=<n>       timed runs of each benchmark [default: 3].
+    --seed=<s>         random seed for synthetic data [default: 0].
+    --history=<path>   JSON file of every run's results
+                       [default: benchmark_history.json].
+    --baseline=<path>  JSON file of the results to compare with
+                       [default: benchmark_baseline.json].
+    --tolerance=<t>    allowed slowdown or memory growth, as a fraction of
+                       the baseline [default: 0.25].
+    --min-seconds=<s>  shortest time to compare [default: 0.05].
+    --save-baseline    store this run's results as the baseline.
+"""
+import datetime
+import importlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy
+from docopt import docopt
+
+from planning_tools import CardSort, InsightCluster, Interactions, Matrix, \
+    Profiler, Similarity, SyntheticMatrix
+from planning_tools.daemon import PRELOAD
+from planning_tools.generate import write_cardsort, write_interactions, \
+    write_similarity
+
+SAMPLE_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'sample_data')
+
+BENCHMARKS = {}
+
+
+def benchmark(name, limit):
+    """Register a benchmark.
+
+    Args:
+        name (str): the benchmark name.
+        limit (int): the largest size to run.
+
+    Returns:
+        a decorator for a function of (size, seed) that prepares the data and
+        returns a function of no arguments to time. size is an int, or
+        'samples'. The function may return None to skip a size.
+    """
+    def register(f):
+        BENCHMARKS[name] = (f, limit)
+        return f
+    return register
+
+
+def generate(write, n, seed, **kwargs):
+    """Get synthetic data from a planning_tools.generate function."""
+    f = io.StringIO()
+    write(f, items=n, clusters=max(2, n // 20), seed=seed, **kwargs)
+    return f.getvalue()
+
+
+def get_matrix(n, seed):
+    """Get a symmetric similarity matrix of n items in planted clusters."""
+    m = Matrix()
+    if n == 'samples':
+        c = CardSort()
+        with open(os.path.join(SAMPLE_DATA, 'beer_flavor_wheel.csv')) as f:
+            c.import_from_csv(f)
+        m.import_from_source(c)
+    else:
+        m.import_from_source(
+            SyntheticMatrix(n, max(2, n // 20), seed=seed))
+    return m
+
+
+def read_sample(name):
+    with open(os.path.join(SAMPLE_DATA, name)) as f:
+        return f.read()
+
+
+@benchmark('cardsort-import', 100000)
+def bench_cardsort_import(n, seed):
+    text = read_sample('beer_flavor_wheel.csv') if n == 'samples' else \
+        generate(write_cardsort, n, seed)
+    return lambda: CardSort().import_from_csv(io.StringIO(text))
+
+
+@benchmark('cardsort-matrix', 10000)
+def bench_cardsort_matrix(n, seed):
+    c = CardSort()
+    c.import_from_csv(io.StringIO(
+        read_sample('beer_flavor_wheel.csv') if n == 'samples' else
+        generate(write_cardsort, n, seed)))
+    return lambda: Matrix().import_from_source(c)
+
+
+@benchmark('similarity-import', 100000)
+def bench_similarity_import(n, seed):
+    text = read_sample('nutrition_information.csv') if n == 'samples' else \
+        generate(write_similarity, n, seed)
+    return lambda: Similarity().import_from_csv(io.StringIO(text))
+
+
+@benchmark('similarity-matrix', 10000)
+def bench_similarity_matrix(n, seed):
+    s = Similarity()
+    s.import_from_csv(io.StringIO(
+        read_sample('nutrition_information.csv') if n == 'samples' else
+        generate(write_similarity, n, seed)))
+    return lambda: Matrix().import_from_source(s)
+
+
+@benchmark('interactions', 100)
+def bench_interactions(n, seed):
+    if n == 'samples':
+        return None  # there is no sample interactions data.
+    i = Interactions()
+    i.import_from_csv(io.StringIO(generate(write_interactions, n, seed)))
+    return i.get_interactions
+
+
+@benchmark('matrix-write-csv', 5000)
+def bench_matrix_write_csv(n, seed):
+    m = get_matrix(n, seed)
+    return lambda: m.write_csv(io.StringIO())
+
+
+@benchmark('matrix-read-csv', 5000)
+def bench_matrix_read_csv(n, seed):
+    text = read_sample('fruits_and_vegetables.csv') if n == 'samples' else \
+        get_matrix(n, seed).csv()
+    return lambda: Matrix().import_from_csv(io.StringIO(text))
+
+
+@benchmark('matrix-npy', 10000)
+def bench_matrix_npy(n, seed):
+    m = get_matrix(n, seed)
+
+    def run():
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'matrix.npy')
+            m.export_npy(path)
+            Matrix().import_from_npy(path, None)
+    return run
+
+
+@benchmark('cluster-average', 10000)
+def bench_cluster_average(n, seed):
+    m = get_matrix(n, seed)
+    return lambda: m.cluster('average')
+
+
+@benchmark('insight', 5000)
+def bench_insight(n, seed):
+    data = get_matrix(n, seed).data
+    return lambda: InsightCluster(data).cluster()
+
+
+def run_benchmark(name, size, repeat, seed):
+    """Time a benchmark and measure its peak memory.
+
+    Returns:
+        dict: benchmark, size, seconds (the fastest of repeat runs) and
+        peak_memory in bytes, or None if the size was skipped.
+    """
+    f, limit = BENCHMARKS[name]
+    if size != 'samples' and size > limit:
+        return None
+    times = []
+    for _ in range(repeat):
+        # new data for each run, since some benchmarks change it in place.
+        run = f(size, seed)
+        if run is None:
+            return None
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    run = f(size, seed)
+    with Profiler() as profiler:
+        run()
+    return {
+        'benchmark': name,
+        'size': size,
+        'seconds': min(times),
+        'peak_memory': profiler.report()['peak_memory']
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance, min_seconds=0.0):
+    """Compare results with a baseline.
+
+    Args:
+        results (list): result dicts, see run_benchmark().
+        baseline (dict): a run from the history, or None.
+        tolerance (float): allowed growth, as a fraction of the baseline.
+        min_seconds (float): don't flag slowdowns of results that are
+                             faster than this in both runs.
+
+    Returns:
+        list: a (seconds ratio, memory ratio, regressed) tuple for each
+        result, with None ratios where the baseline has no such result.
+    """
+    old = {}
+    if baseline is not None:
+        old = {(r['benchmark'], r['size']): r for r in baseline['results']}
+    comparisons = []
+    for r in results:
+        b = old.get((r['benchmark'], r['size']))
+        if b is None:
+            comparisons.append((None, None, False))
+            continue
+        seconds = r['seconds'] / b['seconds'] if b['seconds'] else None
+        memory = r['peak_memory'] / b['peak_memory'] \
+            if b['peak_memory'] else None
+        slower = seconds is not None and seconds > 1 + tolerance and \
+            max(r['seconds'], b['seconds']) >= min_seconds
+        larger = memory is not None and memory > 1 + tolerance
+        comparisons.append((seconds, memory, slower or larger))
+    return comparisons
+
+
+def format_results(results, comparisons):
+    """Format results and their comparisons with the baseline as a table."""
+    def ratio(value):
+        return '-' if value is None else '{:+.0%}'.format(value - 1)
+
+    rows = [('benchmark', 'size', 'seconds', 'peak MB', 'time', 'memory',
+             '')]
+    for r, (seconds, memory, regressed) in zip(results, comparisons):
+        rows.append((
+            r['benchmark'],
+            str(r['size']),
+            '{:.4f}'.format(r['seconds']),
+            '{:.1f}'.format(r['peak_memory'] / 2 ** 20),
+            ratio(seconds),
+            ratio(memory),
+            'REGRESSION' if regressed else ''
+        ))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return ''.join(
+        '  '.join([row[0].ljust(widths[0])] +
+                  [v.rjust(w) for v, w in zip(row[1:6], widths[1:6])] +
+                  [row[6]]).rstrip() + '\n'
+        for row in rows)
+
+
+def load_json(path, default=None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
+
+
+def main(argv=None):
+    arguments = docopt(__doc__, argv)
+    if arguments['list']:
+        for name, (_, limit) in BENCHMARKS.items():
+            sys.stdout.write('{}  (up to {} items)\n'.format(name, limit))
+        return
+
+    sizes = [s if s == 'samples' else int(s)
+             for s in arguments['--sizes'].split(',')]
+    names = arguments['--only'].split(',') if arguments['--only'] else \
+        list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        sys.exit('unknown benchmarks: ' + ', '.join(unknown))
+
+    # import libraries first, so the first benchmark doesn't time them.
+    for module in PRELOAD:
+        importlib.import_module(module)
+
+    results = []
+    for name in names:
+        for size in sizes:
+            result = run_benchmark(name, size, int(arguments['--repeat']),
+                                   int(arguments['--seed']))
+            if result is not None:
+                results.append(result)
+                sys.stderr.write('{} {}: {:.4f}s\n'.format(
+                    name, size, result['seconds']))
+
+    run = {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'seed': int(arguments['--seed']),
+        'results': results
+    }
+    history = load_json(arguments['--history'], [])
+    history.append(run)
+    write_json(arguments['--history'], history)
+
+    comparisons = compare(results, load_json(arguments['--baseline']),
+                          float(arguments['--tolerance']),
+                          float(arguments['--min-seconds']))
+    sys.stdout.write(format_results(results, comparisons))
+    if arguments['--save-baseline']:
+        write_json(arguments['--baseline'], run)
+    elif any(regressed for _, _, regressed in comparisons):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
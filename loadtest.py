@@ -0,0 +1,201 @@
+"""Usage:
+    loadtest.py [--processes=<n>] [--requests=<n>] [--reads=<f>] [--seed=<s>]
+                [--url=<url>] [--output=<path>]
+
+   Measure the web app's throughput and latency under concurrent load, like
+   a room full of phones comparing pairs while a projector shows the matrix.
+
+   Each process sends --requests requests, one at a time: a comparison
+   posted to /compare, or, for a fraction --reads of them, a GET of /json.
+   By default the processes call the app in-process through Flask's test
+   client, against a new database in a temporary directory, so the results
+   measure the app and sqlite without a web server. To measure a running
+   server instead, e.g. under uwsgi:
+
+    python loadtest.py --url=http://localhost:8000
+
+   A server's labels are read from /json, and its database is not reset.
+
+   Options:
+    --processes=<n>  concurrent clients, one per process [default: 5].
+    --requests=<n>   requests per client [default: 200].
+    --reads=<f>      fraction of requests that read /json [default: 0.1].
+    --seed=<s>       random seed for the requests [default: 0].
+    --url=<url>      base URL of a running server.
+    --output=<path>  write the results as JSON, as well as a table.
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+from docopt import docopt
+
+
+class TestClient:
+    """Send requests to the app in this process."""
+    def __init__(self):
+        import web
+        self.client = web.app.test_client()
+
+    def get(self, path):
+        return self.client.get(path).status_code
+
+    def post(self, path, data):
+        return self.client.post(path, data=data).status_code
+
+
+class HTTPClient:
+    """Send requests to a running server."""
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def get(self, path):
+        with urllib.request.urlopen(self.url + path) as response:
+            response.read()
+            return response.status
+
+    def post(self, path, data):
+        body = urllib.parse.urlencode(data).encode('utf-8')
+        with urllib.request.urlopen(self.url + path, body) as response:
+            response.read()
+            return response.status
+
+
+def get_client(url):
+    return TestClient() if url is None else HTTPClient(url)
+
+
+def get_labels(url):
+    """Get the labels to compare, resetting the database unless this is a
+    running server."""
+    if url is None:
+        client = TestClient().client
+        client.get('/reset')
+        return client.get('/json').get_json()['labels']
+    with urllib.request.urlopen(url.rstrip('/') + '/json') as response:
+        return json.load(response)['labels']
+
+
+def run_client(url, labels, requests, reads, seed):
+    """Send requests one at a time and time each one.
+
+    Returns:
+        dict: start and stop times, and a list of (kind, seconds, ok) tuples
+        where kind is 'write' or 'read'.
+    """
+    client = get_client(url)
+    rng = random.Random(seed)
+    results = []
+    start = time.time()
+    for _ in range(requests):
+        if rng.random() < reads:
+            kind = 'read'
+            request = lambda: client.get('/json')
+        else:
+            kind = 'write'
+            label_one, label_two = rng.sample(labels, 2)
+            data = {
+                'label_one': label_one,
+                'label_two': label_two,
+                'comparison': rng.randint(1, 5)
+            }
+            request = lambda: client.post('/compare', data)
+        t = time.perf_counter()
+        try:
+            ok = request() == 200
+        except OSError:
+            ok = False
+        results.append((kind, time.perf_counter() - t, ok))
+    return {'start': start, 'stop': time.time(), 'results': results}
+
+
+def summarize(runs):
+    """Get throughput and latency for each kind of request.
+
+    Args:
+        runs (list): dicts from run_client().
+
+    Returns:
+        dict: for 'write', 'read' and 'all', the number of requests, errors,
+        requests per second over the whole test, and p50, p99 and max
+        latency in seconds.
+    """
+    seconds = max(r['stop'] for r in runs) - min(r['start'] for r in runs)
+    results = [result for r in runs for result in r['results']]
+    summary = {}
+    for kind in ('write', 'read', 'all'):
+        times = numpy.array([t for k, t, _ in results
+                             if kind in (k, 'all')])
+        if not len(times):
+            continue
+        summary[kind] = {
+            'requests': len(times),
+            'errors': sum(1 for k, _, ok in results
+                          if kind in (k, 'all') and not ok),
+            'per_second': len(times) / seconds,
+            'p50_seconds': float(numpy.percentile(times, 50)),
+            'p99_seconds': float(numpy.percentile(times, 99)),
+            'max_seconds': float(times.max())
+        }
+    return summary
+
+
+def format_summary(summary):
+    rows = [('requests', 'count', 'errors', 'per second', 'p50 ms', 'p99 ms',
+             'max ms')]
+    for kind, s in summary.items():
+        rows.append((
+            kind,
+            str(s['requests']),
+            str(s['errors']),
+            '{:.1f}'.format(s['per_second']),
+            '{:.1f}'.format(s['p50_seconds'] * 1000),
+            '{:.1f}'.format(s['p99_seconds'] * 1000),
+            '{:.1f}'.format(s['max_seconds'] * 1000)
+        ))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return ''.join(
+        '  '.join([row[0].ljust(widths[0])] +
+                  [v.rjust(w) for v, w in zip(row[1:], widths[1:])]) + '\n'
+        for row in rows)
+
+
+def main(argv=None):
+    arguments = docopt(__doc__, argv)
+    url = arguments['--url']
+    processes = int(arguments['--processes'])
+    seed = int(arguments['--seed'])
+
+    with tempfile.TemporaryDirectory() as d:
+        if url is None:
+            # set before web is imported, here and in spawned processes.
+            os.environ['PLANNING_TOOLS_DATABASE'] = \
+                os.path.join(d, 'insightmatrix.db')
+        labels = get_labels(url)
+        with ProcessPoolExecutor(processes) as executor:
+            futures = [
+                executor.submit(run_client, url, labels,
+                                int(arguments['--requests']),
+                                float(arguments['--reads']), seed + i)
+                for i in range(processes)
+            ]
+            runs = [f.result() for f in futures]
+
+    summary = summarize(runs)
+    sys.stdout.write(format_summary(summary))
+    if arguments['--output']:
+        with open(arguments['--output'], 'w') as f:
+            json.dump({'processes': processes, 'url': url,
+                       'results': summary}, f, indent=2)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,37 @@
-from .classes import CardSort, Interactions, Matrix, Similarity
+import importlib
+
+# Classes are imported from their submodules the first time they are used
+# (PEP 562), so importing the package stays fast.
+_submodules = {
+    'ApproximateCluster': 'approximate',
+    'Cache': 'cache',
+    'CancellationToken': 'progress',
+    'Cancelled': 'progress',
+    'CardSort': 'cardsort',
+    'Consensus': 'consensus',
+    'DisjointSet': 'approximate',
+    'InsightCluster': 'insight',
+    'Interactions': 'interactions',
+    'Matrix': 'matrix',
+    'PermutationTest': 'permutation',
+    'Profiler': 'profiling',
+    'Similarity': 'similarity',
+    'SimilarityGraph': 'graph',
+    'SyntheticMatrix': 'generate'
+}
+
+__all__ = sorted(_submodules)
+
+
+def __getattr__(name):
+    if name in _submodules:
+        module = importlib.import_module('.' + _submodules[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(
+        'module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
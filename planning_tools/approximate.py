@@ -0,0 +1,234 @@
+import csv
+import io
+import numpy
+
+
+class DisjointSet:
+    """A union-find structure for grouping items.
+
+    Notes:
+        Used to collapse near-duplicate items before clustering: any two
+        items at least as similar as a threshold end up in the same group,
+        along with everything they are linked to in turn.
+
+    References:
+        Disjoint-set data structure:
+        https://en.wikipedia.org/wiki/Disjoint-set_data_structure
+    """
+
+    def __init__(self, n):
+        """Constructor
+
+        Args:
+            n (int): number of items, each starting in a group of its own.
+        """
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, i):
+        """Get the representative of an item's group.
+
+        Args:
+            i (int): an item.
+
+        Returns:
+            int: the group's representative item.
+        """
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, a, b):
+        """Merge the groups of two items.
+
+        Args:
+            a (int): an item.
+            b (int): an item.
+        """
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+
+    def get_groups(self):
+        """Get all groups, e.g.: [[0, 3], [1], [2, 4, 5]]
+
+        Returns:
+            list: lists of items, each sorted, ordered by their first item.
+        """
+        groups = {}
+        for i in range(len(self.parent)):
+            groups.setdefault(self.find(i), []).append(i)
+        return sorted(groups.values())
+
+    def import_from_source(self, source, threshold, block_cells=2 ** 24):
+        """Merge the groups of every pair of items at least as similar as a
+        threshold.
+
+        Notes:
+            Pairs are scanned one block of rows at a time, comparing each row
+            only with the rows after it, so memory stays at one block of
+            similarity scores.
+
+        Args:
+            source: a CardSort, Similarity or Matrix object.
+            threshold (float): minimum similarity for near-duplicates.
+            block_cells (int): similarity scores to compute at once.
+        """
+        n = len(self.parent)
+        block_size = max(1, block_cells // max(n, 1))
+        for start in range(0, n, block_size):
+            stop = min(n, start + block_size)
+            scores = source.get_similarity_block(
+                numpy.arange(start, stop), numpy.arange(start, n))
+            y, x = numpy.nonzero(numpy.triu(scores >= threshold, 1))
+            for a, b in zip((y + start).tolist(), (x + start).tolist()):
+                self.union(a, b)
+
+
+class ApproximateCluster:
+    """Cluster very large item sets without building a full matrix.
+
+    Notes:
+        Exact hierarchical clustering needs the whole similarity matrix plus a
+        condensed distance matrix, which doesn't fit in memory past a few tens
+        of thousands of items. This class works from any source with
+        get_elements() and get_similarity_block() methods (CardSort,
+        Similarity or Matrix):
+
+        1) draw a random sample of items and describe every sampled item by
+           its similarity to each item in the sample.
+        2) cluster the sample exactly and cut the tree into n_clusters.
+        3) stream the remaining items through in blocks, describing each one
+           by its similarity to the sample, and assign it to the nearest
+           cluster centroid.
+        4) order the clusters by the sample dendrogram, and order the items
+           within each cluster by clustering them exactly (or by distance to
+           the centroid when a cluster is larger than the sample).
+
+        Memory use is bounded by sample_size x max(block_size, cluster size)
+        rather than by the square of the number of items.
+    """
+
+    def __init__(self, source, linkage_method='complete', sample_size=1000,
+                 n_clusters=None, block_size=1024, seed=None):
+        """Constructor
+
+        Args:
+            source: a CardSort, Similarity or Matrix object.
+            linkage_method (str): see Matrix.cluster().
+            sample_size (int): number of items to cluster exactly.
+            n_clusters (int): number of clusters to cut the sample into,
+                              defaults to the square root of the sample size.
+            block_size (int): number of items to score at once.
+            seed (int): random seed for drawing the sample.
+        """
+        self.source = source
+        self.linkage_method = linkage_method
+        self.sample_size = sample_size
+        self.n_clusters = n_clusters
+        self.block_size = block_size
+        self.seed = seed
+
+        self.labels = []         # labels, in the new order.
+        self.order = None        # numpy.array of source indices.
+        self.assignments = None  # numpy.array, cluster for each source index.
+
+    def _profiles(self, indices, sample):
+        return self.source.get_similarity_block(indices, sample)
+
+    def _leaves(self, profiles):
+        from scipy.cluster.hierarchy import leaves_list, linkage
+
+        if len(profiles) < 2:
+            return numpy.arange(len(profiles))
+        return leaves_list(linkage(profiles, self.linkage_method))
+
+    def cluster(self):
+        """Cluster the source data, setting labels, order and assignments."""
+        from scipy.cluster.hierarchy import fcluster, leaves_list, linkage
+
+        elements = self.source.get_elements()
+        n = len(elements)
+        if n == 0:
+            self.order = numpy.array([], dtype=numpy.intp)
+            self.assignments = numpy.array([], dtype=numpy.intp)
+            self.labels = []
+            return
+
+        rng = numpy.random.default_rng(self.seed)
+        sample = numpy.sort(rng.choice(n, min(self.sample_size, n),
+                                       replace=False))
+
+        # cluster the sample exactly.
+        sample_profiles = self._profiles(sample, sample)
+        if len(sample) < 2:
+            sample_clusters = numpy.zeros(len(sample), dtype=numpy.intp)
+            sample_leaves = numpy.arange(len(sample))
+        else:
+            z = linkage(sample_profiles, self.linkage_method)
+            n_clusters = self.n_clusters or \
+                max(1, int(round(numpy.sqrt(len(sample)))))
+            sample_clusters = fcluster(z, n_clusters, 'maxclust') - 1
+            sample_leaves = leaves_list(z)
+
+        # number clusters in the order they appear in the sample dendrogram.
+        leaf_clusters = sample_clusters[sample_leaves]
+        _, first = numpy.unique(leaf_clusters, return_index=True)
+        appearance = leaf_clusters[numpy.sort(first)]
+        k = len(appearance)
+        rank = numpy.empty(sample_clusters.max() + 1, dtype=numpy.intp)
+        rank[appearance] = numpy.arange(k)
+        sample_clusters = rank[sample_clusters]
+
+        centroids = numpy.zeros((k, len(sample)))
+        numpy.add.at(centroids, sample_clusters, sample_profiles)
+        centroids /= numpy.bincount(sample_clusters, minlength=k)[:, None]
+        centroid_norms = (centroids ** 2).sum(axis=1)
+
+        # assign every item to its nearest centroid, one block at a time.
+        self.assignments = numpy.empty(n, dtype=numpy.intp)
+        for start in range(0, n, self.block_size):
+            block = numpy.arange(start, min(n, start + self.block_size))
+            profiles = self._profiles(block, sample)
+            distances = centroid_norms[None, :] - 2 * profiles @ centroids.T
+            self.assignments[block] = numpy.argmin(distances, axis=1)
+        self.assignments[sample] = sample_clusters
+
+        # order items within each cluster.
+        members = numpy.argsort(self.assignments, kind='stable')
+        bounds = numpy.cumsum(numpy.bincount(self.assignments, minlength=k))
+        order = []
+        for c, m in enumerate(numpy.split(members, bounds[:-1])):
+            if len(m) <= self.sample_size:
+                order.append(m[self._leaves(self._profiles(m, sample))])
+            else:
+                distances = numpy.empty(len(m))
+                for start in range(0, len(m), self.block_size):
+                    block = m[start:start + self.block_size]
+                    profiles = self._profiles(block, sample)
+                    distances[start:start + len(block)] = \
+                        ((profiles - centroids[c]) ** 2).sum(axis=1)
+                order.append(m[numpy.argsort(distances, kind='stable')])
+
+        self.order = numpy.concatenate(order)
+        self.labels = [elements[i] for i in self.order]
+
+    def csv(self):
+        """Get cluster assignments as CSV, one item per row in the new order.
+
+        Returns:
+            str: CSV data with label and cluster columns.
+        """
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['label', 'cluster'])
+        for label, i in zip(self.labels, self.order):
+            writer.writerow([label, self.assignments[i]])
+        return output.getvalue()
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import tempfile
+
+
+class Cache:
+    """A size-bounded on-disk cache of arrays, keyed by content hashes.
+
+    Notes:
+        Each entry is a .npz file named after its key, a hash of the input
+        data and the parameters of every step that produced it, so entries
+        never need to be invalidated: changed inputs get new keys. When the
+        cache grows past max_size, the least recently used entries are
+        deleted. Reading an entry updates its modification time, which is
+        used as its last use.
+
+    Args:
+        path (str): the cache directory, created if needed.
+        max_size (int): the largest total size of entries, in bytes.
+    """
+    version = 1  # part of every key, change it when entries change.
+
+    def __init__(self, path, max_size=2 ** 30):
+        self.path = path
+        self.max_size = max_size
+
+    @classmethod
+    def from_environment(cls):
+        """Get the cache for command line tools.
+
+        Notes:
+            The cache is off unless $PLANNING_TOOLS_CACHE is set to a
+            directory, so runs don't write to the disk without being asked.
+            The size limit is $PLANNING_TOOLS_CACHE_SIZE in bytes,
+            defaulting to 1 GiB. Setting it to 0 turns the cache off too.
+
+        Returns:
+            Cache: the cache, or None if it is turned off.
+        """
+        path = os.environ.get('PLANNING_TOOLS_CACHE')
+        max_size = int(os.environ.get('PLANNING_TOOLS_CACHE_SIZE', 2 ** 30))
+        if not path or max_size <= 0:
+            return None
+        return cls(path, max_size)
+
+    @classmethod
+    def get_key(cls, *parts):
+        """Get a key for some data.
+
+        Args:
+            parts: strings, numbers, None or other keys, e.g. the key of the
+                   input data and the parameters of a step.
+
+        Returns:
+            str: a hex digest.
+        """
+        return hashlib.sha256(
+            json.dumps([cls.version] + list(parts)).encode('utf-8')
+        ).hexdigest()
+
+    @staticmethod
+    def get_file_key(path):
+        """Get a key for the contents of a file.
+
+        Args:
+            path (str): a file.
+
+        Returns:
+            str: a hex digest.
+        """
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(2 ** 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @staticmethod
+    def get_mapped_file_key(path):
+        """Get a key for a large file that is memory-mapped rather than read.
+
+        Notes:
+            Hashing a multi-gigabyte file costs as much as reading it, so
+            this uses the file's path, size, modification time and first
+            4 KiB, e.g. the header of a .npy file, instead of its contents.
+
+        Args:
+            path (str): a file.
+
+        Returns:
+            str: a hex digest.
+        """
+        stat = os.stat(path)
+        with open(path, 'rb') as f:
+            header = f.read(4096)
+        return Cache.get_key(os.path.abspath(path), stat.st_size,
+                             stat.st_mtime_ns,
+                             hashlib.sha256(header).hexdigest())
+
+    def get_entry_path(self, key):
+        return os.path.join(self.path, key + '.npz')
+
+    def get_entries(self):
+        """Get the entries in the cache.
+
+        Returns:
+            list: (last use, size, path) tuples, least recently used first.
+        """
+        entries = []
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue  # evicted by another process.
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def get(self, key):
+        """Get an entry.
+
+        Args:
+            key (str): see get_key().
+
+        Returns:
+            dict: names and numpy arrays, or None if the key isn't cached.
+        """
+        import numpy
+
+        path = self.get_entry_path(key)
+        try:
+            with numpy.load(path, allow_pickle=False) as f:
+                arrays = {name: f[name] for name in f.files}
+            os.utime(path)
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        return arrays
+
+    def put(self, key, **arrays):
+        """Add an entry, then evict entries until the cache fits.
+
+        Notes:
+            Entries are written to a temporary file and renamed, so readers
+            in other processes never see partial entries. Entries larger
+            than max_size are skipped before anything is written.
+
+        Args:
+            key (str): see get_key().
+            arrays: names and numpy arrays, or lists of labels.
+        """
+        import numpy
+
+        arrays = {name: numpy.asarray(a) for name, a in arrays.items()}
+        if sum(a.nbytes for a in arrays.values()) > self.max_size:
+            return
+
+        os.makedirs(self.path, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                numpy.savez(f, **arrays)
+            if os.path.getsize(temp) > self.max_size:
+                os.remove(temp)
+                return
+            os.replace(temp, self.get_entry_path(key))
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits."""
+        entries = self.get_entries()
+        size = sum(s for _, s, _ in entries)
+        for _, s, path in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= s
+
+    def info(self):
+        """Describe the cache.
+
+        Returns:
+            dict: path, entries, size and max_size.
+        """
+        entries = self.get_entries()
+        return {
+            'path': self.path,
+            'entries': len(entries),
+            'size': sum(s for _, s, _ in entries),
+            'max_size': self.max_size
+        }
+
+    def clear(self):
+        """Delete every entry."""
+        for _, _, path in self.get_entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,311 @@
+import csv
+import io
+import numpy
+
+from .tables import _get_matrix_rows, _get_xlsx_rows, _write_csv_blocks, \
+    _write_xlsx_rows
+
+
+class CardSort:
+    """Build a similarity matrix from card sort data.
+
+    Notes:
+        Record card sort data in a .csv file with three columns:
+
+        field 1) participant identifier.
+        field 2) group identifier.
+        field 3) item.
+
+        Taken together, fields 1 and 2 should uniquely identify a row in the
+        input data. This code works for both closed card sorts, where group
+        names are determined before test time, and open card sorts, where
+        participants choose their own groups. Groups can be named (e.g. "citrus
+        fruits", "starchy vegetables", etc.) but the algorithm for determining
+        similarity will ignore group names.
+
+        Within an indiviual test, items can be placed in multiple groups. If 
+        a participant forms a group of items that don't fit into any other
+        group, they should be excluded rather than placed into a
+        "miscellaneous" group.
+
+    Example:
+        A,01,sherry
+        A,02,tobacco
+        A,02,leather
+        B,01,confiture
+        B,02,yarrow
+        B,03,celery
+        C,01,onion
+        C,02,confiture
+        C,03,yarrow
+
+        The data above records groupings from three different participants: A,
+        B and C. Participant A created two different groups, labelled '01' and
+        '02' here. Group '01' contains a single item (sherry) and group '02'
+        contains two items: tobacco and leather. Participants B and C each
+        created three groups, labelled '01', '02', and '03', which are distinct
+        from each other and the groups created by participant A.
+
+    References:
+        Jaccard index: https://en.wikipedia.org/wiki/Jaccard_index
+    """
+
+    def __init__(self):
+        """Constructor
+
+        Notes:
+            The tests property is a dictionary for representing card sort data:
+            e.g.:
+                {
+                  'participant A': {
+                    'group 1': set(('item i', 'item ii')),
+                    'group 2': set(('item iii',))
+                  },
+                  'participant B': {
+                    'group 1': set(('item i',)),
+                    'group 2': set(('item ii', 'item iii'))
+                  }
+                }
+        """
+        self.tests = {}
+        self._incidence = None
+
+    def import_from_csv(self, csv_file):
+        """Load data from a CSV file.
+
+        Args:  
+            csv_file: a file-like object.
+        """
+        self.import_from_rows(csv.reader(csv_file))
+
+    def import_from_xlsx(self, f, sheet=None):
+        """Load data from an Excel workbook, with the same columns as a CSV
+        file. The workbook is read in openpyxl's read-only mode.
+
+        Args:
+            f: a path or a file-like object, opened for reading bytes.
+            sheet (str): a worksheet title, or None for the first worksheet.
+        """
+        self.import_from_rows(_get_xlsx_rows(f, sheet))
+
+    def import_from_rows(self, reader):
+        """Load data from rows of strings, e.g. from a csv.reader.
+
+        Args:
+            reader: an iterable of lists.
+        """
+        self._incidence = None
+
+        for f in reader:
+            assert len(f) == 3 and all(f)
+            if not f[0] in self.tests:
+                self.tests[f[0]] = {}
+            if not f[1] in self.tests[f[0]]:
+                self.tests[f[0]][f[1]] = set()
+            self.tests[f[0]][f[1]].add(f[2])
+
+    def get_groups(self):
+        """Get a flat list of sets, all groups from all tests. e.g.:
+        [
+        set(('item 1',)),
+        set(('item 2', 'item 3')),
+        ...
+        ]
+
+        Returns:
+            list: a list of sets.
+        """
+        return [g for t in self.tests.values() for g in t.values()]
+
+    def get_elements(self):
+        """Get a sorted list of unique elements that appeared in any tests, e.g.:
+        ['apples', 'bananas', 'oranges']
+
+        Returns:
+            list: a unique list of elements from the card sort.
+        """
+        return sorted(set([e for g in self.get_groups() for e in g]))
+
+    def get_jaccard(self, a, b):
+        """Get the Jaccard index of two elements.
+
+        Args:
+            a (str): an element from the card sort.
+            b (str): an element from the card sort.
+
+        Returns:
+            float: a number between 0.0 and 1.0, inclusive.
+        """
+        elements = set([a, b])
+        counts = []
+        for g in self.get_groups():
+            counts.append(len(elements.intersection(g)))
+        return 1.0 * \
+            len([c for c in counts if c == 2]) / \
+            len([c for c in counts if c >= 1])
+
+    def get_incidence(self):
+        """Get a sparse groups x elements incidence matrix.
+
+        Notes:
+            Entry (g, e) is 1 when group g contains element e. Columns follow
+            the order of get_elements(). The matrix is cached until new data
+            is imported.
+
+        Returns:
+            scipy.sparse.csc_matrix: a matrix of integers.
+        """
+        from scipy import sparse
+
+        if self._incidence is None:
+            elements = self.get_elements()
+            index = {e: i for i, e in enumerate(elements)}
+            rows = []
+            cols = []
+            for g, group in enumerate(self.get_groups()):
+                for e in group:
+                    rows.append(g)
+                    cols.append(index[e])
+            self._incidence = sparse.csc_matrix(
+                (numpy.ones(len(rows), dtype=numpy.int64), (rows, cols)),
+                shape=(len(self.get_groups()), len(elements))
+            )
+        return self._incidence
+
+    def get_similarity_block(self, y_indices, x_indices):
+        """Get Jaccard indices for a block of element pairs.
+
+        Args:
+            y_indices (list): element indices for the rows of the block.
+            x_indices (list): element indices for the columns of the block.
+
+        Returns:
+            numpy.array: a len(y_indices) x len(x_indices) array of floats.
+            Pairs of an element with itself get 1.0, as in
+            get_similarity_data().
+        """
+        incidence = self.get_incidence()
+        counts = numpy.asarray(incidence.sum(axis=0)).ravel()
+        y_indices = numpy.asarray(y_indices, dtype=numpy.intp)
+        x_indices = numpy.asarray(x_indices, dtype=numpy.intp)
+
+        both = (incidence[:, y_indices].T @ incidence[:, x_indices]).toarray()
+        either = counts[y_indices][:, None] + counts[x_indices][None, :] - both
+        return 1.0 * both / either
+
+    def shuffled(self, rng):
+        """Get a copy of the card sort with items shuffled within each test.
+
+        Notes:
+            Each participant's items are relabelled with a random permutation
+            of that participant's own items. Every participant keeps the same
+            number and sizes of groups, but which items were grouped together
+            is random. This is the null model for PermutationTest.
+
+        Args:
+            rng (numpy.random.Generator): the source of randomness.
+
+        Returns:
+            CardSort: a new card sort.
+        """
+        c = CardSort()
+        for participant, groups in self.tests.items():
+            items = sorted(set.union(*groups.values()))
+            mapping = dict(zip(items, rng.permutation(items).tolist()))
+            c.tests[participant] = {
+                g: set(mapping[e] for e in group)
+                for g, group in groups.items()
+            }
+        return c
+
+    def get_lower_triangle_indices(self):
+        """Get indices for the lower triangle of a matrix, e.g.:
+        [(1, 0), (2, 0), (2, 1)]
+
+        Returns:
+            list: a list of tuples.
+        """
+        elements = self.get_elements()
+        return [(y, x) for y in range(len(elements)) for x in range(y)]
+
+    def get_similarity_data(self):
+        """Get a two-dimensional list of similarity data.
+
+        Returns:
+            list: a list of lists, where each row contains similarity data
+            (floats) from 0.0 to 1.0
+        """
+        elements = self.get_elements()
+        data = [['' for i in range(len(elements))]
+                for j in range(len(elements))]
+
+        for i in range(len(elements)):
+            data[i][i] = 1.0
+
+        for y, x in self.get_lower_triangle_indices():
+            j = self.get_jaccard(elements[x], elements[y])
+            data[y][x] = j
+
+        return data
+
+    def write_csv(self, f, precision=None, block_size=1024,
+                  progress=None, cancel=None):
+        """Write a similarity matrix in CSV format, one block of rows at a
+        time.
+
+        Notes:
+            Like get_similarity_data(), this writes the lower triangle and
+            diagonal, and leaves the upper triangle empty.
+
+        Args:
+            f: a file-like object, opened for writing text.
+            precision (int): decimal places to round values to, or None for
+                             full precision.
+            block_size (int): rows to compute and write at once.
+            progress: a function of (rows done, rows), called after each
+                      block of rows, or None.
+            cancel (CancellationToken): checked after each block of rows, or
+                                        None.
+        """
+        _write_csv_blocks(
+            f,
+            self.get_elements(),
+            lambda y, x: self.get_similarity_block(y, x),
+            precision,
+            block_size,
+            lower=True,
+            progress=progress,
+            cancel=cancel
+        )
+
+    def csv(self):
+        """Get CSV output as a string."""
+        output = io.StringIO()
+        self.write_csv(output)
+        return output.getvalue()
+
+    def write_xlsx(self, f, precision=None, block_size=1024,
+                   progress=None, cancel=None):
+        """Write a similarity matrix to an Excel workbook, laid out like
+        write_csv(). The workbook is written in openpyxl's write-only mode.
+
+        Args:
+            f: a path or a file-like object, opened for writing bytes.
+            precision (int): decimal places to round values to, or None for
+                             full precision.
+            block_size (int): rows to compute and write at once.
+            progress: a function of (rows done, rows), called after each
+                      block of rows, or None.
+            cancel (CancellationToken): checked after each block of rows, or
+                                        None.
+        """
+        _write_xlsx_rows(f, _get_matrix_rows(
+            self.get_elements(),
+            lambda y, x: self.get_similarity_block(y, x),
+            precision,
+            block_size,
+            lower=True,
+            empty=None,
+            progress=progress,
+            cancel=cancel
+        ), 'similarity')
@@ -0,0 +1,1380 @@
+"""Usage:
+    planning-tools [--profile=<path>] [--cprofile=<path>]
+                   <stage> [<args>...] [+ <stage> [<args>...]]...
+    planning-tools help <stage>
+    planning-tools cache (info | clear)
+    planning-tools batch [<options>...] <stage> <inputs>...
+                         [+ <stage> [<args>...]]...
+    planning-tools generate <kind> [<options>...]
+
+   Run a pipeline of stages in one process, passing data between stages as
+   arrays. The first stage loads data, later stages transform it or write
+   it out, e.g.:
+
+    planning-tools cardsort cards.csv + cluster average + ascii --full
+
+   Stages that load data:
+    cardsort     card sort data, see CardSort.
+    similarity   fielded data, see Similarity.
+    matrix       a similarity matrix.
+    consensus    the average of several similarity matrices.
+
+   Stages that transform data:
+    cluster      reorder the matrix by clustering.
+
+   Stages that write data:
+    csv          the matrix as CSV.
+    xlsx         the matrix as an Excel workbook.
+    npy          the matrix as a NumPy .npy file.
+    ascii        the matrix as ASCII art.
+    graph        the most similar pairs as a graph.
+    image        the matrix as a PNG or SVG image.
+    stats        statistics of the matrix values, as JSON.
+    approximate  approximate cluster assignments for large data, as CSV.
+    permutation  a permutation test of cluster strength, as JSON.
+
+   Use "planning-tools help <stage>" for the options of each stage,
+   "planning-tools help batch" to run a pipeline on many files at once, and
+   "planning-tools help generate" to make synthetic data for testing.
+
+   Set PLANNING_TOOLS_CACHE to a directory to cache similarity matrices and
+   clusterings on disk, so running the same data again with different
+   output skips recomputing them. Use "planning-tools cache info" and
+   "planning-tools cache clear" to inspect or clear the cache, see
+   Cache.from_environment() for its settings.
+
+   Options:
+    --profile=<path>   write a JSON report of the wall time, CPU time and
+                       peak memory of each stage, and of steps within stages
+                       like similarity, linkage and reorder. See Profiler.
+    --cprofile=<path>  write cProfile statistics for the whole run, for
+                       pstats or snakeviz.
+"""
+import contextlib
+import functools
+import glob
+import io
+import json
+import os
+import shutil
+import sys
+import time
+
+from docopt import docopt
+from .cache import Cache
+from .profiling import section
+from .progress import ProgressBar
+
+SCIPY_LINKAGE_METHODS = ('single', 'complete', 'average', 'weighted',
+                         'median', 'ward')
+LINKAGE_METHODS = SCIPY_LINKAGE_METHODS + ('insight', 'insight-sum')
+
+
+class Pipeline:
+    """The data passed between the stages of a command.
+
+    Args:
+        stdin: a file-like object to read "-" from.
+        stdout: a file-like object for output without an --output path.
+        cache (Cache): a cache for matrices and clusterings, or None.
+        progress (bool): show the progress of long computations on stderr.
+        cancel (CancellationToken): a token to stop the pipeline, or None.
+    """
+    def __init__(self, stdin=None, stdout=None, cache=None, progress=False,
+                 cancel=None):
+        self.stdin = stdin or sys.stdin
+        self.stdout = stdout or sys.stdout
+        self.cache = cache
+        self.progress = progress
+        self.cancel = cancel
+        self.source = None  # CardSort or Similarity, if loaded.
+        self.matrix = None  # Matrix.
+        # a cache key for the data so far: a hash of the input and of the
+        # stages applied to it, see get_key(). None without a cache.
+        self.key = None
+
+    def get_key(self, *parts):
+        """Get a cache key, or None without a cache.
+
+        Notes:
+            Keys are computed the first time they are called, so input files
+            are only hashed when a stage looks something up in the cache.
+
+        Args:
+            parts: strings, numbers, None, other keys from get_key() or
+                   get_input_key(), or lists of these.
+
+        Returns:
+            a function of no arguments that returns the key, or None.
+        """
+        if self.cache is None:
+            return None
+
+        def resolve(part):
+            if callable(part):
+                return part()
+            if isinstance(part, list):
+                return [resolve(p) for p in part]
+            return part
+
+        return functools.lru_cache(maxsize=None)(
+            lambda: Cache.get_key(*[resolve(p) for p in parts]))
+
+    def get_input_key(self, path):
+        """Get a cache key for the contents of an input file.
+
+        Args:
+            path (str): a path, or "-" for stdin. stdin is read into memory
+                        to hash it. .npy files are memory-mapped, so they
+                        are identified by their path, size, modification
+                        time and header rather than hashed.
+
+        Returns:
+            a key, see get_key(), or None without a cache.
+        """
+        if self.cache is None:
+            return None
+        if path == '-':
+            data = self.stdin.read()
+            self.stdin = io.StringIO(data)
+            return self.get_key(data)
+        if path.endswith('.npy'):
+            return self.get_key(
+                lambda: Cache.get_mapped_file_key(path),
+                lambda: Cache.get_file_key(path + '.labels.json'))
+        return self.get_key(lambda: Cache.get_file_key(path))
+
+    def get_cached_matrix(self, key):
+        """Get a matrix from the cache.
+
+        Returns:
+            Matrix: the matrix, or None if it isn't cached.
+        """
+        from .matrix import Matrix
+
+        if self.cache is None:
+            return None
+        entry = self.cache.get(key())
+        if entry is None:
+            return None
+        m = Matrix()
+        m.y_labels = entry['y_labels'].tolist()
+        m.x_labels = entry['x_labels'].tolist()
+        m.data = entry['data']
+        return m
+
+    def put_cached_matrix(self, key, m):
+        if self.cache is not None:
+            self.cache.put(key(), y_labels=m.y_labels, x_labels=m.x_labels,
+                           data=m.data)
+
+    def open_input(self, path):
+        if path == '-':
+            return self.stdin
+        return open(path, 'r')
+
+    def get_progress(self, label):
+        """Get a progress callback for a computation, or None."""
+        if self.progress:
+            return ProgressBar(label)
+        return None
+
+    def open_output(self, path=None, mode='w'):
+        """Open an output file for a with statement.
+
+        Notes:
+            Files are only moved into place when the with statement
+            finishes, so a failed or cancelled stage leaves no partial
+            output. stdout is left open.
+
+        Args:
+            path (str): a path, or None or "-" for stdout.
+            mode (str): 'w' for text, or 'wb' for bytes.
+        """
+        from .tables import AtomicFile
+
+        if path is None or path == '-':
+            return contextlib.nullcontext(self.stdout)
+        return AtomicFile(path, mode)
+
+    def get_matrix(self):
+        """Get the matrix, building it from the source the first time."""
+        from .matrix import Matrix
+
+        if self.matrix is None:
+            if self.source is None:
+                raise PipelineError('no data: start with a stage that loads '
+                                    'data.')
+            key = self.get_key('matrix', self.key)
+            self.matrix = self.get_cached_matrix(key)
+            if self.matrix is None:
+                m = Matrix()
+                with section('similarity'):
+                    m.import_from_source(self.source,
+                                         self.get_progress('matrix'),
+                                         self.cancel)
+                self.matrix = m
+                self.put_cached_matrix(key, self.matrix)
+        return self.matrix
+
+    def get_source(self):
+        """Get the source data, or the matrix if there is no other source."""
+        if self.source is not None:
+            return self.source
+        return self.get_matrix()
+
+    def load_matrix(self, path):
+        """Load a matrix file.
+
+        Returns:
+            tuple: the Matrix, and a cache key for it or None.
+        """
+        from .matrix import Matrix
+
+        key = self.get_key('matrix file', self.get_input_key(path))
+        if path.endswith('.npy'):
+            m = Matrix()
+            m.import_from_npy(path)  # memory-mapped, so not cached.
+            return m, key
+        m = self.get_cached_matrix(key)
+        if m is None:
+            m = Matrix()
+            if path.endswith('.xlsx'):
+                m.import_from_xlsx(path)
+            else:
+                m.import_from_csv(self.open_input(path))
+            self.put_cached_matrix(key, m)
+        return m, key
+
+
+class PipelineError(Exception):
+    """A problem with the stages or options of a command."""
+
+
+def get_int(arguments, option):
+    return int(arguments[option]) if arguments[option] else None
+
+
+def get_float(arguments, option):
+    return float(arguments[option]) if arguments[option] else None
+
+
+def stage_cardsort(pipeline, arguments):
+    """Usage:
+    cardsort <file>
+
+   Arguments:
+    file:  a CSV file, "-" for stdin, or an Excel .xlsx workbook with the
+           same columns.
+    """
+    from .cardsort import CardSort
+
+    pipeline.key = pipeline.get_key(
+        'cardsort', pipeline.get_input_key(arguments['<file>']))
+    pipeline.source = CardSort()
+    if arguments['<file>'].endswith('.xlsx'):
+        pipeline.source.import_from_xlsx(arguments['<file>'])
+    else:
+        pipeline.source.import_from_csv(
+            pipeline.open_input(arguments['<file>']))
+    pipeline.matrix = None
+
+
+def stage_similarity(pipeline, arguments):
+    """Usage:
+    similarity <file>
+
+   Arguments:
+    file:  a CSV file, "-" for stdin, or an Excel .xlsx workbook with the
+           same layout.
+    """
+    from .similarity import Similarity
+
+    pipeline.key = pipeline.get_key(
+        'similarity', pipeline.get_input_key(arguments['<file>']))
+    pipeline.source = Similarity()
+    if arguments['<file>'].endswith('.xlsx'):
+        pipeline.source.import_from_xlsx(arguments['<file>'])
+    else:
+        pipeline.source.import_from_csv(
+            pipeline.open_input(arguments['<file>']))
+    pipeline.matrix = None
+
+
+def stage_matrix(pipeline, arguments):
+    """Usage:
+    matrix <file>
+
+   Arguments:
+    file:  a CSV file, "-" for stdin, an Excel .xlsx workbook, or a .npy
+           file with a .npy.labels.json sidecar, see Matrix.export_npy().
+           .npy files are memory-mapped.
+    """
+    pipeline.source = None
+    pipeline.matrix, pipeline.key = pipeline.load_matrix(arguments['<file>'])
+
+
+def stage_consensus(pipeline, arguments):
+    """Usage:
+    consensus [--weights=<w>] <files>...
+
+   Arguments:
+    files:  matrices to average, as CSV, .xlsx or .npy files. Items are
+            matched by label, so matrices may cover different items.
+
+   Options:
+    --weights=<w>  comma-separated weights for each matrix, e.g. 1,1,2.
+                   Defaults to equal weights.
+    """
+    from .consensus import Consensus
+
+    if arguments['--weights']:
+        weights = [float(w) for w in arguments['--weights'].split(',')]
+        if len(weights) != len(arguments['<files>']):
+            raise PipelineError('--weights needs one weight for each file.')
+    else:
+        weights = [1.0] * len(arguments['<files>'])
+    pipeline.source = None
+    pipeline.key = pipeline.get_key(
+        'consensus',
+        [pipeline.get_input_key(path) for path in arguments['<files>']],
+        weights
+    )
+    pipeline.matrix = pipeline.get_cached_matrix(pipeline.key)
+    if pipeline.matrix is None:
+        c = Consensus()
+        for path, weight in zip(arguments['<files>'], weights):
+            c.add(pipeline.load_matrix(path)[0], weight)
+        pipeline.matrix = c.matrix()
+        pipeline.put_cached_matrix(pipeline.key, pipeline.matrix)
+
+
+def stage_cluster(pipeline, arguments):
+    """Usage:
+    cluster [--collapse=<threshold>] <linkage-method>
+    cluster [--collapse=<threshold>] louvain [--k=<k>] [--threshold=<t>]
+            [--resolution=<r>] [--seed=<s>]
+
+   Arguments:
+    linkage_method: single
+                    complete
+                    average
+                    weighted
+                    median
+                    ward
+                    insight      (InsightMatrix clustering, averaging)
+                    insight-sum  (InsightMatrix clustering, summing)
+
+   louvain groups items by community detection on a sparse graph of the
+   most similar pairs instead, see Matrix.cluster_graph(). It needs a
+   symmetric matrix, and one or both of the --k and --threshold options.
+
+   Options:
+    --collapse=<threshold>  cluster one representative of each group of items
+                            at least this similar, then put the other items
+                            back next to their representatives.
+    --k=<k>                 louvain: connect each item to its k most similar
+                            items.
+    --threshold=<t>         louvain: connect pairs at least this similar.
+    --resolution=<r>        louvain: larger values give smaller communities
+                            [default: 1.0].
+    --seed=<s>              louvain: random seed. Results are only cached
+                            with a seed.
+    """
+    method = arguments['<linkage-method>']
+    if arguments['louvain'] or method == 'louvain':
+        method = 'louvain'
+        k = get_int(arguments, '--k')
+        threshold = get_float(arguments, '--threshold')
+        resolution = float(arguments['--resolution'])
+        seed = get_int(arguments, '--seed')
+        if k is None and threshold is None:
+            raise PipelineError('louvain needs --k, --threshold or both.')
+        parameters = (k, threshold, resolution, seed)
+    elif method not in LINKAGE_METHODS:
+        raise PipelineError('unknown linkage method: ' + method)
+    else:
+        parameters = ()
+    m = pipeline.get_matrix()
+    if method == 'louvain' and not m.is_symmetric():
+        raise PipelineError('louvain needs a symmetric matrix.')
+
+    def cluster():
+        if method == 'louvain':
+            m.cluster_graph(threshold, k, resolution, seed)
+        else:
+            m.cluster(method, pipeline.get_progress('cluster'),
+                      pipeline.cancel)
+
+    key = pipeline.get_key('cluster', pipeline.key, method,
+                           arguments['--collapse'], *parameters)
+    cached = key is not None and not (method == 'louvain' and seed is None)
+    if key is not None and not cached:
+        # a new random result each run: give later stages a key of their own.
+        key = pipeline.get_key('cluster', os.urandom(16).hex())
+    entry = pipeline.cache.get(key()) if cached else None
+    if entry is not None:
+        # the cached order is relative to the matrix before clustering.
+        m.y_leaves = m.x_leaves = None
+        m.reorder(entry['y_order'], entry['x_order'])
+        m.y_linkage = entry.get('y_linkage')
+        m.x_linkage = entry.get('x_linkage')
+        m.y_leaves = entry.get('y_leaves')
+        m.x_leaves = entry.get('x_leaves')
+    else:
+        y_index, x_index = m.y_index, m.x_index
+        if arguments['--collapse']:
+            with section('collapse'):
+                m.collapse(float(arguments['--collapse']))
+        cluster()
+        if arguments['--collapse']:
+            with section('expand'):
+                m.expand()
+        if cached:
+            arrays = {
+                'y_order': [y_index[l] for l in m.y_labels],
+                'x_order': [x_index[l] for l in m.x_labels]
+            }
+            for name in ('y_linkage', 'x_linkage', 'y_leaves', 'x_leaves'):
+                if getattr(m, name) is not None:
+                    arrays[name] = getattr(m, name)
+            pipeline.cache.put(key(), **arrays)
+    pipeline.key = key
+
+
+def stage_csv(pipeline, arguments):
+    """Usage:
+    csv [--precision=<p>] [--output=<path>]
+
+   Options:
+    --precision=<p>  round values to this many decimal places.
+    --output=<path>  write to a file instead of stdout. Paths ending in .gz
+                     are gzip-compressed.
+    """
+    m = pipeline.get_matrix()
+    with pipeline.open_output(arguments['--output']) as out:
+        m.write_csv(out, get_int(arguments, '--precision'),
+                    pipeline.get_progress('csv'), pipeline.cancel)
+
+
+def stage_xlsx(pipeline, arguments):
+    """Usage:
+    xlsx [--precision=<p>] [--clusters=<k>] --output=<path>
+
+   Options:
+    --precision=<p>  round values to this many decimal places.
+    --clusters=<k>   shade this many clusters, after a cluster stage.
+    --output=<path>  the workbook to write.
+    """
+    m = pipeline.get_matrix()
+    with pipeline.open_output(arguments['--output'], 'wb') as out:
+        m.write_xlsx(
+            out,
+            get_int(arguments, '--precision'),
+            get_int(arguments, '--clusters'),
+            pipeline.get_progress('xlsx'),
+            pipeline.cancel
+        )
+
+
+def stage_npy(pipeline, arguments):
+    """Usage:
+    npy --output=<path>
+
+   Options:
+    --output=<path>  the .npy file to write. Labels are written next to it,
+                     see Matrix.export_npy().
+    """
+    pipeline.get_matrix().export_npy(arguments['--output'])
+
+
+def stage_ascii(pipeline, arguments):
+    """Usage:
+    ascii [--full] [--width=<w>] [--height=<h>] [--reduce=<r>] [--samples=<s>]
+
+   Options:
+    --full          draw every cell instead of fitting the terminal.
+    --width=<w>     output width in characters, defaults to the terminal
+                    width.
+    --height=<h>    output height in lines, defaults to the terminal height.
+    --reduce=<r>    summarize blocks of cells with mean or max
+                    [default: mean].
+    --samples=<s>   rows and columns read from each block, or "all"
+                    [default: 16].
+    """
+    m = pipeline.get_matrix()
+    if arguments['--full']:
+        pipeline.stdout.write(m.ascii())
+    else:
+        size = shutil.get_terminal_size()
+        pipeline.stdout.write(m.ascii(
+            int(arguments['--width'] or size.columns),
+            int(arguments['--height'] or size.lines - 1),
+            arguments['--reduce'],
+            None if arguments['--samples'] == 'all'
+            else int(arguments['--samples'])
+        ))
+
+
+def stage_graph(pipeline, arguments):
+    """Usage:
+    graph [--format=<format>] [--cutoff=<cutoff>] [--top-k=<k>]
+          [--output=<path>]
+
+   Options:
+    --format=<format>  graph format: dot, graphml or edgelist [default: dot].
+    --cutoff=<cutoff>  minimum similarity for a graph edge.
+    --top-k=<k>        join each item to its k most similar items.
+    --output=<path>    write to a file instead of stdout.
+    """
+    if arguments['--cutoff'] is None and arguments['--top-k'] is None:
+        raise PipelineError('graph needs --cutoff, --top-k or both.')
+    m = pipeline.get_matrix()
+    with pipeline.open_output(arguments['--output']) as out:
+        m.export_graph(
+            out,
+            arguments['--format'],
+            get_float(arguments, '--cutoff'),
+            get_int(arguments, '--top-k')
+        )
+
+
+def stage_image(pipeline, arguments):
+    """Usage:
+    image [--clusters=<k>] [--cell-size=<n>] [--raster] --output=<path>
+
+   Options:
+    --clusters=<k>   outline this many clusters, after a cluster stage.
+    --cell-size=<n>  size of each cell in pixels [default: 1].
+    --raster         embed cells in an SVG as a PNG image.
+    --output=<path>  the image to write, ending in .png or .svg.
+    """
+    m = pipeline.get_matrix()
+    clusters = get_int(arguments, '--clusters')
+    cell_size = int(arguments['--cell-size'])
+    path = arguments['--output']
+    if path.lower().endswith('.png'):
+        with pipeline.open_output(path, 'wb') as out:
+            m.png(out, cell_size, clusters)
+    elif path.lower().endswith('.svg'):
+        with pipeline.open_output(path) as out:
+            out.write(m.svg(cell_size, clusters=clusters,
+                            raster=arguments['--raster'] or None))
+    else:
+        raise PipelineError('--output must end in .png or .svg.')
+
+
+def stage_stats(pipeline, arguments):
+    """Usage:
+    stats [--bins=<n>]
+
+   Options:
+    --bins=<n>  histogram bins between 0.0 and 1.0 [default: 100].
+    """
+    statistics = pipeline.get_matrix().statistics(int(arguments['--bins']))
+    statistics['quantiles'] = {
+        str(q): v for q, v in statistics['quantiles'].items()}
+    json.dump(statistics, pipeline.stdout, indent=2)
+    pipeline.stdout.write('\n')
+
+
+def stage_approximate(pipeline, arguments):
+    """Usage:
+    approximate [--sample-size=<n>] [--clusters=<k>] [--seed=<s>]
+                [--output=<path>] <linkage-method>
+
+   Cluster a random sample of items exactly, assign the remaining items to
+   the nearest cluster, and output one label and cluster per line. Use this
+   for item sets too large for a full matrix.
+
+   Arguments:
+    linkage_method: single, complete, average, weighted, median or ward.
+
+   Options:
+    --sample-size=<n>  number of items to cluster exactly [default: 1000].
+    --clusters=<k>     number of clusters to cut the sample into.
+    --seed=<s>         random seed for drawing the sample.
+    --output=<path>    write to a file instead of stdout.
+    """
+    from .approximate import ApproximateCluster
+
+    if arguments['<linkage-method>'] not in SCIPY_LINKAGE_METHODS:
+        raise PipelineError(
+            'approximate needs one of these linkage methods: ' +
+            ', '.join(SCIPY_LINKAGE_METHODS))
+    a = ApproximateCluster(
+        pipeline.get_source(),
+        arguments['<linkage-method>'],
+        int(arguments['--sample-size']),
+        get_int(arguments, '--clusters'),
+        seed=get_int(arguments, '--seed')
+    )
+    a.cluster()
+    with pipeline.open_output(arguments['--output']) as out:
+        out.write(a.csv())
+
+
+def stage_permutation(pipeline, arguments):
+    """Usage:
+    permutation [--permutations=<n>] [--clusters=<k>] [--seed=<s>]
+                [--workers=<w>] <linkage-method>
+
+   Test whether clusters are stronger than chance by reclustering shuffled
+   copies of card sort or similarity data, see PermutationTest.
+
+   Arguments:
+    linkage_method: single, complete, average, weighted, median or ward.
+
+   Options:
+    --permutations=<n>  number of shuffled copies [default: 1000].
+    --clusters=<k>      number of clusters to measure cohesion in.
+    --seed=<s>          random seed.
+    --workers=<w>       worker processes, defaults to one per CPU.
+    """
+    from .permutation import PermutationTest
+
+    if pipeline.source is None:
+        raise PipelineError('permutation needs card sort or similarity data.')
+    if arguments['<linkage-method>'] not in SCIPY_LINKAGE_METHODS:
+        raise PipelineError(
+            'permutation needs one of these linkage methods: ' +
+            ', '.join(SCIPY_LINKAGE_METHODS))
+    p = PermutationTest(
+        pipeline.source,
+        arguments['<linkage-method>'],
+        int(arguments['--permutations']),
+        get_int(arguments, '--clusters'),
+        get_int(arguments, '--seed'),
+        get_int(arguments, '--workers')
+    )
+    p.run()
+    json.dump(p.report(), pipeline.stdout, indent=2)
+    pipeline.stdout.write('\n')
+
+
+STAGES = {
+    'cardsort': stage_cardsort,
+    'similarity': stage_similarity,
+    'matrix': stage_matrix,
+    'consensus': stage_consensus,
+    'cluster': stage_cluster,
+    'csv': stage_csv,
+    'xlsx': stage_xlsx,
+    'npy': stage_npy,
+    'ascii': stage_ascii,
+    'graph': stage_graph,
+    'image': stage_image,
+    'stats': stage_stats,
+    'approximate': stage_approximate,
+    'permutation': stage_permutation
+}
+
+
+def split_stages(argv):
+    """Split command line arguments into stages at each "+".
+
+    Args:
+        argv (list): arguments, e.g. ['cardsort', 'a.csv', '+', 'csv'].
+
+    Returns:
+        list: one list of arguments per stage, starting with its name.
+    """
+    stages = [[]]
+    for arg in argv:
+        if arg == '+':
+            stages.append([])
+        else:
+            stages[-1].append(arg)
+    return stages
+
+
+def parse_stages(stages):
+    """Check a pipeline and parse the options of each stage.
+
+    Args:
+        stages (list): lists of arguments, see split_stages().
+
+    Returns:
+        list: (stage function, arguments dict) tuples.
+
+    Raises:
+        PipelineError: for unknown stages or bad options.
+    """
+    parsed = []
+    for stage in stages:
+        if not stage or stage[0] not in STAGES:
+            raise PipelineError('unknown stage: ' + ' '.join(stage))
+        function = STAGES[stage[0]]
+        try:
+            arguments = docopt(function.__doc__, stage[1:], help=False)
+        except SystemExit:
+            raise PipelineError(
+                'bad options for {}.\n{}'.format(stage[0], function.__doc__))
+        parsed.append((function, arguments))
+    return parsed
+
+
+def run(stages, stdin=None, stdout=None, cache=None, progress=False,
+        cancel=None):
+    """Run a pipeline.
+
+    Args:
+        stages (list): lists of arguments, see split_stages().
+        stdin: a file-like object to read "-" from, defaults to sys.stdin.
+        stdout: a file-like object for output, defaults to sys.stdout.
+        cache (Cache): a cache for matrices and clusterings, or None.
+        progress (bool): show the progress of long computations on stderr.
+        cancel (CancellationToken): a token to stop the pipeline from
+                                    another thread, or None. Stages raise
+                                    Cancelled at their next block boundary,
+                                    without leaving partial output files.
+
+    Returns:
+        Pipeline: the pipeline after the last stage.
+    """
+    pipeline = Pipeline(stdin, stdout, cache, progress, cancel)
+    for stage, (function, arguments) in zip(stages, parse_stages(stages)):
+        with section(stage[0]):
+            function(pipeline, arguments)
+    return pipeline
+
+
+BATCH_USAGE = """Usage:
+    planning-tools batch [--workers=<n>] [--output-dir=<dir>] [--suffix=<s>]
+                         <stage> <inputs>...
+
+   Run a pipeline on each of many inputs, in a pool of worker processes, e.g.:
+
+    planning-tools batch --workers=4 cardsort studies/ + cluster average + csv
+
+   Each input is loaded with the first stage, then passed through the stages
+   after "+". What the pipeline writes to stdout goes to an output file for
+   each input, and "{name}" in stage options is replaced with the input's
+   name, e.g. "+ image --output=images/{name}.png". A failed input doesn't
+   stop the others. A table of timings and sizes is printed at the end.
+
+   Arguments:
+    stage:   the stage that loads each input: cardsort, similarity or matrix.
+    inputs:  files, directories of .csv, .xlsx and .npy files, or glob
+             patterns, e.g. "studies/*.csv".
+
+   Options:
+    --workers=<n>       inputs to process at once, defaults to one per CPU.
+    --output-dir=<dir>  directory for output files [default: .].
+    --suffix=<s>        suffix for output files, after the input's name
+                        [default: .csv].
+"""
+
+BATCH_EXTENSIONS = ('.csv', '.xlsx', '.npy')
+
+
+def get_batch_inputs(patterns):
+    """Expand directories and glob patterns into a list of input files.
+
+    Args:
+        patterns (list): files, directories or glob patterns.
+
+    Returns:
+        list: paths, in order, without duplicates.
+    """
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.extend(sorted(
+                os.path.join(pattern, name) for name in os.listdir(pattern)
+                if name.endswith(BATCH_EXTENSIONS)
+            ))
+        elif glob.has_magic(pattern):
+            paths.extend(sorted(glob.glob(pattern)))
+        else:
+            paths.append(pattern)
+    return list(dict.fromkeys(paths))
+
+
+def describe_error(e):
+    if str(e):
+        return '{}: {}'.format(type(e).__name__, e)
+    return type(e).__name__
+
+
+def run_batch_job(stages, output):
+    """Run one pipeline of a batch.
+
+    Notes:
+        stdout goes to an AtomicFile, so output only appears when the
+        pipeline succeeds. Empty output is discarded.
+
+    Args:
+        stages (list): lists of arguments, see split_stages().
+        output (str): the output path.
+
+    Returns:
+        dict: seconds, output_size and error, None on success.
+    """
+    from .tables import AtomicFile
+
+    start = time.perf_counter()
+    result = {'output_size': None, 'error': None}
+    out = AtomicFile(output)
+    try:
+        run(stages, io.StringIO(), out, Cache.from_environment())
+        if out.tell() > 0:
+            out.close()
+            result['output_size'] = os.path.getsize(output)
+        else:
+            out.discard()
+    except Exception as e:
+        out.discard()
+        result['error'] = describe_error(e)
+    except BaseException:
+        out.discard()  # e.g. KeyboardInterrupt, when the batch is stopped.
+        raise
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def run_batch(loader, inputs, stages, output_dir='.', suffix='.csv',
+              workers=None):
+    """Run a pipeline on each of many inputs.
+
+    Args:
+        loader (str): the stage that loads inputs, e.g. 'cardsort'.
+        inputs (list): input paths, see get_batch_inputs().
+        stages (list): lists of arguments for the stages after loading.
+                       "{name}" in arguments is replaced with the input's
+                       name, without its directory and extension.
+        output_dir (str): directory for output files, created if needed.
+        suffix (str): suffix for output files.
+        workers (int): worker processes, defaults to one per CPU.
+
+    Returns:
+        list: a dict for each input with input, output, input_size,
+        output_size, seconds and error, None on success.
+
+    Raises:
+        PipelineError: for bad stages, or inputs with the same name.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if loader not in ('cardsort', 'similarity', 'matrix'):
+        raise PipelineError('batch inputs need a cardsort, similarity or '
+                            'matrix stage, not ' + loader)
+    jobs = []
+    names = set()
+    for path in inputs:
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name in names:
+            raise PipelineError('two inputs are named ' + name)
+        names.add(name)
+        job_stages = [[loader, path]] + [
+            [arg.replace('{name}', name) for arg in stage] for stage in stages]
+        jobs.append((job_stages, os.path.join(output_dir, name + suffix)))
+    if jobs:
+        parse_stages(jobs[0][0])  # check options before starting.
+    os.makedirs(output_dir, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        results = [run_batch_job(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_batch_job, *job) for job in jobs]
+            results = []
+            try:
+                for future in futures:
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        results.append({'output_size': None, 'seconds': None,
+                                        'error': describe_error(e)})
+            except BaseException:
+                # stop without starting the jobs that are still queued.
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+
+    for path, (_, output), result in zip(inputs, jobs, results):
+        result['input'] = path
+        result['output'] = output if result['output_size'] is not None \
+            else None
+        try:
+            result['input_size'] = os.path.getsize(path)
+        except OSError:
+            result['input_size'] = None
+    return results
+
+
+def format_batch_summary(results):
+    """Format the results of run_batch() as a table.
+
+    Returns:
+        str: one line per input, then totals.
+    """
+    def cell(value, fmt='{}'):
+        return '-' if value is None else fmt.format(value)
+
+    rows = [('input', 'status', 'seconds', 'input bytes', 'output bytes')]
+    for r in results:
+        rows.append((
+            r['input'],
+            'ok' if r['error'] is None else 'failed',
+            cell(r['seconds'], '{:.2f}'),
+            cell(r['input_size']),
+            cell(r['output_size'])
+        ))
+    failed = sum(1 for r in results if r['error'] is not None)
+    rows.append((
+        'total: {} ok, {} failed'.format(len(results) - failed, failed),
+        '',
+        '{:.2f}'.format(sum(r['seconds'] or 0.0 for r in results)),
+        str(sum(r['input_size'] or 0 for r in results)),
+        str(sum(r['output_size'] or 0 for r in results))
+    ))
+    widths = [max(len(row[i]) for row in rows) for i in range(5)]
+    lines = []
+    for row in rows:
+        lines.append('  '.join(
+            [row[0].ljust(widths[0]), row[1].ljust(widths[1])] +
+            [v.rjust(w) for v, w in zip(row[2:], widths[2:])]).rstrip())
+    for r in results:
+        if r['error'] is not None:
+            lines.append('{}: {}'.format(r['input'], r['error']))
+    return '\n'.join(lines) + '\n'
+
+
+def batch(argv):
+    """The planning-tools batch command."""
+    stages = split_stages(argv)
+    arguments = docopt(BATCH_USAGE, stages[0])
+    try:
+        results = run_batch(
+            arguments['<stage>'],
+            get_batch_inputs(arguments['<inputs>']),
+            stages[1:] or [['csv']],
+            arguments['--output-dir'],
+            arguments['--suffix'],
+            get_int(arguments, '--workers')
+        )
+    except PipelineError as e:
+        sys.exit(str(e))
+    sys.stdout.write(format_batch_summary(results))
+    if any(r['error'] is not None for r in results):
+        sys.exit(1)
+
+
+PROFILE_OPTIONS = ('--profile', '--cprofile')
+
+
+def get_profile_options(argv):
+    """Take the profiling options out of a command line.
+
+    Args:
+        argv (list): arguments, which may include --profile=<path> and
+                     --cprofile=<path>.
+
+    Returns:
+        tuple: the other arguments, and a dict of the profiling options,
+        with None for options that weren't given.
+    """
+    options = dict.fromkeys(PROFILE_OPTIONS)
+    rest = []
+    for arg in argv:
+        name, _, value = arg.partition('=')
+        if name in PROFILE_OPTIONS and value:
+            options[name] = value
+        else:
+            rest.append(arg)
+    return rest, options
+
+
+@contextlib.contextmanager
+def profiled(argv, options):
+    """Profile a command if the options ask for it.
+
+    Notes:
+        The report is written even if the command fails, with the sections
+        that ran.
+
+    Args:
+        argv (list): the command line, for the report.
+        options (dict): see get_profile_options().
+    """
+    if not any(options.values()):
+        yield
+        return
+    from .profiling import Profiler
+
+    profiler = Profiler(cprofile=bool(options['--cprofile']))
+    try:
+        with profiler:
+            yield
+    finally:
+        if options['--profile']:
+            profiler.write_report(options['--profile'], command=argv)
+        if options['--cprofile']:
+            profiler.dump_stats(options['--cprofile'])
+
+
+GENERATE_USAGE = """Usage:
+    planning-tools generate (cardsort | similarity | interactions | matrix)
+                            [options]
+
+   Write synthetic card sort, similarity, interactions or pairwise matrix
+   data with planted clusters, in the CSV formats the other commands read,
+   e.g.:
+
+    planning-tools generate cardsort --items=100000 --output=cards.csv.gz
+
+   The same options and seed always give the same output. Data is generated
+   and written a chunk at a time, so output can be larger than memory. See
+   planning_tools.generate for how each kind of data is made.
+
+   Options:
+    --items=<n>         items, records or elements [default: 1000].
+    --clusters=<k>      planted clusters [default: 10].
+    --group-sizes=<d>   cluster sizes: uniform, or zipf for a few large
+                        clusters and many small ones [default: uniform].
+    --noise=<p>         the chance that an item leaves its cluster's
+                        pattern, or for matrices the largest change to a
+                        similarity [default: 0.2].
+    --seed=<s>          random seed [default: 0].
+    --output=<path>     write to a file instead of stdout. Paths ending in
+                        .gz are gzip-compressed.
+    --participants=<n>  card sort participants [default: 30].
+    --coverage=<f>      the chance that a participant sorts each item, for
+                        card sorts [default: 1.0].
+    --discrete=<n>      discrete fields, for similarity data [default: 3].
+    --continuous=<n>    continuous fields, for similarity data
+                        [default: 3].
+    --variables=<n>     variables, for interactions data [default: 9].
+    --precision=<p>     decimal places, for matrices [default: 3].
+"""
+
+
+def generate(argv):
+    """The planning-tools generate command."""
+    from . import generate as g
+    from .tables import open_output
+
+    arguments = docopt(GENERATE_USAGE, argv)
+    if arguments['--group-sizes'] not in g.GROUP_SIZES:
+        sys.exit('--group-sizes must be uniform or zipf.')
+    kwargs = {
+        'items': int(arguments['--items']),
+        'clusters': int(arguments['--clusters']),
+        'group_sizes': arguments['--group-sizes'],
+        'noise': float(arguments['--noise']),
+        'seed': int(arguments['--seed'])
+    }
+    if arguments['cardsort']:
+        write = g.write_cardsort
+        kwargs.update(participants=int(arguments['--participants']),
+                      coverage=float(arguments['--coverage']))
+    elif arguments['similarity']:
+        write = g.write_similarity
+        kwargs.update(discrete=int(arguments['--discrete']),
+                      continuous=int(arguments['--continuous']))
+    elif arguments['interactions']:
+        write = g.write_interactions
+        kwargs.update(variables=int(arguments['--variables']))
+    else:
+        def write(f, progress=None, **kwargs):
+            g.SyntheticMatrix(**kwargs).write_csv(
+                f, int(arguments['--precision']), progress=progress)
+
+    path = arguments['--output']
+    progress = None
+    if path not in (None, '-') and sys.stderr.isatty():
+        progress = ProgressBar(os.path.basename(path))
+    out = open_output(path)
+    with contextlib.nullcontext(out) if out is sys.stdout else out:
+        write(out, progress=progress, **kwargs)
+
+
+def main(argv=None):
+    """The planning-tools command."""
+    argv = sys.argv[1:] if argv is None else argv
+    command = list(argv)
+    argv, profile_options = get_profile_options(argv)
+    if argv[:1] == ['help'] and argv[1:] == ['batch']:
+        sys.stdout.write(BATCH_USAGE)
+        return
+    if argv[:1] == ['help'] and argv[1:] == ['generate']:
+        sys.stdout.write(GENERATE_USAGE)
+        return
+    if argv[:1] == ['help'] and len(argv) == 2 and argv[1] in STAGES:
+        sys.stdout.write(STAGES[argv[1]].__doc__)
+        return
+    if not argv or argv[0] in ('-h', '--help', 'help'):
+        sys.stdout.write(__doc__)
+        return
+    if argv[0] == 'batch':
+        batch(argv)
+        return
+    if argv[0] == 'generate':
+        generate(argv)
+        return
+    cache = Cache.from_environment()
+    if argv[0] == 'cache':
+        if argv[1:] not in (['info'], ['clear']):
+            sys.exit('Usage: planning-tools cache (info | clear)')
+        if cache is None:
+            sys.exit('the cache is turned off: set PLANNING_TOOLS_CACHE to a '
+                     'directory to turn it on.')
+        if argv[1] == 'clear':
+            cache.clear()
+        json.dump(cache.info(), sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+    try:
+        with profiled(command, profile_options):
+            run(split_stages(argv), cache=cache,
+                progress=sys.stderr.isatty())
+    except PipelineError as e:
+        sys.exit(str(e))
+
+
+def option(arguments, name):
+    """Pass an option from a legacy command on to a stage."""
+    if arguments[name] in (None, False):
+        return []
+    if arguments[name] is True:
+        return [name]
+    return ['{}={}'.format(name, arguments[name])]
+
+
+SOURCE_USAGE = """Usage:
+    {name} permutation [--permutations=<n>] [--clusters=<k>] [--seed=<s>]
+    {pad}             [--workers=<w>] <linkage-method> <file>
+    {name} [--approximate] [--sample-size=<n>] [--clusters=<k>] [--seed=<s>]
+    {pad} [--collapse=<threshold>] [--precision=<p>] [--output=<path>]
+    {pad} <linkage-method> <file>
+
+   Arguments:
+    file:           a CSV file, "-" for stdin, or an Excel .xlsx workbook
+                    with the same columns.
+    linkage_method: single
+                    complete
+                    average
+                    weighted
+                    median
+                    ward
+                    insight      (InsightMatrix clustering, averaging)
+                    insight-sum  (InsightMatrix clustering, summing)
+
+   Options:
+    --approximate      cluster a random sample of items exactly, assign the
+                       remaining items to the nearest cluster, and output one
+                       label and cluster per line instead of a matrix. Use
+                       this for item sets too large for a full matrix.
+    --sample-size=<n>  number of items to cluster exactly [default: 1000].
+    --clusters=<k>     number of clusters to cut the sample into, or to
+                       measure cohesion in for the permutation test.
+    --seed=<s>         random seed for drawing the sample, or for the
+                       permutation test.
+    --permutations=<n> number of shuffled copies of the data for the
+                       permutation test [default: 1000].
+    --workers=<w>      worker processes for the permutation test, defaults
+                       to one per CPU.
+    --collapse=<threshold>
+                       cluster one representative of each group of items at
+                       least this similar, then put the other items back next
+                       to their representatives.
+    --precision=<p>    round values to this many decimal places.
+    --output=<path>    write to a file instead of stdout. Paths ending in .gz
+                       are gzip-compressed, and paths ending in .xlsx are
+                       written as Excel workbooks, with --clusters clusters
+                       shaded.
+    --profile=<path>   write a JSON report of the time and memory of each
+                       step, see planning-tools --help.
+    --cprofile=<path>  write cProfile statistics for the whole run.
+"""
+
+CARDSORT_USAGE = SOURCE_USAGE.format(name='cardsort', pad=' ' * 8)
+SIMILARITY_USAGE = SOURCE_USAGE.format(name='similarity', pad=' ' * 10)
+
+
+def get_source_stages(name, arguments):
+    """Translate the cardsort and similarity commands into stages."""
+    stages = [[name, arguments['<file>']]]
+    method = arguments['<linkage-method>']
+    output = arguments['--output'] or ''
+    if arguments['permutation']:
+        stages.append(
+            ['permutation', method] +
+            option(arguments, '--permutations') +
+            option(arguments, '--clusters') +
+            option(arguments, '--seed') +
+            option(arguments, '--workers'))
+    elif arguments['--approximate']:
+        if output.endswith('.xlsx'):
+            raise PipelineError(
+                '--approximate output can only be written as CSV.')
+        stages.append(
+            ['approximate', method] +
+            option(arguments, '--sample-size') +
+            option(arguments, '--clusters') +
+            option(arguments, '--seed') +
+            option(arguments, '--output'))
+    else:
+        stages.append(['cluster', method] + option(arguments, '--collapse'))
+        stages.append(get_output_stage(arguments))
+    return stages
+
+
+def get_output_stage(arguments):
+    """Get the stage that writes a matrix for a legacy command."""
+    if (arguments['--output'] or '').endswith('.xlsx'):
+        return ['xlsx'] + option(arguments, '--precision') + \
+            option(arguments, '--clusters') + option(arguments, '--output')
+    if (arguments['--output'] or '').endswith('.npy'):
+        return ['npy'] + option(arguments, '--output')
+    return ['csv'] + option(arguments, '--precision') + \
+        option(arguments, '--output')
+
+
+def cardsort(argv=None):
+    """The cardsort command."""
+    command = sys.argv[1:] if argv is None else list(argv)
+    argv, profile_options = get_profile_options(command)
+    arguments = docopt(CARDSORT_USAGE, argv)
+    try:
+        with profiled(command, profile_options):
+            run(get_source_stages('cardsort', arguments),
+                cache=Cache.from_environment(), progress=sys.stderr.isatty())
+    except PipelineError as e:
+        sys.exit(str(e))
+
+
+def similarity(argv=None):
+    """The similarity command."""
+    command = sys.argv[1:] if argv is None else list(argv)
+    argv, profile_options = get_profile_options(command)
+    arguments = docopt(SIMILARITY_USAGE, argv)
+    try:
+        with profiled(command, profile_options):
+            run(get_source_stages('similarity', arguments),
+                cache=Cache.from_environment(), progress=sys.stderr.isatty())
+    except PipelineError as e:
+        sys.exit(str(e))
+
+
+PAIRWISE_USAGE = """Usage:
+    pairwise ascii [--full] [--width=<w>] [--height=<h>] [--reduce=<r>]
+                   [--samples=<s>] <file>
+    pairwise graph [--format=<format>] [--cutoff=<cutoff>] [--top-k=<k>]
+                   [--output=<path>] <file>
+    pairwise image [--cluster=<linkage-method>] [--clusters=<k>]
+                   [--cell-size=<n>] [--raster] --output=<path> <file>
+    pairwise stats [--bins=<n>] <file>
+    pairwise consensus [--weights=<w>] [--precision=<p>] [--output=<path>]
+                       <files>...
+    pairwise [--collapse=<threshold>] [--precision=<p>] [--clusters=<k>]
+             [--output=<path>] <linkage-method> <file>
+
+   Arguments:
+    file:           a CSV file, "-" for stdin, an Excel .xlsx workbook, or
+                    a .npy file with a .npy.labels.json sidecar, see
+                    Matrix.export_npy(). .npy files are memory-mapped.
+    files:          matrices to average, as CSV, .xlsx or .npy files. Items
+                    are matched by label, so matrices may cover different
+                    items.
+    linkage_method: single
+                    complete
+                    average
+                    weighted
+                    median
+                    ward
+                    insight      (InsightMatrix clustering, averaging)
+                    insight-sum  (InsightMatrix clustering, summing)
+
+   Options:
+    --collapse=<threshold>  cluster one representative of each group of items
+                            at least this similar, then put the other items
+                            back next to their representatives.
+    --format=<format>       graph format: dot, graphml or edgelist
+                            [default: dot].
+    --cutoff=<cutoff>       minimum similarity for a graph edge.
+    --top-k=<k>             join each item to its k most similar items.
+    --output=<path>         write to a file instead of stdout. Paths ending
+                            in .gz are gzip-compressed, and paths ending in
+                            .xlsx are written as Excel workbooks. Consensus
+                            matrices are written as .npy files if the path
+                            ends in .npy.
+    --precision=<p>         round values to this many decimal places.
+    --weights=<w>           comma-separated weights for each matrix, e.g.
+                            1,1,2. Defaults to equal weights.
+    --cluster=<linkage-method>  cluster the matrix before drawing it.
+    --clusters=<k>          outline this many clusters in images (this needs
+                            a linkage method from --cluster), or shade them
+                            in .xlsx output.
+    --cell-size=<n>         size of each cell in pixels [default: 1].
+    --raster                embed cells in an SVG as a PNG image.
+    --bins=<n>              histogram bins between 0.0 and 1.0 [default: 100].
+    --full                  draw every cell instead of fitting the terminal.
+    --width=<w>             output width in characters, defaults to the
+                            terminal width.
+    --height=<h>            output height in lines, defaults to the terminal
+                            height.
+    --reduce=<r>            summarize blocks of cells with mean or max
+                            [default: mean].
+    --samples=<s>           rows and columns read from each block, or "all"
+                            [default: 16].
+    --profile=<path>        write a JSON report of the time and memory of
+                            each step, see planning-tools --help.
+    --cprofile=<path>       write cProfile statistics for the whole run.
+"""
+
+
+def get_pairwise_stages(arguments):
+    """Translate the pairwise command into stages."""
+    if arguments['consensus']:
+        return [
+            ['consensus'] + option(arguments, '--weights') +
+            arguments['<files>'],
+            get_output_stage(arguments)
+        ]
+
+    stages = [['matrix', arguments['<file>']]]
+    if arguments['ascii']:
+        stages.append(
+            ['ascii'] + option(arguments, '--full') +
+            option(arguments, '--width') + option(arguments, '--height') +
+            option(arguments, '--reduce') + option(arguments, '--samples'))
+    elif arguments['graph']:
+        stages.append(
+            ['graph'] + option(arguments, '--format') +
+            option(arguments, '--cutoff') + option(arguments, '--top-k') +
+            option(arguments, '--output'))
+    elif arguments['image']:
+        if arguments['--clusters'] and not arguments['--cluster']:
+            raise PipelineError('--clusters needs --cluster.')
+        if arguments['--cluster']:
+            stages.append(['cluster', arguments['--cluster']])
+        stages.append(
+            ['image'] + option(arguments, '--clusters') +
+            option(arguments, '--cell-size') + option(arguments, '--raster') +
+            option(arguments, '--output'))
+    elif arguments['stats']:
+        stages.append(['stats'] + option(arguments, '--bins'))
+    else:
+        stages.append(['cluster', arguments['<linkage-method>']] +
+                      option(arguments, '--collapse'))
+        stages.append(get_output_stage(arguments))
+    return stages
+
+
+def pairwise(argv=None):
+    """The pairwise command."""
+    command = sys.argv[1:] if argv is None else list(argv)
+    argv, profile_options = get_profile_options(command)
+    arguments = docopt(PAIRWISE_USAGE, argv)
+    try:
+        with profiled(command, profile_options):
+            run(get_pairwise_stages(arguments),
+                cache=Cache.from_environment(), progress=sys.stderr.isatty())
+    except PipelineError as e:
+        sys.exit(str(e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import numpy
+
+from .matrix import Matrix
+
+
+class Consensus:
+    """Average many similarity matrices into one.
+
+    Notes:
+        Matrices are added one at a time, and only a running weighted sum
+        and total weight are kept for each cell, so memory stays at the size
+        of the consensus matrix no matter how many matrices are added.
+        Matrices are aligned by label rather than position, so they may
+        cover different subsets of items; each cell is averaged over the
+        matrices that include both of its items. Labels are kept in the
+        order they are first seen.
+
+        Symmetric and non-symmetric matrices can't be mixed. For symmetric
+        matrices the rows and columns share one set of labels.
+    """
+    def __init__(self):
+        self.y_labels = []
+        self.x_labels = []
+        self.y_index = {}  # label -> row.
+        self.x_index = {}  # label -> column.
+        self.symmetric = None
+        self.matrices = 0
+        self._sums = numpy.zeros((0, 0))
+        self._weights = numpy.zeros((0, 0))
+
+    def _get_indices(self, labels, index, label_list):
+        for label in labels:
+            if label not in index:
+                index[label] = len(label_list)
+                label_list.append(label)
+        return numpy.fromiter((index[l] for l in labels), dtype=numpy.intp,
+                              count=len(labels))
+
+    def _grow(self):
+        # grow to exactly the labels seen so far, once per added matrix, and
+        # one array at a time, so only one old array is held while copying.
+        h, w = self._sums.shape
+        shape = (len(self.y_labels), len(self.x_labels))
+        if shape == (h, w):
+            return
+        for name in ('_sums', '_weights'):
+            old = getattr(self, name)
+            grown = numpy.zeros(shape, dtype=old.dtype)
+            grown[:h, :w] = old
+            setattr(self, name, grown)
+
+    def add(self, matrix, weight=1.0):
+        """Add a matrix to the consensus.
+
+        Notes:
+            The matrix is read one block of rows at a time, so memory-mapped
+            matrices (see Matrix.import_from_npy()) are never fully loaded.
+
+        Args:
+            matrix (Matrix): a matrix. Labels must be unique.
+            weight (float): the weight of this matrix in the average.
+        """
+        symmetric = matrix.is_symmetric()
+        if self.symmetric is None:
+            self.symmetric = symmetric
+            if symmetric:
+                self.x_labels = self.y_labels
+                self.x_index = self.y_index
+        elif symmetric != self.symmetric:
+            raise ValueError(
+                "can't mix symmetric and non-symmetric matrices.")
+
+        y = self._get_indices(matrix.y_labels, self.y_index, self.y_labels)
+        x = self._get_indices(matrix.x_labels, self.x_index, self.x_labels)
+        self._grow()
+
+        for start in range(0, matrix.height(), matrix.block_size):
+            stop = min(matrix.height(), start + matrix.block_size)
+            cells = numpy.ix_(y[start:stop], x)
+            self._sums[cells] += weight * numpy.asarray(
+                matrix.data[start:stop], dtype=float)
+            self._weights[cells] += weight
+        self.matrices += 1
+
+    def get_weights(self):
+        """Get the total weight of the matrices that include each cell.
+
+        Returns:
+            numpy.array: a len(y_labels) x len(x_labels) array.
+        """
+        return self._weights[:len(self.y_labels), :len(self.x_labels)].copy()
+
+    def matrix(self):
+        """Get the consensus matrix.
+
+        Returns:
+            Matrix: the weighted mean of each cell. Cells that no matrix
+            included are 0.0.
+        """
+        h = len(self.y_labels)
+        w = len(self.x_labels)
+        sums = self._sums[:h, :w]
+        weights = self._weights[:h, :w]
+        m = Matrix()
+        m.y_labels = list(self.y_labels)
+        m.x_labels = list(self.x_labels)
+        m.data = numpy.zeros((h, w))
+        numpy.divide(sums, weights, out=m.data, where=weights > 0)
+        return m
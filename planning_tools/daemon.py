@@ -0,0 +1,351 @@
+"""Run commands in a warm daemon, to skip interpreter startup and imports.
+
+The daemon imports the libraries once, then forks a pool of worker processes
+that accept jobs on a Unix socket, like the uwsgi processes in
+planning_tools.ini. Each worker forks again for every job, so jobs start
+with the libraries loaded but can't change each other's state. The client
+forwards a command line, the working directory and its environment, streams
+stdin to the worker if the command reads "-", and streams stdout and stderr
+back as the job writes them.
+
+Each request is a JSON header line, {"argv": [...], "cwd": "...", "env":
+{...}}, followed by stdin. Each response is a series of frames: a one byte channel, b'o' for
+stdout, b'e' for stderr or b'x' for the exit status, a four byte big-endian
+length, and the data.
+"""
+import importlib
+import io
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import traceback
+
+from docopt import docopt
+
+FRAME = struct.Struct('>cI')
+
+# modules to import once, before forking, instead of in every job.
+PRELOAD = (
+    'concurrent.futures',
+    'graphviz',
+    'openpyxl',
+    'openpyxl.cell',
+    'openpyxl.styles',
+    'planning_tools.classes',
+    'planning_tools.cli',
+    'scipy.cluster.hierarchy',
+    'scipy.sparse.csgraph',
+    'scipy.spatial.distance'
+)
+
+
+def get_socket_path():
+    """Get the default socket path.
+
+    Returns:
+        str: $PLANNING_TOOLS_SOCKET, or a socket for this user in $TMPDIR.
+    """
+    return os.environ.get('PLANNING_TOOLS_SOCKET') or os.path.join(
+        os.environ.get('TMPDIR', '/tmp'),
+        'planning_tools-{}.sock'.format(os.getuid())
+    )
+
+
+class FrameWriter(io.RawIOBase):
+    """A binary file-like object that sends each write as a frame.
+
+    Args:
+        connection (socket.socket): the client connection.
+        channel (bytes): b'o' for stdout or b'e' for stderr.
+    """
+    def __init__(self, connection, channel):
+        self.connection = connection
+        self.channel = channel
+
+    def write(self, data):
+        if data:
+            self.connection.sendall(
+                FRAME.pack(self.channel, len(data)) + bytes(data))
+        return len(data)
+
+    def writable(self):
+        return True
+
+
+class Worker:
+    """Run jobs from a listening socket, one at a time, each in a forked
+    process.
+
+    Args:
+        listener (socket.socket): a listening Unix socket.
+    """
+    def __init__(self, listener):
+        self.listener = listener
+
+    @staticmethod
+    def get_commands():
+        from . import cli
+        return {
+            'cardsort': cli.cardsort,
+            'pairwise': cli.pairwise,
+            'planning-tools': cli.main,
+            'similarity': cli.similarity
+        }
+
+    def run_command(self, argv):
+        """Run a command line, like the interpreter would.
+
+        Args:
+            argv (list): the command name and its arguments.
+
+        Returns:
+            int: the exit status.
+        """
+        commands = self.get_commands()
+        if not argv or argv[0] not in commands:
+            sys.stderr.write('unknown command: {}\n'.format(
+                ' '.join(argv[:1])))
+            return 2
+        try:
+            commands[argv[0]](argv[1:])
+        except SystemExit as e:
+            if e.code is None:
+                return 0
+            if isinstance(e.code, int):
+                return e.code
+            sys.stderr.write('{}\n'.format(e.code))
+            return 1
+        except Exception:
+            traceback.print_exc()
+            return 1
+        return 0
+
+    def handle(self, connection):
+        """Run one job, with stdin, stdout and stderr on the connection, and
+        the client's working directory and environment."""
+        rfile = connection.makefile('rb')
+        header = json.loads(rfile.readline())
+        stdout = io.TextIOWrapper(
+            io.BufferedWriter(FrameWriter(connection, b'o'), 65536),
+            encoding='utf-8', newline='')
+        stderr = io.TextIOWrapper(
+            io.BufferedWriter(FrameWriter(connection, b'e')),
+            encoding='utf-8', line_buffering=True)
+        stdin = io.TextIOWrapper(rfile, encoding='utf-8')
+
+        streams = sys.stdin, sys.stdout, sys.stderr
+        cwd = os.getcwd()
+        environ = dict(os.environ)
+        try:
+            os.chdir(header['cwd'])
+            if 'env' in header:
+                os.environ.clear()
+                os.environ.update(header['env'])
+                tempfile.tempdir = None  # found again from $TMPDIR.
+            sys.stdin, sys.stdout, sys.stderr = stdin, stdout, stderr
+            status = self.run_command(header['argv'])
+            stdout.flush()
+            stderr.flush()
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = streams
+            os.chdir(cwd)
+            os.environ.clear()
+            os.environ.update(environ)
+            tempfile.tempdir = None
+        data = str(status).encode('ascii')
+        connection.sendall(FRAME.pack(b'x', len(data)) + data)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        while True:
+            connection, _ = self.listener.accept()
+            with connection:
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        self.listener.close()
+                        self.handle(connection)
+                    except OSError:
+                        # the client went away, e.g. output piped to head.
+                        pass
+                    except Exception:
+                        traceback.print_exc()
+                    finally:
+                        os._exit(0)
+                os.waitpid(pid, 0)
+
+
+def serve(path=None, workers=None):
+    """Listen for jobs until terminated.
+
+    Args:
+        path (str): the socket path, see get_socket_path().
+        workers (int): worker processes, defaults to one per CPU. Workers
+                       that die are replaced.
+    """
+    for name in PRELOAD:
+        importlib.import_module(name)
+
+    path = path or get_socket_path()
+    workers = workers or os.cpu_count() or 1
+
+    if os.path.exists(path):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.connect(path)
+        except OSError:
+            os.unlink(path)  # left behind by a daemon that was killed.
+        else:
+            raise RuntimeError('a daemon is already listening on ' + path)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        listener.bind(path)
+    finally:
+        os.umask(umask)
+    listener.listen(128)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    children = set()
+    try:
+        while True:
+            while len(children) < workers:
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        Worker(listener).run()
+                    finally:
+                        os._exit(1)
+                children.add(pid)
+            pid, _ = os.wait()
+            children.discard(pid)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+        listener.close()
+        os.unlink(path)
+
+
+def request(argv, path=None, stdin=None, stdout=None, stderr=None,
+            env=None):
+    """Run a command line on the daemon.
+
+    Args:
+        argv (list): the command name and its arguments, e.g.
+                     ['cardsort', 'average', 'cards.csv'].
+        path (str): the socket path, see get_socket_path().
+        stdin: a binary file-like object to send if the command reads "-".
+        stdout: a binary file-like object for the job's stdout.
+        stderr: a binary file-like object for the job's stderr.
+        env (dict): environment variables for the job, defaults to
+                    os.environ.
+
+    Returns:
+        int: the exit status of the job.
+    """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(path or get_socket_path())
+    with connection:
+        header = json.dumps({
+            'argv': argv,
+            'cwd': os.getcwd(),
+            'env': dict(os.environ if env is None else env)
+        }) + '\n'
+        connection.sendall(header.encode('utf-8'))
+
+        def send_stdin():
+            try:
+                if stdin is not None and '-' in argv[1:]:
+                    while True:
+                        data = stdin.read(65536)
+                        if not data:
+                            break
+                        connection.sendall(data)
+                connection.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+        # send stdin in a thread so that output can't block it.
+        sender = threading.Thread(target=send_stdin, daemon=True)
+        sender.start()
+
+        rfile = connection.makefile('rb')
+        while True:
+            head = rfile.read(FRAME.size)
+            if len(head) < FRAME.size:
+                raise ConnectionError('the daemon closed the connection.')
+            channel, size = FRAME.unpack(head)
+            data = rfile.read(size)
+            if channel == b'x':
+                return int(data)
+            out = stdout if channel == b'o' else stderr
+            if out is not None:
+                out.write(data)
+                out.flush()
+
+
+DAEMON_USAGE = """Usage:
+    planning-tools-daemon [--socket=<path>] [--workers=<n>]
+
+   Keep the planning tools loaded and run jobs from planning-tools-client.
+
+   Options:
+    --socket=<path>  the Unix socket to listen on. Defaults to
+                     $PLANNING_TOOLS_SOCKET, or a socket for this user in
+                     $TMPDIR.
+    --workers=<n>    jobs to run at once, defaults to one per CPU.
+"""
+
+CLIENT_USAGE = """Usage:
+    planning-tools-client [--socket=<path>] <command> [<args>...]
+
+   Run cardsort, similarity, pairwise or planning-tools on a running
+   planning-tools-daemon, e.g.:
+
+    planning-tools-client cardsort average cards.csv
+
+   Options:
+    --socket=<path>  the daemon's Unix socket, see planning-tools-daemon.
+"""
+
+
+def main(argv=None):
+    """The planning-tools-daemon command."""
+    arguments = docopt(DAEMON_USAGE, argv)
+    try:
+        serve(
+            arguments['--socket'],
+            int(arguments['--workers']) if arguments['--workers'] else None
+        )
+    except RuntimeError as e:
+        sys.exit(str(e))
+
+
+def client(argv=None):
+    """The planning-tools-client command."""
+    arguments = docopt(CLIENT_USAGE, argv, options_first=True)
+    path = arguments['--socket'] or get_socket_path()
+    try:
+        status = request(
+            [arguments['<command>']] + arguments['<args>'],
+            path,
+            sys.stdin.buffer,
+            sys.stdout.buffer,
+            sys.stderr.buffer
+        )
+    except (ConnectionError, FileNotFoundError):
+        sys.exit('no planning-tools-daemon is listening on ' + path)
+    sys.exit(status)
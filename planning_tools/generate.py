@@ -0,0 +1,283 @@
+"""Deterministic synthetic data with planted clusters, for testing at scale.
+
+Every generator takes a seed and produces the same output for the same
+arguments. Output is written a chunk of items at a time, so files of any
+size can be generated in a small amount of memory: only a cluster id per
+item is kept.
+"""
+import csv
+import numpy
+
+from .progress import step
+from .tables import _write_csv_blocks
+
+CHUNK = 4096  # items per chunk. Changing it changes the output.
+
+GROUP_SIZES = ('uniform', 'zipf')
+
+
+def get_clusters(items, clusters, group_sizes='uniform', seed=0):
+    """Assign items to planted clusters.
+
+    Args:
+        items (int): the number of items.
+        clusters (int): the number of clusters.
+        group_sizes (str): 'uniform' for clusters of about the same size, or
+                           'zipf' for a few large clusters and many small
+                           ones, with sizes proportional to 1 / rank.
+        seed (int): a random seed.
+
+    Returns:
+        numpy.array: a cluster id for each item.
+    """
+    if group_sizes not in GROUP_SIZES:
+        raise ValueError(
+            'group_sizes must be one of ' + ', '.join(GROUP_SIZES))
+    weights = numpy.ones(clusters)
+    if group_sizes == 'zipf':
+        weights = 1.0 / numpy.arange(1, clusters + 1)
+    rng = numpy.random.default_rng([seed, 0])
+    return rng.choice(clusters, items, p=weights / weights.sum())
+
+
+def _chunk_rng(seed, kind, *index):
+    return numpy.random.default_rng([seed, kind] + list(index))
+
+
+def write_cardsort(f, items=1000, participants=30, clusters=10,
+                   group_sizes='uniform', noise=0.2, coverage=1.0, seed=0,
+                   progress=None, cancel=None):
+    """Write card sort data in CSV format, see CardSort.
+
+    Notes:
+        Each participant sorts each item into the group for its planted
+        cluster, or, with probability noise, into a random group.
+
+    Args:
+        f: a file-like object, opened for writing text.
+        items (int): the number of items.
+        participants (int): the number of participants.
+        clusters (int): the number of planted clusters.
+        group_sizes (str): see get_clusters().
+        noise (float): the chance that an item is put in a random group.
+        coverage (float): the chance that a participant sorts each item.
+        seed (int): a random seed.
+        progress: a function of (rows done, rows), called after each
+                  chunk, or None.
+        cancel (CancellationToken): checked after each chunk, or None.
+    """
+    truth = get_clusters(items, clusters, group_sizes, seed)
+    writer = csv.writer(f)
+    for p in range(participants):
+        participant = 'participant {}'.format(p + 1)
+        for start in range(0, items, CHUNK):
+            stop = min(items, start + CHUNK)
+            rng = _chunk_rng(seed, 1, p, start // CHUNK)
+            groups = numpy.where(rng.random(stop - start) < noise,
+                                 rng.integers(0, clusters, stop - start),
+                                 truth[start:stop])
+            kept = rng.random(stop - start) < coverage
+            writer.writerows(
+                (participant, 'group {}'.format(g + 1),
+                 'item {}'.format(start + i + 1))
+                for i, g in enumerate(groups.tolist()) if kept[i]
+            )
+            step(progress, cancel, p * items + stop, participants * items)
+
+
+def write_similarity(f, items=1000, discrete=3, continuous=3, clusters=10,
+                     group_sizes='uniform', noise=0.2, seed=0, progress=None,
+                     cancel=None):
+    """Write fielded data in CSV format, see Similarity.
+
+    Notes:
+        Each planted cluster has a value for every discrete field, and a
+        center from 10 to 100 for every continuous field. Records take their
+        cluster's values, with normally distributed continuous values, or,
+        with probability noise, a random value for each field.
+
+    Args:
+        f: a file-like object, opened for writing text.
+        items (int): the number of records.
+        discrete (int): the number of discrete fields.
+        continuous (int): the number of continuous fields.
+        clusters (int): the number of planted clusters.
+        group_sizes (str): see get_clusters().
+        noise (float): the chance that a field gets a random value.
+        seed (int): a random seed.
+        progress: a function of (records done, records), called after each
+                  chunk, or None.
+        cancel (CancellationToken): checked after each chunk, or None.
+    """
+    truth = get_clusters(items, clusters, group_sizes, seed)
+    rng = _chunk_rng(seed, 2)
+    values = rng.integers(0, 5, (clusters, discrete))
+    centers = rng.uniform(10, 100, (clusters, continuous))
+    fields = ['discrete {}'.format(i + 1) for i in range(discrete)] + \
+        ['continuous {}'.format(i + 1) for i in range(continuous)]
+
+    writer = csv.writer(f)
+    writer.writerow([''] + fields)
+    for start in range(0, items, CHUNK):
+        stop = min(items, start + CHUNK)
+        n = stop - start
+        rng = _chunk_rng(seed, 3, start // CHUNK)
+        d = numpy.where(rng.random((n, discrete)) < noise,
+                        rng.integers(0, 5, (n, discrete)),
+                        values[truth[start:stop]])
+        c = numpy.where(rng.random((n, continuous)) < noise,
+                        rng.uniform(0, 110, (n, continuous)),
+                        rng.normal(centers[truth[start:stop]], 5.0))
+        c = numpy.clip(c, 0.0, None)  # Similarity reads "-" as text.
+        writer.writerows(
+            ['record {}'.format(start + i + 1)] +
+            ['value {}'.format(v) for v in d_row] +
+            ['{:.2f}'.format(v) for v in c_row]
+            for i, (d_row, c_row) in enumerate(zip(d.tolist(), c.tolist()))
+        )
+        step(progress, cancel, stop, items)
+    writer.writerow([''] * (len(fields) + 1))
+    writer.writerow(['field_type'] + ['discrete'] * discrete +
+                    ['continuous'] * continuous)
+    writer.writerow(['weight'] + [1] * len(fields))
+    writer.writerow(['match_difference'] + [0] * discrete + [5] * continuous)
+    writer.writerow(['no_match_difference'] + [1] * discrete +
+                    [30] * continuous)
+
+
+def write_interactions(f, items=100, variables=9, clusters=5,
+                       group_sizes='uniform', noise=0.2, seed=0,
+                       progress=None, cancel=None):
+    """Write interactions data in CSV format, see Interactions.
+
+    Notes:
+        Each planted cluster has a profile of values from -2 to 2, one for
+        each variable. Elements take their cluster's values, or, with
+        probability noise, a random value for each variable. Every element
+        supports at least one variable, since balancing factors divide by
+        the number of variables two elements support.
+
+    Args:
+        f: a file-like object, opened for writing text.
+        items (int): the number of elements.
+        variables (int): the number of variables.
+        clusters (int): the number of planted clusters.
+        group_sizes (str): see get_clusters().
+        noise (float): the chance that a variable gets a random value.
+        seed (int): a random seed.
+        progress: a function of (elements done, elements), called after each
+                  chunk, or None.
+        cancel (CancellationToken): checked after each chunk, or None.
+    """
+    truth = get_clusters(items, clusters, group_sizes, seed)
+    rng = _chunk_rng(seed, 4)
+    profiles = rng.integers(-2, 3, (clusters, variables))
+    weights = rng.integers(1, 4, variables)
+
+    writer = csv.writer(f)
+    writer.writerow([''] + ['variable {}'.format(i + 1)
+                            for i in range(variables)])
+    for start in range(0, items, CHUNK):
+        stop = min(items, start + CHUNK)
+        n = stop - start
+        rng = _chunk_rng(seed, 5, start // CHUNK)
+        v = numpy.where(rng.random((n, variables)) < noise,
+                        rng.integers(-2, 3, (n, variables)),
+                        profiles[truth[start:stop]])
+        v[(v > 0).sum(axis=1) == 0, 0] = 1
+        writer.writerows(
+            ['element {}'.format(start + i + 1)] + row
+            for i, row in enumerate(v.tolist())
+        )
+        step(progress, cancel, stop, items)
+    writer.writerow([''] * (variables + 1))
+    writer.writerow(['weight'] + weights.tolist())
+    writer.writerow(['neg_min'] + [-2] * variables)
+    writer.writerow(['pos_max'] + [2] * variables)
+
+
+def _splitmix64(x):
+    # a fast, well-mixed hash of uint64 arrays.
+    x = x + numpy.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> numpy.uint64(30))) * numpy.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> numpy.uint64(27))) * numpy.uint64(0x94D049BB133111EB)
+    return x ^ (x >> numpy.uint64(31))
+
+
+class SyntheticMatrix:
+    """A similarity matrix with planted clusters, computed on demand.
+
+    Notes:
+        Pairs in the same planted cluster have a similarity of 0.8, other
+        pairs 0.2, plus uniform noise of up to +/- noise, clipped to 0.0 to
+        1.0. The noise for a pair is a hash of the seed and the pair, so any
+        block of the matrix can be computed on its own, and the matrix is
+        symmetric. Like CardSort and Similarity, this is a source for
+        Matrix.import_from_source().
+
+    Args:
+        items (int): the number of items.
+        clusters (int): the number of planted clusters.
+        group_sizes (str): see get_clusters().
+        noise (float): the largest change from 0.8 or 0.2.
+        seed (int): a random seed.
+    """
+    def __init__(self, items=1000, clusters=10, group_sizes='uniform',
+                 noise=0.2, seed=0):
+        self.items = items
+        self.noise = noise
+        self.seed = seed
+        self.clusters = get_clusters(items, clusters, group_sizes, seed)
+        self._salt = _splitmix64(numpy.array([seed], dtype=numpy.uint64))[0]
+
+    def get_elements(self):
+        """Get item labels, in the order of the matrix.
+
+        Returns:
+            list: labels.
+        """
+        return ['item {}'.format(i + 1) for i in range(self.items)]
+
+    def get_similarity_block(self, y_indices, x_indices):
+        """Get similarities for a block of item pairs.
+
+        Args:
+            y_indices (list): item indices for the rows of the block.
+            x_indices (list): item indices for the columns of the block.
+
+        Returns:
+            numpy.array: a len(y_indices) x len(x_indices) array of floats,
+            with 1.0 for pairs of an item with itself.
+        """
+        y = numpy.asarray(y_indices, dtype=numpy.uint64)[:, None]
+        x = numpy.asarray(x_indices, dtype=numpy.uint64)[None, :]
+        key = (numpy.minimum(y, x) << numpy.uint64(32)) | numpy.maximum(y, x)
+        key ^= self._salt
+        u = (_splitmix64(key) >> numpy.uint64(11)) * 2.0 ** -53
+
+        same = self.clusters[y.astype(numpy.intp)] == \
+            self.clusters[x.astype(numpy.intp)]
+        block = numpy.where(same, 0.8, 0.2) + self.noise * (2 * u - 1)
+        block = numpy.clip(block, 0.0, 1.0)
+        block[y == x] = 1.0
+        return block
+
+    def write_csv(self, f, precision=3, block_size=None, progress=None,
+                  cancel=None):
+        """Write the matrix in CSV format, like pairwise input, with the
+        lower triangle and diagonal filled in.
+
+        Args:
+            f: a file-like object, opened for writing text.
+            precision (int): decimal places to round values to, or None for
+                             full precision.
+            block_size (int): rows to compute and write at once, defaults
+                              to about a million cells' worth.
+            progress: a function of (rows done, rows), or None.
+            cancel (CancellationToken): checked after each block, or None.
+        """
+        if block_size is None:
+            block_size = max(1, 2 ** 20 // max(1, self.items))
+        _write_csv_blocks(f, self.get_elements(), self.get_similarity_block,
+                          precision, block_size, lower=True,
+                          progress=progress, cancel=cancel)
@@ -0,0 +1,248 @@
+import csv
+import io
+import numpy
+
+
+def get_top_k(scores, k):
+    """Get the columns of the k highest scores in each row.
+
+    Args:
+        scores (numpy.array): a 2-d array. Set cells that shouldn't be
+                              picked, like an item's score with itself, to
+                              a low value first.
+        k (int): the number of columns to pick from each row.
+
+    Returns:
+        numpy.array: a len(scores) x k array of column indices, in no
+        particular order within a row.
+    """
+    if k < 1:
+        return numpy.empty((len(scores), 0), dtype=numpy.intp)
+    return numpy.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+class SimilarityGraph:
+    """Cluster items as communities of a sparse similarity graph.
+
+    Notes:
+        Items are nodes, and the most similar pairs of items are edges
+        weighted by their similarity. Edges come from a threshold (every pair
+        at least that similar) or from each item's k nearest neighbours, or
+        both. The graph is built one block of rows at a time from any source
+        with get_elements() and get_similarity_block() methods (CardSort,
+        Similarity or Matrix), so memory grows with the number of edges
+        rather than with the square of the number of items.
+
+        Communities are found with the Louvain method: nodes move greedily to
+        the neighbouring community that most increases modularity, then each
+        community is collapsed into a single node and the process repeats
+        until nothing moves.
+
+    References:
+        Louvain method: https://en.wikipedia.org/wiki/Louvain_method
+    """
+
+    def __init__(self):
+        """Constructor"""
+        self.labels = []        # list of strings.
+        self.adjacency = None   # symmetric scipy.sparse.csr_matrix.
+        self.components = None  # numpy.array, component of each item.
+        self.communities = None  # numpy.array, community of each item.
+
+    def import_from_source(self, source, threshold=None, k=None,
+                           block_cells=2 ** 24):
+        """Build the graph from similarity data.
+
+        Args:
+            source: a CardSort, Similarity or Matrix object.
+            threshold (float): keep pairs with at least this similarity.
+            k (int): keep each item's k most similar items.
+            block_cells (int): similarity scores to compute at once.
+        """
+        from scipy import sparse
+
+        assert threshold is not None or k is not None
+        self.labels = source.get_elements()
+        n = len(self.labels)
+        block_size = max(1, block_cells // max(n, 1))
+        everything = numpy.arange(n)
+
+        rows = []
+        cols = []
+        weights = []
+        for start in range(0, n, block_size):
+            block = numpy.arange(start, min(n, start + block_size))
+            scores = numpy.asarray(
+                source.get_similarity_block(block, everything), dtype=float)
+            scores[numpy.arange(len(block)), block] = 0.0
+            if k is not None:
+                kk = min(k, n - 1)
+                if kk < 1:
+                    continue
+                y = numpy.repeat(numpy.arange(len(block)), kk)
+                x = get_top_k(scores, kk).ravel()
+            else:
+                y, x = numpy.nonzero(scores >= threshold)
+            w = scores[y, x]
+            keep = w > 0.0
+            if threshold is not None:
+                keep &= w >= threshold
+            rows.append(block[y[keep]])
+            cols.append(x[keep])
+            weights.append(w[keep])
+
+        adjacency = sparse.coo_matrix(
+            (numpy.concatenate(weights or [numpy.empty(0)]),
+             (numpy.concatenate(rows or [numpy.empty(0, numpy.intp)]),
+              numpy.concatenate(cols or [numpy.empty(0, numpy.intp)]))),
+            shape=(n, n)
+        ).tocsr()
+        self.adjacency = adjacency.maximum(adjacency.T).tocsr()
+        self.components = None
+        self.communities = None
+
+    def get_components(self):
+        """Find the connected components of the graph.
+
+        Returns:
+            numpy.array: a component number for each item.
+        """
+        from scipy.sparse import csgraph
+
+        _, self.components = csgraph.connected_components(
+            self.adjacency, directed=False)
+        return self.components
+
+    def modularity(self, communities, resolution=1.0):
+        """Get the modularity of a partition of the graph.
+
+        Args:
+            communities (numpy.array): a community number for each item.
+            resolution (float): larger values favour smaller communities.
+
+        Returns:
+            float: modularity, from -0.5 to 1.0.
+        """
+        communities = numpy.asarray(communities)
+        m2 = self.adjacency.sum()
+        if m2 == 0:
+            return 0.0
+        coo = self.adjacency.tocoo()
+        inside = coo.data[communities[coo.row] == communities[coo.col]].sum()
+        degrees = numpy.asarray(self.adjacency.sum(axis=1)).ravel()
+        totals = numpy.bincount(communities, weights=degrees)
+        return inside / m2 - resolution * (totals ** 2).sum() / m2 ** 2
+
+    @staticmethod
+    def _move_nodes(adjacency, resolution, rng):
+        """Run the local moving phase of the Louvain method on one level.
+
+        Returns:
+            tuple: (moved, communities), where communities are renumbered
+            from 0.
+        """
+        n = adjacency.shape[0]
+        indptr = adjacency.indptr.tolist()
+        indices = adjacency.indices.tolist()
+        data = adjacency.data.tolist()
+        degrees = numpy.asarray(adjacency.sum(axis=1)).ravel().tolist()
+        m2 = float(sum(degrees))
+
+        communities = list(range(n))
+        totals = list(degrees)
+        moved = False
+        improved = True
+        while improved:
+            improved = False
+            for i in rng.permutation(n).tolist():
+                current = communities[i]
+                k_i = degrees[i]
+                links = {current: 0.0}
+                for p in range(indptr[i], indptr[i + 1]):
+                    j = indices[p]
+                    if j != i:
+                        c = communities[j]
+                        links[c] = links.get(c, 0.0) + data[p]
+
+                totals[current] -= k_i
+                best = current
+                best_gain = links[current] - \
+                    resolution * totals[current] * k_i / m2
+                for c, w in links.items():
+                    gain = w - resolution * totals[c] * k_i / m2
+                    if gain > best_gain + 1e-12:
+                        best = c
+                        best_gain = gain
+                totals[best] += k_i
+                if best != current:
+                    communities[i] = best
+                    improved = True
+                    moved = True
+
+        _, communities = numpy.unique(communities, return_inverse=True)
+        return moved, communities
+
+    def louvain(self, resolution=1.0, seed=None):
+        """Find communities with the Louvain method.
+
+        Args:
+            resolution (float): larger values favour smaller communities.
+            seed (int): random seed for the order nodes are visited in.
+
+        Returns:
+            numpy.array: a community number for each item, numbered from the
+            largest community down.
+        """
+        from scipy import sparse
+
+        rng = numpy.random.default_rng(seed)
+        n = self.adjacency.shape[0]
+        communities = numpy.arange(n)
+        adjacency = self.adjacency
+        if adjacency.sum() > 0:
+            while True:
+                moved, level = self._move_nodes(adjacency, resolution, rng)
+                communities = level[communities]
+                if not moved:
+                    break
+                # collapse each community into a single node.
+                p = sparse.csr_matrix(
+                    (numpy.ones(len(level)), (numpy.arange(len(level)), level)))
+                adjacency = (p.T @ adjacency @ p).tocsr()
+
+        sizes = numpy.bincount(communities)
+        rank = numpy.empty(len(sizes), dtype=numpy.intp)
+        rank[numpy.argsort(-sizes, kind='stable')] = numpy.arange(len(sizes))
+        self.communities = rank[communities]
+        return self.communities
+
+    def get_order(self):
+        """Get an item order that groups communities together.
+
+        Notes:
+            Communities come largest first. Within a community, items are
+            ordered by weighted degree, most connected first.
+
+        Returns:
+            numpy.array: item indices.
+        """
+        if self.communities is None:
+            self.louvain()
+        degrees = numpy.asarray(self.adjacency.sum(axis=1)).ravel()
+        return numpy.lexsort((-degrees, self.communities))
+
+    def csv(self):
+        """Get components and communities as CSV, grouped by community.
+
+        Returns:
+            str: CSV data with label, component and community columns.
+        """
+        if self.components is None:
+            self.get_components()
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['label', 'component', 'community'])
+        for i in self.get_order():
+            writer.writerow([self.labels[i], self.components[i],
+                             self.communities[i]])
+        return output.getvalue()
@@ -0,0 +1,159 @@
+import heapq
+import numpy
+
+from .progress import step
+
+
+class InsightCluster:
+    """Order rows or columns with the insight matrix clustering algorithm.
+
+    Notes:
+        This is the clustering algorithm from the InsightMatrix program. Rows
+        (or columns) are compared by their cityblock distance, and the
+        closest pair of clusters is merged until one cluster is left. The
+        distances from a merged cluster to every other cluster are the
+        average (or the sum) of the distances from its two parts, a
+        Lance-Williams style update done in place on one row and column.
+        Clusters are sequences of items rather than sets: when two sequences
+        are joined, each can be reversed so that the two closest endpoints
+        end up next to each other.
+
+        The closest pair is found with a heap of each cluster's nearest
+        neighbour. Stale heap entries are skipped when they are popped, so
+        each merge costs O(n log n) instead of a scan of the whole matrix.
+
+    Args:
+        data (numpy.array): a matrix.
+        average (bool): average the distances of merged clusters if True, sum
+                        them if False.
+    """
+    def __init__(self, data, average=True):
+        self.data = numpy.asarray(data, dtype=float)
+        self.average = average
+
+    def get_items(self, axis=0):
+        """Get the rows, or columns, to cluster.
+
+        Args:
+            axis (int): 0 for rows, 1 for columns.
+
+        Returns:
+            numpy.array: one row per item.
+        """
+        if axis == 0:
+            return self.data
+        return numpy.ascontiguousarray(self.data.T)
+
+    def get_delta_matrix(self, axis=0):
+        """Get the cityblock distances between rows, or columns.
+
+        Args:
+            axis (int): 0 to compare rows, 1 to compare columns.
+
+        Returns:
+            numpy.array: a square matrix with zeros on the diagonal.
+        """
+        from scipy.spatial.distance import pdist, squareform
+
+        items = self.get_items(axis)
+        if len(items) < 2:
+            return numpy.zeros((len(items), len(items)))
+        return squareform(pdist(items, 'cityblock'))
+
+    def cluster(self, axis=0, progress=None, cancel=None):
+        """Cluster rows, or columns.
+
+        Args:
+            axis (int): 0 for rows, 1 for columns.
+            progress: a function of (merges done, merges), called every 1024
+                      merges.
+            cancel (CancellationToken): checked every 1024 merges.
+
+        Returns:
+            tuple: the new order of items as a list, and a linkage in the
+            format of scipy.cluster.hierarchy.linkage(). Every node of the
+            linkage covers a contiguous run of the order.
+        """
+        items = self.get_items(axis)
+        n = len(items)
+        z = numpy.zeros((max(0, n - 1), 4))
+        if n < 2:
+            return list(range(n)), z
+
+        delta = self.get_delta_matrix(axis)
+        numpy.fill_diagonal(delta, numpy.inf)
+        active = numpy.ones(n, dtype=bool)
+        sequences = [[i] for i in range(n)]
+        nodes = numpy.arange(n)
+
+        # each cluster's nearest neighbour, in a heap of (distance, cluster,
+        # version). Entries with an old version are stale.
+        neighbours = numpy.argmin(delta, axis=1)
+        distances = delta[numpy.arange(n), neighbours]
+        versions = numpy.zeros(n, dtype=numpy.int64)
+        heap = list(zip(distances.tolist(), range(n), [0] * n))
+        heapq.heapify(heap)
+
+        def refresh(rows):
+            neighbours[rows] = numpy.argmin(delta[rows], axis=1)
+            distances[rows] = delta[rows, neighbours[rows]]
+            versions[rows] += 1
+            for r in rows.tolist():
+                heapq.heappush(heap, (distances[r], r, versions[r]))
+
+        for m in range(n - 1):
+            if m % 1024 == 0:
+                step(progress, cancel, m, n - 1)
+            while True:
+                d, a, version = heapq.heappop(heap)
+                if active[a] and version == versions[a]:
+                    break
+            i, j = sorted((a, int(neighbours[a])))
+
+            # merge j into i, updating i's row and column in place.
+            row = delta[i] + delta[j]
+            if self.average:
+                row /= 2.0
+            row[~active] = numpy.inf
+            row[[i, j]] = numpy.inf
+            delta[i, :] = row
+            delta[:, i] = row
+            delta[j, :] = numpy.inf
+            delta[:, j] = numpy.inf
+            active[j] = False
+
+            sequences[i] = self._join(items, sequences[i], sequences[j])
+            sequences[j] = None
+            z[m] = [min(nodes[i], nodes[j]), max(nodes[i], nodes[j]), d,
+                    len(sequences[i])]
+            nodes[i] = n + m
+
+            # clusters whose nearest neighbour was merged need a new one;
+            # others may now be closest to the merged cluster.
+            stale = active & ((neighbours == i) | (neighbours == j))
+            stale[i] = True
+            closer = active & ~stale & (row < distances)
+            neighbours[closer] = i
+            distances[closer] = row[closer]
+            versions[closer] += 1
+            for r in numpy.flatnonzero(closer).tolist():
+                heapq.heappush(heap, (distances[r], r, versions[r]))
+            if m < n - 2:
+                refresh(numpy.flatnonzero(stale))
+
+        step(progress, None, n - 1, n - 1)
+        return sequences[int(numpy.flatnonzero(active)[0])], z
+
+    @staticmethod
+    def _join(items, a, b):
+        # join two sequences so that the closest pair of endpoints meet.
+        def delta(x, y):
+            return numpy.abs(items[x] - items[y]).sum()
+
+        options = (
+            (delta(a[-1], b[0]), lambda: a + b),
+            (delta(a[-1], b[-1]), lambda: a + b[::-1]),
+            (delta(a[0], b[0]), lambda: a[::-1] + b),
+            (delta(a[0], b[-1]), lambda: b + a)
+        )
+        return min(options, key=lambda option: option[0])[1]()
@@ -0,0 +1,1482 @@
+import base64
+import csv
+import io
+import json
+import numpy
+import random
+import struct
+import zlib
+
+from xml.sax.saxutils import escape as xml_escape
+from .approximate import ApproximateCluster, DisjointSet
+from .graph import SimilarityGraph, get_top_k
+from .insight import InsightCluster
+from .profiling import section
+from .progress import step
+from .tables import AtomicFile, _get_matrix_rows, _get_xlsx_rows, \
+    _write_csv_blocks, _write_xlsx_rows
+
+
+def _to_float(cell):
+    try:
+        return float(cell)
+    except ValueError:
+        return 0.0
+
+
+class Matrix:
+    """A class to manipulate matrix objects.
+
+    Notes:
+        This class includes methods to manipulate matrices of data, e.g. by 
+        clustering and sorting them. It uses scipy to produce a dendrogram
+        for sorting information.
+    """
+    block_size = 1024  # rows to process at once in blocked computations.
+
+    def __init__(self):
+        """Initialize the Matrix object.
+        """
+        self.x_labels = []  # list of strings, see x_index.
+        self.y_labels = []  # list of strings, see y_index.
+        self.data = None   # numpy.array or None.
+        # Elements should be floats from 0.0 to 1.0.
+
+        # linkages from the last call to cluster(), or None. Leaf ids in a
+        # linkage refer to the row (or column) order at clustering time;
+        # y_leaves[i] is the leaf id of the row currently at position i.
+        self.y_linkage = None
+        self.x_linkage = None
+        self.y_leaves = None
+        self.x_leaves = None
+
+        # set by collapse(): (labels, data, groups) of the full matrix.
+        self.collapsed = None
+
+    @property
+    def y_labels(self):
+        return self._y_labels
+
+    @y_labels.setter
+    def y_labels(self, labels):
+        self._y_labels = labels
+        self._y_index = None
+
+    @property
+    def x_labels(self):
+        return self._x_labels
+
+    @x_labels.setter
+    def x_labels(self, labels):
+        self._x_labels = labels
+        self._x_index = None
+
+    @property
+    def y_index(self):
+        """dict: row label -> row position.
+
+        Notes:
+            The index is built on first use and dropped whenever y_labels is
+            assigned. Assign a new list instead of changing labels in place.
+        """
+        if self._y_index is None:
+            self._y_index = {l: i for i, l in enumerate(self._y_labels)}
+        return self._y_index
+
+    @property
+    def x_index(self):
+        """dict: column label -> column position, see y_index."""
+        if self._x_index is None:
+            self._x_index = {l: i for i, l in enumerate(self._x_labels)}
+        return self._x_index
+
+    def import_from_csv(self, csv_file):
+        """Imports data and labels from a CSV file.
+
+        Args:
+            csv_file: a file-like object.
+        """
+        self.import_from_rows(csv.reader(csv_file))
+
+    def import_from_xlsx(self, f, sheet=None):
+        """Imports data and labels from an Excel workbook laid out like a CSV
+        file. The workbook is read in openpyxl's read-only mode.
+
+        Args:
+            f: a path or a file-like object, opened for reading bytes.
+            sheet (str): a worksheet title, or None for the first worksheet.
+        """
+        self.import_from_rows(_get_xlsx_rows(f, sheet))
+
+    def import_from_rows(self, reader):
+        """Imports data and labels from rows of strings, e.g. from a
+        csv.reader. Short rows are padded with 0.0.
+
+        Notes:
+            Cells are converted to floats a row at a time, falling back to
+            one cell at a time only for rows with cells that aren't numbers.
+            Those cells, like empty cells, become 0.0.
+
+        Args:
+            reader: an iterable of lists.
+        """
+        data = []
+        y_labels = []
+
+        reader = iter(reader)
+        self.x_labels = next(reader, None)[1:]
+
+        for row in reader:
+            y_labels.append(row[0])
+            cells = [cell or '0' for cell in row[1:]]
+            try:
+                data.append(numpy.fromiter(map(float, cells), float,
+                                           len(cells)))
+            except ValueError:
+                data.append(numpy.array([_to_float(c) for c in cells]))
+        self.y_labels = y_labels
+        if data:
+            width = max(len(self.x_labels), max(len(d) for d in data))
+            self.data = numpy.zeros((len(data), width))
+            for y, d in enumerate(data):
+                self.data[y, :len(d)] = d
+        self.fill()
+
+    def import_comparisons_from_csv(self, csv_file, symmetric=True):
+        """Imports labels and data from a CSV file of comparisons.
+
+        Notes:
+            Each row holds one comparison: a y label, an x label and a
+            value, e.g. as exported from the web application. Labels are
+            kept in the order they first appear. Use import_data() for
+            comparisons that are already in memory.
+
+        Args:
+            csv_file: a file-like object.
+            symmetric (bool): if True, rows and columns share one list of
+                              labels, and each value is stored on both sides
+                              of the diagonal.
+        """
+        y_labels = []
+        x_labels = []
+        values = []
+        for row in csv.reader(csv_file):
+            if not row:
+                continue
+            y_labels.append(row[0])
+            x_labels.append(row[1])
+            values.append(float(row[2]))
+
+        if symmetric:
+            labels = list(dict.fromkeys(y_labels + x_labels))
+            self.import_labels(labels, labels)
+        else:
+            self.import_labels(list(dict.fromkeys(x_labels)),
+                               list(dict.fromkeys(y_labels)))
+        self.import_comparisons(y_labels, x_labels, values, symmetric)
+
+    def import_from_npy(self, path, mmap_mode='r'):
+        """Imports data from a NumPy .npy file and labels from its sidecar.
+
+        Notes:
+            Labels are read from a JSON file next to the data, see
+            export_npy(). By default the data is memory-mapped read-only, so
+            only the parts of a large matrix that are used are read from
+            disk.
+
+        Args:
+            path (str): path to the .npy file.
+            mmap_mode (str): passed to numpy.load(), or None to read the
+                             whole file into memory.
+        """
+        with open(path + '.labels.json') as f:
+            labels = json.load(f)
+        self.y_labels = labels['y_labels']
+        self.x_labels = labels['x_labels']
+        self.data = numpy.load(path, mmap_mode=mmap_mode)
+
+    def export_npy(self, path):
+        """Exports data to a NumPy .npy file and labels to a JSON sidecar.
+
+        Args:
+            path (str): path to the .npy file. Labels are written to
+                        path + '.labels.json'.
+        """
+        with AtomicFile(path, 'wb') as f:
+            numpy.save(f, self.data, allow_pickle=False)
+        with AtomicFile(path + '.labels.json') as f:
+            json.dump({'y_labels': self.y_labels, 'x_labels': self.x_labels},
+                      f)
+
+    def import_labels(self, x_labels, y_labels):
+        """Imports lists of labels.
+
+        Notes:
+            This starts a new matrix: the identity matrix if the labels are
+            the same on both axes, or zeros otherwise. Fill it in with
+            import_data() or import_comparisons().
+
+        Args:
+            x_labels (list): column labels.
+            y_labels (list): row labels.
+        """
+        self.x_labels = x_labels
+        self.y_labels = y_labels
+        if self.x_labels == self.y_labels:
+            self.data = numpy.identity(len(self.x_labels))
+        else:
+            self.data = numpy.zeros((len(self.y_labels), len(self.x_labels)))
+
+    def import_comparisons(self, y_labels, x_labels, values, mirror=False):
+        """Imports comparisons from parallel sequences.
+
+        Notes:
+            Labels are looked up in y_index and x_index, and all values are
+            stored with one vectorized assignment. If a pair appears more
+            than once, the last value is kept.
+
+        Args:
+            y_labels (list): a row label for each comparison.
+            x_labels (list): a column label for each comparison.
+            values (list): a value for each comparison.
+            mirror (bool): also store each value at (x, y), for symmetric
+                           matrices with one value per pair.
+
+        Raises:
+            ValueError: if a label isn't in the matrix.
+        """
+        def positions(labels, index):
+            try:
+                return numpy.fromiter((index[l] for l in labels),
+                                      dtype=numpy.intp, count=len(labels))
+            except KeyError as e:
+                raise ValueError('unknown label: {}'.format(e.args[0]))
+
+        y = positions(y_labels, self.y_index)
+        x = positions(x_labels, self.x_index)
+        values = numpy.asarray(values, dtype=float)
+        self.data[y, x] = values
+        if mirror:
+            self.data[x, y] = values
+
+    def import_data(self, comparisons, mirror=False):
+        """Imports comparisons.
+
+        Args:
+            comparisons (list): (y label, x label, value) tuples, or objects
+                                with y_label, x_label and comparison
+                                attributes.
+            mirror (bool): see import_comparisons().
+
+        Raises:
+            ValueError: if a label isn't in the matrix.
+        """
+        y_labels = []
+        x_labels = []
+        values = []
+        for c in comparisons:
+            if isinstance(c, tuple):
+                y_label, x_label, value = c
+            else:
+                y_label, x_label, value = c.y_label, c.x_label, c.comparison
+            y_labels.append(y_label)
+            x_labels.append(x_label)
+            values.append(value)
+        self.import_comparisons(y_labels, x_labels, values, mirror)
+
+    def get_elements(self):
+        """Get the labels of a symmetric matrix, e.g. for ApproximateCluster.
+
+        Returns:
+            list: y labels.
+        """
+        return list(self.y_labels)
+
+    def get_similarity_block(self, y_indices, x_indices):
+        """Get a block of the matrix.
+
+        Args:
+            y_indices (list): row indices.
+            x_indices (list): column indices.
+
+        Returns:
+            numpy.array: a len(y_indices) x len(x_indices) array.
+        """
+        return self.data[numpy.ix_(y_indices, x_indices)]
+
+    def width(self):
+        return self.data.shape[1]
+
+    def height(self):
+        return self.data.shape[0]
+
+    def max(self):
+        """
+        Returns:
+            float: the maximum value in the matrix.
+        """
+        return float(self.data.max())
+
+    def is_symmetric(self):
+        """Check to be sure a matrix is symmetric. 
+
+        Returns:
+            bool
+        """
+        if self.width() != self.height():
+            return False
+        if self.x_labels != self.y_labels:
+            return False
+        return True
+
+    def get_symmetric_index_pairs(self, upper=True):
+        """Get all the index pairs necessary for a symmetric matrix,
+           for either the upper or lower triangle of the matrix. 
+
+        Args:
+            upper (bool): if True return indices for an upper triangle, if
+            False return indices for a lower triangle.
+
+        Returns:
+            list: index pairs. 
+        """
+        assert self.width() == self.height()
+
+        if upper:
+            return list(zip(*numpy.triu_indices(self.width())))
+        else:
+            return list(zip(*numpy.tril_indices(self.width())))
+
+    def scale(self):
+        raise NotImplementedError
+
+    def fill(self, upper=True):
+        """Fill in a symmetric matrix by copying the lower triangle to the
+        upper triangle, or vice versa.
+
+        Args:
+            upper (bool): Fill the upper triangle if true, fill the lower
+            triangle if false.
+        """
+        if self.is_symmetric():
+            if upper:
+                x, y = numpy.triu_indices(self.width())
+            else:
+                x, y = numpy.tril_indices(self.width())
+            self.data[x, y] = self.data[y, x]
+
+    def reorder(self, y_order, x_order=None):
+        """Reorder the matrix.
+
+        Args:
+            y_order (list): indices for the new y matrix order.
+            x_order (list): indices for the new x matrix order, or None for
+                            symmetric matrices. 
+        """
+        if self.is_symmetric():
+            x_order = y_order
+        assert x_order is not None
+
+        # reorder labels.
+        self.y_labels = [self.y_labels[i] for i in y_order]
+        self.x_labels = [self.x_labels[i] for i in x_order]
+
+        # keep track of where the leaves of stored linkages went.
+        if self.y_leaves is not None:
+            self.y_leaves = self.y_leaves[numpy.asarray(y_order)]
+        if self.x_leaves is not None:
+            self.x_leaves = self.x_leaves[numpy.asarray(x_order)]
+
+        # reorder data.
+        self.data = self.data[numpy.ix_(y_order, x_order)]
+
+    def get_condensed_distances(self, axis=0):
+        """Get Euclidean distances between rows or columns of the matrix.
+
+        Notes:
+            Columns are copied into a contiguous array first: pdist() is
+            several times slower on a transposed view.
+
+        Args:
+            axis (int): 0 to compare rows, 1 to compare columns.
+
+        Returns:
+            numpy.array: a condensed distance matrix, as used by
+            scipy.cluster.hierarchy.linkage().
+        """
+        from scipy.spatial.distance import pdist
+
+        if axis == 0:
+            return pdist(self.data)
+        return pdist(numpy.ascontiguousarray(self.data.T))
+
+    @staticmethod
+    def get_leaf_order(z):
+        """Get the leaf order of a linkage, as drawn by a dendrogram.
+
+        Notes:
+            This matches the 'leaves' of scipy's dendrogram() with
+            distance_sort='descending', but walks the tree without recursion
+            so it works for tens of thousands of leaves.
+
+        Args:
+            z (numpy.array): a linkage matrix.
+
+        Returns:
+            numpy.array: leaf ids, left to right.
+        """
+        n = len(z) + 1
+        leaves = []
+        stack = [2 * n - 2]
+        while stack:
+            i = stack.pop()
+            if i < n:
+                leaves.append(i)
+                continue
+            a, b = int(z[i - n, 0]), int(z[i - n, 1])
+            da = z[a - n, 2] if a >= n else 0.0
+            db = z[b - n, 2] if b >= n else 0.0
+            if da > db:
+                stack.extend((b, a))
+            else:
+                stack.extend((a, b))
+        return numpy.array(leaves, dtype=numpy.intp)
+
+    def cluster(self, linkage_method='complete', progress=None, cancel=None):
+        """Cluster similarity/distance data to get a new index order.
+
+        Notes:
+            Symmetric matrices get one linkage, used for both axes. For other
+            matrices (e.g. requirements x features) rows and columns are
+            clustered independently, with the two distance computations and
+            linkages running in separate threads. The linkages are kept in
+            y_linkage and x_linkage.
+
+            Progress is counted in steps, two per clustered axis: the
+            distances, then the linkage. The matrix is unchanged if the
+            clustering is cancelled.
+
+        Args:
+            linkage_method (str): e.g., 'single', 'complete', 'average',
+            'weighted', 'median', 'ward', see
+            https://docs.scipy.org/doc/scipy/reference/generated/scipy.cluster.hierarchy.linkage.html.
+            'insight' and 'insight-sum' use InsightCluster, averaging or
+            summing the distances of merged clusters.
+            progress: a function of (steps done, steps), or None.
+            cancel (CancellationToken): checked between steps, and every
+                                        1024 merges of InsightCluster.
+        """
+        import threading
+        from scipy.cluster.hierarchy import linkage
+
+        total = 2 if self.is_symmetric() else 4
+        done = [0]
+        lock = threading.Lock()
+
+        def advance():
+            with lock:
+                done[0] += 1
+                d = done[0]
+            step(progress, cancel, d, total)
+
+        def cluster_axis(axis):
+            if cancel is not None:
+                cancel.check()
+            if linkage_method in ('insight', 'insight-sum'):
+                order, z = InsightCluster(
+                    self.data, linkage_method == 'insight'
+                ).cluster(axis, cancel=cancel)
+                advance()
+                advance()
+                return z, order
+            distances = self.get_condensed_distances(axis)
+            advance()
+            z = linkage(distances, linkage_method)
+            order = self.get_leaf_order(z)
+            advance()
+            return z, order
+
+        with section('linkage'):
+            if self.is_symmetric():
+                self.y_linkage, y_order = cluster_axis(0)
+                self.x_linkage, x_order = self.y_linkage, y_order
+            else:
+                from concurrent.futures import ThreadPoolExecutor
+
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    y = executor.submit(cluster_axis, 0)
+                    x = executor.submit(cluster_axis, 1)
+                    y_linkage, y_order = y.result()
+                    x_linkage, x_order = x.result()
+                self.y_linkage, self.x_linkage = y_linkage, x_linkage
+
+        with section('reorder'):
+            self.y_leaves = numpy.arange(self.height())
+            self.x_leaves = numpy.arange(self.width())
+            self.reorder(y_order, x_order)
+
+    def _get_axis(self, axis):
+        if axis == 0:
+            return self.y_linkage, self.y_leaves
+        return self.x_linkage, self.x_leaves
+
+    def get_node_leaves(self, node, axis=0):
+        """Get the leaves below a node of a stored linkage.
+
+        Args:
+            node (int): a node id. Ids below the number of leaves are leaves,
+                        higher ids are rows of the linkage, as in scipy.
+            axis (int): 0 for the row linkage, 1 for the column linkage.
+
+        Returns:
+            list: leaf ids.
+        """
+        z, _ = self._get_axis(axis)
+        assert z is not None, 'cluster the matrix first.'
+        n = len(z) + 1
+        leaves = []
+        stack = [node]
+        while stack:
+            i = stack.pop()
+            if i < n:
+                leaves.append(i)
+            else:
+                stack.extend((int(z[i - n, 1]), int(z[i - n, 0])))
+        return leaves
+
+    def get_subtree_nodes(self, node, axis=0):
+        """Get the internal nodes below (and including) a node.
+
+        Args:
+            node (int): a node id, see get_node_leaves().
+            axis (int): 0 for the row linkage, 1 for the column linkage.
+
+        Returns:
+            list: node ids.
+        """
+        z, _ = self._get_axis(axis)
+        n = len(z) + 1
+        nodes = []
+        stack = [node]
+        while stack:
+            i = stack.pop()
+            if i >= n:
+                nodes.append(i)
+                stack.extend((int(z[i - n, 0]), int(z[i - n, 1])))
+        return nodes
+
+    def get_node_range(self, node, axis=0):
+        """Get the positions of a node's leaves in the current order.
+
+        Notes:
+            After cluster() the leaves of every node sit next to each other,
+            so a node corresponds to a slice of rows (or columns).
+
+        Args:
+            node (int): a node id, see get_node_leaves().
+            axis (int): 0 for rows, 1 for columns.
+
+        Returns:
+            tuple: (start, stop) positions.
+        """
+        z, leaves = self._get_axis(axis)
+        positions = numpy.empty(len(leaves), dtype=numpy.intp)
+        positions[leaves] = numpy.arange(len(leaves))
+        positions = positions[self.get_node_leaves(node, axis)]
+        start = int(positions.min())
+        stop = int(positions.max()) + 1
+        if stop - start != len(positions):
+            raise ValueError(
+                'the leaves of node {} are not contiguous, the matrix has '
+                'been reordered since it was clustered.'.format(node))
+        return start, stop
+
+    def get_cluster_nodes(self, n_clusters, axis=0):
+        """Get the nodes that cut a stored linkage into clusters.
+
+        Args:
+            n_clusters (int): the number of clusters.
+            axis (int): 0 for the row linkage, 1 for the column linkage.
+
+        Returns:
+            list: node ids, in the current order of the matrix.
+        """
+        z, _ = self._get_axis(axis)
+        assert z is not None, 'cluster the matrix first.'
+        n = len(z) + 1
+        n_clusters = max(1, min(n_clusters, n))
+        top = set(range(2 * n - n_clusters, 2 * n - 1))
+        nodes = [2 * n - 2] if n_clusters == 1 else [
+            int(c) for i in sorted(top) for c in z[i - n, :2]
+            if int(c) not in top
+        ]
+        return sorted(nodes, key=lambda c: self.get_node_range(c, axis)[0])
+
+    def submatrix(self, node, axis=0):
+        """Get the part of the matrix below a node of a stored linkage.
+
+        Notes:
+            The new matrix's data is a numpy view into this matrix, so no data
+            is copied and changes to one show up in the other. For symmetric
+            matrices the node selects both rows and columns; otherwise it
+            selects rows (axis 0) or columns (axis 1) and keeps the other
+            axis whole.
+
+        Args:
+            node (int): a node id, see get_node_leaves().
+            axis (int): 0 for the row linkage, 1 for the column linkage.
+
+        Returns:
+            Matrix: a new Matrix object.
+        """
+        start, stop = self.get_node_range(node, axis)
+        y = slice(None)
+        x = slice(None)
+        if axis == 0 or self.is_symmetric():
+            y = slice(start, stop)
+        if axis == 1 or self.is_symmetric():
+            x = slice(start, stop)
+
+        m = Matrix()
+        m.y_labels = self.y_labels[y]
+        m.x_labels = self.x_labels[x]
+        m.data = self.data[y, x]
+        return m
+
+    def recluster(self, node, linkage_method='complete', axis=0):
+        """Recluster the leaves below one node of a stored linkage.
+
+        Notes:
+            Only the submatrix below the node is clustered, optionally with a
+            different linkage method. The new order is spliced into the
+            matrix in place, and the node's subtree in the stored linkage is
+            replaced by the new one, so node ids outside the subtree stay
+            valid.
+
+        Args:
+            node (int): a node id, see get_node_leaves().
+            linkage_method (str): see cluster().
+            axis (int): 0 for the row linkage, 1 for the column linkage.
+        """
+        from scipy.cluster.hierarchy import linkage
+
+        z, leaves = self._get_axis(axis)
+        n = len(z) + 1
+        if node < n:
+            return
+        start, stop = self.get_node_range(node, axis)
+        sub = self.submatrix(node, axis)
+        sub_z = linkage(sub.get_condensed_distances(axis), linkage_method)
+        order = self.get_leaf_order(sub_z)
+
+        # replace the subtree's rows of the linkage. The subtree root is
+        # merged last, so it keeps its id.
+        rows = sorted(i - n for i in self.get_subtree_nodes(node, axis))
+        ids = numpy.concatenate((leaves[start:stop], numpy.array(rows) + n))
+        z[rows, :2] = ids[sub_z[:, :2].astype(numpy.intp)]
+        z[rows, 2:] = sub_z[:, 2:]
+
+        # splice the new order into the matrix.
+        positions = start + order
+        axes = (0, 1) if self.is_symmetric() else (axis,)
+        if 0 in axes:
+            self.data[start:stop, :] = self.data[positions, :]
+            self.y_labels = self.y_labels[:start] + \
+                [self.y_labels[i] for i in positions] + self.y_labels[stop:]
+            self.y_leaves[start:stop] = self.y_leaves[positions]
+        if 1 in axes:
+            self.data[:, start:stop] = self.data[:, positions]
+            self.x_labels = self.x_labels[:start] + \
+                [self.x_labels[i] for i in positions] + self.x_labels[stop:]
+            self.x_leaves[start:stop] = self.x_leaves[positions]
+
+    def collapse(self, threshold):
+        """Replace groups of near-duplicate items with one item each.
+
+        Notes:
+            Items at least as similar as the threshold are grouped with a
+            union-find structure, and each group is represented by its first
+            item. Cluster the smaller matrix, then call expand() to put the
+            other items back next to their representatives.
+
+        Args:
+            threshold (float): minimum similarity for near-duplicates.
+
+        Returns:
+            list: groups of labels with more than one item.
+        """
+        assert self.is_symmetric()
+        d = DisjointSet(self.height())
+        d.import_from_source(self, threshold)
+        groups = d.get_groups()
+        representatives = [g[0] for g in groups]
+
+        self.collapsed = (self.y_labels, self.data, groups)
+        self.y_labels = [self.y_labels[i] for i in representatives]
+        self.x_labels = list(self.y_labels)
+        self.data = self.data[numpy.ix_(representatives, representatives)]
+        self.y_linkage = self.x_linkage = None
+        self.y_leaves = self.x_leaves = None
+        return [[self.collapsed[0][i] for i in g] for g in groups if len(g) > 1]
+
+    def expand(self):
+        """Undo collapse(), keeping the order of the representatives.
+
+        Notes:
+            Each group's items are placed next to its representative. If the
+            collapsed matrix was clustered, the stored linkage is expanded
+            too: the items of a group are joined to their representative at
+            distance 0.0, so drill-down methods keep working.
+        """
+        labels, data, groups = self.collapsed
+        group = {labels[g[0]]: g for g in groups}
+        n = len(labels)
+
+        if self.y_linkage is None:
+            order = [i for l in self.y_labels for i in group[l]]
+            z = None
+        else:
+            rows = []
+            counts = {}
+            top = {}
+            next_id = n
+            for leaf, label in zip(self.y_leaves.tolist(), self.y_labels):
+                node = group[label][0]
+                for member in group[label][1:]:
+                    count = counts.get(node, 1) + 1
+                    rows.append([node, member, 0.0, count])
+                    counts[next_id] = count
+                    node = next_id
+                    next_id += 1
+                top[leaf] = node
+
+            r = len(self.y_linkage) + 1
+            for a, b, distance, _ in self.y_linkage.tolist():
+                a = top[int(a)] if a < r else int(a) - r + next_id
+                b = top[int(b)] if b < r else int(b) - r + next_id
+                count = counts.get(a, 1) + counts.get(b, 1)
+                counts[n + len(rows)] = count
+                rows.append([a, b, distance, count])
+            z = numpy.array(rows, dtype=float)
+            order = self.get_leaf_order(z).tolist()
+
+        self.y_labels = [labels[i] for i in order]
+        self.x_labels = list(self.y_labels)
+        self.data = data[numpy.ix_(order, order)]
+        self.y_linkage = self.x_linkage = z
+        self.y_leaves = None if z is None else numpy.array(order)
+        self.x_leaves = None if z is None else numpy.array(order)
+        self.collapsed = None
+
+    def cluster_approximate(self, linkage_method='complete', sample_size=1000,
+                            n_clusters=None, seed=None):
+        """Cluster a large symmetric matrix from a sample of its items.
+
+        Args:
+            linkage_method (str): see cluster().
+            sample_size (int): number of items to cluster exactly.
+            n_clusters (int): number of clusters to cut the sample into.
+            seed (int): random seed for drawing the sample.
+
+        Returns:
+            ApproximateCluster: the fitted clustering, e.g. for cluster
+            assignments.
+        """
+        a = ApproximateCluster(self, linkage_method, sample_size, n_clusters,
+                               seed=seed)
+        a.cluster()
+        self.reorder(a.order)
+        return a
+
+    def cluster_graph(self, threshold=None, k=None, resolution=1.0,
+                      seed=None):
+        """Cluster a symmetric matrix by community detection on a sparse graph.
+
+        Args:
+            threshold (float): connect pairs with at least this similarity.
+            k (int): connect each item to its k most similar items.
+            resolution (float): larger values favour smaller communities.
+            seed (int): random seed for the Louvain method.
+
+        Returns:
+            SimilarityGraph: the graph, e.g. for community assignments.
+        """
+        g = SimilarityGraph()
+        g.import_from_source(self, threshold, k)
+        g.louvain(resolution, seed)
+        self.reorder(g.get_order())
+        return g
+
+    def randomize(self):
+        """Randomize the matrix, e.g. for testing."""
+        y_indices = list(range(self.height()))
+        random.shuffle(y_indices)
+        if self.is_symmetric():
+            self.reorder(y_indices)
+        else:
+            x_indices = list(range(self.width()))
+            random.shuffle(x_indices)
+            self.reorder(y_indices, x_indices)
+
+    def import_from_source(self, source, progress=None, cancel=None):
+        """Imports labels and data from a CardSort or Similarity object.
+
+        Notes:
+            This builds the same matrix as importing the source's csv()
+            output, without the CSV text in between.
+
+        Args:
+            source: an object with get_elements() and get_similarity_block()
+                    methods.
+            progress: a function of (rows done, rows), called after each
+                      block, or None.
+            cancel (CancellationToken): checked after each block, or None.
+        """
+        labels = source.get_elements()
+        self.import_labels(list(labels), list(labels))
+        for start in range(0, len(labels), self.block_size):
+            stop = min(len(labels), start + self.block_size)
+            self.data[start:stop] = source.get_similarity_block(
+                numpy.arange(start, stop), numpy.arange(len(labels)))
+            step(progress, cancel, stop, len(labels))
+
+    def write_csv(self, f, precision=None, progress=None, cancel=None):
+        """Exports data and labels in CSV format, one block of rows at a time.
+
+        Args:
+            f: a file-like object, opened for writing text, e.g. from
+               open_output().
+            precision (int): decimal places to round values to, or None for
+                             full precision.
+            progress: a function of (rows done, rows), or None.
+            cancel (CancellationToken): checked after each block, or None.
+        """
+        def get_block(y, x):
+            return numpy.asarray(self.data[y[0]:y[-1] + 1])
+
+        _write_csv_blocks(f, self.x_labels, get_block, precision,
+                          self.block_size, y_labels=self.y_labels,
+                          progress=progress, cancel=cancel)
+
+    def csv(self):
+        """Exports data and labels to a CSV string.
+
+        Returns: 
+           str: returns CSV data.
+        """
+        output = io.StringIO()
+        self.write_csv(output)
+        return output.getvalue()
+
+    def write_xlsx(self, f, precision=None, clusters=None, progress=None,
+                   cancel=None):
+        """Exports data and labels to an Excel workbook, laid out like
+        write_csv(). The workbook is written in openpyxl's write-only mode.
+
+        Args:
+            f: a path or a file-like object, opened for writing bytes.
+            precision (int): decimal places to round values to, or None for
+                             full precision.
+            clusters (int): shade this many clusters from the stored
+                            linkage, see get_cluster_ranges().
+            progress: a function of (rows done, rows), or None.
+            cancel (CancellationToken): checked after each block, or None.
+        """
+        def get_block(y, x):
+            return numpy.asarray(self.data[y[0]:y[-1] + 1])
+
+        bands = None
+        if clusters:
+            bands = (self.get_cluster_ranges(clusters, 0),
+                     self.get_cluster_ranges(clusters, 1))
+        _write_xlsx_rows(
+            f,
+            _get_matrix_rows(self.x_labels, get_block, precision,
+                             self.block_size, y_labels=self.y_labels,
+                             empty=None, progress=progress, cancel=cancel),
+            'matrix',
+            bands,
+            self.is_symmetric()
+        )
+
+    def downsample(self, rows, cols, reduce='mean', samples=16):
+        """Aggregate the matrix into a grid of blocks.
+
+        Notes:
+            Rows and columns are split into contiguous, evenly sized blocks.
+            With samples set, each block is summarized from at most samples x
+            samples evenly spaced cells, so the work depends on the size of
+            the grid rather than the size of the matrix. With samples=None
+            every cell is used.
+
+        Args:
+            rows (int): maximum number of rows in the grid.
+            cols (int): maximum number of columns in the grid.
+            reduce (str): 'mean' or 'max'.
+            samples (int): rows and columns to read from each block, or None.
+
+        Returns:
+            tuple: (grid, y_starts, x_starts), where grid is a numpy.array and
+            the starts are the first row and column of each block.
+        """
+        def blocks(n, count):
+            starts = numpy.unique(
+                numpy.linspace(0, n, max(1, min(count, n)) + 1).astype(int))
+            if samples is None:
+                return starts[:-1], numpy.arange(n), starts[:-1]
+            picks = []
+            for start, stop in zip(starts[:-1], starts[1:]):
+                picks.append(numpy.unique(
+                    start + numpy.arange(samples) * (stop - start) // samples))
+            offsets = numpy.cumsum([0] + [len(p) for p in picks[:-1]])
+            return starts[:-1], numpy.concatenate(picks), offsets
+
+        y_starts, y_picks, y_offsets = blocks(self.height(), rows)
+        x_starts, x_picks, x_offsets = blocks(self.width(), cols)
+
+        if reduce == 'mean':
+            ufunc = numpy.add
+        elif reduce == 'max':
+            ufunc = numpy.maximum
+        else:
+            raise ValueError(reduce)
+
+        # reduce over rows one slab at a time, so memory-mapped matrices are
+        # read sequentially.
+        partial = numpy.empty((len(y_starts), len(x_picks)))
+        bounds = list(y_offsets) + [len(y_picks)]
+        for i in range(len(y_starts)):
+            picked = y_picks[bounds[i]:bounds[i + 1]]
+            if samples is None:
+                slab = self.data[picked[0]:picked[-1] + 1]
+            else:
+                slab = self.data[numpy.ix_(picked, x_picks)]
+            partial[i] = ufunc.reduce(slab, axis=0)
+        grid = ufunc.reduceat(partial, x_offsets, axis=1)
+
+        if reduce == 'mean':
+            y_counts = numpy.diff(bounds)
+            x_counts = numpy.diff(list(x_offsets) + [len(x_picks)])
+            grid = grid / numpy.outer(y_counts, x_counts)
+        return grid, y_starts, x_starts
+
+    def ascii(self, width=None, height=None, reduce='mean', samples=16):
+        """
+        Notes:
+            By default every cell is drawn. Given a width and height (e.g.
+            the terminal size), the matrix is shrunk with downsample() to fit,
+            and only the first label of each block is shown, truncated if
+            necessary.
+
+        Args:
+            width (int): maximum width of the output, in characters.
+            height (int): maximum height of the output, in lines.
+            reduce (str): 'mean' or 'max', see downsample().
+            samples (int): see downsample().
+
+        Returns:
+           str: an ASCII-art representation of the matrix and labels.
+        """
+        if width is None and height is None:
+            data = self.data.tolist()
+            x_labels = self.x_labels
+            y_labels = self.y_labels
+            max_x_label_size = max([len(l) for l in self.x_labels])
+            max_y_label_size = max([len(l) for l in self.y_labels])
+        else:
+            width = width or 2 * (self.width() + 32)
+            height = height or self.height() + 32
+            max_x_label_size = min(max([len(l) for l in self.x_labels]),
+                                   max(4, height // 4))
+            max_y_label_size = min(max([len(l) for l in self.y_labels]),
+                                   max(4, width // 8))
+            grid, y_starts, x_starts = self.downsample(
+                max(1, height - max_x_label_size - 1),
+                max(1, width // 2 - max_y_label_size - 1),
+                reduce,
+                samples
+            )
+            data = grid.tolist()
+            x_labels = [self.x_labels[i][:max_x_label_size] for i in x_starts]
+            y_labels = [self.y_labels[i][:max_y_label_size] for i in y_starts]
+
+        # build a 2d array of double spaces with enough room for x and y labels.
+        output = [['  ' for i in range(max_y_label_size + 1 + len(x_labels))]
+                  for j in range(max_x_label_size + 1 + len(y_labels))]
+
+        # add x labels.
+        for x, l in enumerate(x_labels):
+            label_size = len(l)
+            for y, c in enumerate(l):
+                output[max_x_label_size - label_size +
+                       y][max_y_label_size + 1 + x] = ' ' + c
+
+        # add y labels.
+        for y, l in enumerate(y_labels):
+            label_size = len(l)
+            for x, c in enumerate(l):
+                output[max_x_label_size + 1 +
+                       y][(max_y_label_size - label_size) + x] = ' ' + c
+
+        # add data.
+        for y, row in enumerate(data):
+            for x, cell in enumerate(row):
+                cell = min(max(cell, 0.0), 1.0)
+                output[max_x_label_size + 1 + y][max_y_label_size +
+                                                 1 + x] = ' ' + ' .,:-=+*#%@'[int(cell * 10)]
+
+        return '\n'.join([''.join(r) for r in output]) + '\n'
+
+    def get_edges(self, cutoff=None, top_k=None):
+        """Select graph edges from a symmetric matrix.
+
+        Notes:
+            Edges are selected with array operations, one block of rows at a
+            time, so the matrix is never walked cell by cell. With a cutoff,
+            every pair at least that similar is an edge. With top_k, each
+            item is joined to its top_k most similar items; a cutoff can be
+            given as well to drop weak neighbours. Each pair appears once.
+
+        Args:
+            cutoff (float): minimum similarity for an edge.
+            top_k (int): number of neighbours to keep for each item.
+
+        Yields:
+            tuple: (y, x, weight) numpy arrays for one block of rows.
+        """
+        assert self.is_symmetric()
+        assert cutoff is not None or top_k is not None
+        n = self.height()
+
+        if top_k is not None:
+            k = min(top_k, n - 1)
+            neighbours = numpy.empty((n, k), dtype=numpy.intp)
+            for start in range(0, n, self.block_size):
+                stop = min(n, start + self.block_size)
+                block = numpy.array(self.data[start:stop], dtype=float)
+                block[numpy.arange(stop - start), numpy.arange(start, stop)] = \
+                    -numpy.inf
+                neighbours[start:stop] = get_top_k(block, k)
+
+        for start in range(0, n, self.block_size):
+            stop = min(n, start + self.block_size)
+            block = self.data[start:stop]
+            if top_k is None:
+                y, x = numpy.nonzero(numpy.tril(block >= cutoff, start - 1))
+            else:
+                y = numpy.repeat(numpy.arange(stop - start), k)
+                x = neighbours[start:stop].ravel()
+                # keep a pair from the higher index, or from the lower index
+                # when the higher index doesn't list it as a neighbour.
+                keep = (x < y + start) | \
+                    ~(neighbours[x] == (y + start)[:, None]).any(axis=1)
+                if cutoff is not None:
+                    keep &= block[y, x] >= cutoff
+                y = y[keep]
+                x = x[keep]
+            yield y + start, x, block[y, x]
+
+    def export_graph(self, f, format='dot', cutoff=None, top_k=None):
+        """Write a graph of the matrix to a file.
+
+        Notes:
+            Edges are written as they are selected, so graphs with millions
+            of edges never have to fit in memory, and nothing needs a
+            display.
+
+        Args:
+            f: a file-like object, opened for writing text.
+            format (str): 'dot', 'graphml' or 'edgelist' (CSV with source,
+                          target and weight columns).
+            cutoff (float): minimum similarity for an edge.
+            top_k (int): number of neighbours to keep for each item.
+
+        Returns:
+            int: the number of edges written.
+        """
+        def dot_id(label):
+            label = label.replace('\\', '\\\\').replace('"', '\\"')
+            return '"{}"'.format(label)
+
+        labels = self.y_labels
+        if format == 'dot':
+            f.write('graph {\n  overlap=false;\n')
+            for label in labels:
+                f.write('  {};\n'.format(dot_id(label)))
+        elif format == 'graphml':
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                    '  <key id="label" for="node" attr.name="label" '
+                    'attr.type="string"/>\n'
+                    '  <key id="weight" for="edge" attr.name="weight" '
+                    'attr.type="double"/>\n'
+                    '  <graph edgedefault="undirected">\n')
+            for i, label in enumerate(labels):
+                f.write('    <node id="n{}"><data key="label">{}</data>'
+                        '</node>\n'.format(i, xml_escape(label)))
+        elif format == 'edgelist':
+            writer = csv.writer(f)
+            writer.writerow(['source', 'target', 'weight'])
+        else:
+            raise ValueError(format)
+
+        count = 0
+        for y, x, weights in self.get_edges(cutoff, top_k):
+            if format == 'dot':
+                f.writelines(
+                    '  {} -- {} [weight={}];\n'.format(
+                        dot_id(labels[a]), dot_id(labels[b]), w)
+                    for a, b, w in zip(y.tolist(), x.tolist(), weights.tolist()))
+            elif format == 'graphml':
+                f.writelines(
+                    '    <edge source="n{}" target="n{}"><data key="weight">'
+                    '{}</data></edge>\n'.format(a, b, w)
+                    for a, b, w in zip(y.tolist(), x.tolist(), weights.tolist()))
+            else:
+                writer.writerows(
+                    (labels[a], labels[b], w)
+                    for a, b, w in zip(y.tolist(), x.tolist(), weights.tolist()))
+            count += len(y)
+
+        if format == 'dot':
+            f.write('}\n')
+        elif format == 'graphml':
+            f.write('  </graph>\n</graphml>\n')
+        return count
+
+    def graph(self, cutoff, engine, view=True):
+        """Draw a graph of the matrix with graphviz.
+
+        Args:
+            cutoff (float): minimum similarity for an edge.
+            engine (str): a graphviz layout engine, e.g. 'neato'.
+            view (bool): open the rendered graph in a viewer. Use
+                         export_graph() on machines without a display.
+
+        Returns:
+            graphviz.Graph: the graph.
+        """
+        import graphviz
+
+        g = graphviz.Graph(engine=engine)
+        g.attr(overlap='false')
+        for y, x, _ in self.get_edges(cutoff):
+            for a, b in zip(y.tolist(), x.tolist()):
+                g.edge(self.y_labels[a], self.x_labels[b])
+        if view:
+            g.view()
+        return g
+
+    def get_triangle_blocks(self):
+        """Get the values that describe the matrix, one block of rows at a
+        time.
+
+        Notes:
+            For a symmetric matrix this is the lower triangle without the
+            diagonal, since the upper triangle repeats it and the diagonal
+            only compares items with themselves. For any other matrix it is
+            every cell. Blocks are read lazily, so this works on
+            memory-mapped data, see import_from_npy().
+
+        Returns:
+            generator: 1-d numpy arrays of values.
+        """
+        symmetric = self.is_symmetric()
+        for start in range(0, self.height(), self.block_size):
+            stop = min(self.height(), start + self.block_size)
+            if symmetric:
+                block = numpy.asarray(self.data[start:stop, :stop])
+                below = numpy.arange(stop)[None, :] < \
+                    numpy.arange(start, stop)[:, None]
+                yield block[below]
+            else:
+                yield numpy.asarray(self.data[start:stop]).reshape(-1)
+
+    def histogram(self, bins=100, range=(0.0, 1.0)):
+        """Count the values of the matrix in equal-width bins.
+
+        Args:
+            bins (int): the number of bins.
+            range (tuple): (low, high) values. Values outside the range are
+                           not counted.
+
+        Returns:
+            tuple: counts and bin edges, as from numpy.histogram().
+        """
+        counts = numpy.zeros(bins, dtype=numpy.int64)
+        for values in self.get_triangle_blocks():
+            c, edges = numpy.histogram(values, bins=bins, range=range)
+            counts += c
+        return counts, numpy.linspace(range[0], range[1], bins + 1)
+
+    def statistics(self, bins=100, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95),
+                   resolution=65536):
+        """Describe the distribution of values in the matrix.
+
+        Notes:
+            Values come from get_triangle_blocks(). The data is read in two
+            passes of one block at a time: one for the count, sum and range,
+            and one for the histograms. Quantiles are interpolated from a
+            histogram with the given resolution, so they are accurate to
+            within (max - min) / resolution, and exact for data with few
+            distinct values, like card sort similarities.
+
+        Args:
+            bins (int): the number of histogram bins between 0.0 and 1.0.
+            quantiles (tuple): the quantiles to compute, from 0.0 to 1.0.
+            resolution (int): the number of bins used to estimate quantiles.
+
+        Returns:
+            dict: count, min, max, mean, std, a quantiles dict, and a
+            histogram dict of bin edges and counts.
+        """
+        count = 0
+        total = 0.0
+        squares = 0.0
+        low = numpy.inf
+        high = -numpy.inf
+        for values in self.get_triangle_blocks():
+            if len(values) == 0:
+                continue
+            count += len(values)
+            total += float(values.sum())
+            squares += float(numpy.dot(values, values))
+            low = min(low, float(values.min()))
+            high = max(high, float(values.max()))
+
+        if count == 0:
+            return {'count': 0, 'min': None, 'max': None, 'mean': None,
+                    'std': None, 'quantiles': {q: None for q in quantiles},
+                    'histogram': {'edges': [], 'counts': []}}
+
+        counts = numpy.zeros(bins, dtype=numpy.int64)
+        fine = numpy.zeros(resolution, dtype=numpy.int64)
+        sums = numpy.zeros(resolution)
+        span = (low, high) if high > low else (low, low + 1.0)
+        for values in self.get_triangle_blocks():
+            counts += numpy.histogram(values, bins=bins, range=(0.0, 1.0))[0]
+            fine += numpy.histogram(values, bins=resolution, range=span)[0]
+            sums += numpy.histogram(values, bins=resolution, range=span,
+                                    weights=values)[0]
+
+        # use the mean of the fine bin that holds each quantile, which is
+        # exact when the bin holds a single distinct value.
+        cumulative = numpy.cumsum(fine)
+        q = {}
+        for quantile in quantiles:
+            i = int(numpy.searchsorted(cumulative,
+                                       quantile * (count - 1) + 1))
+            q[quantile] = float(sums[i] / fine[i])
+
+        mean = total / count
+        return {
+            'count': count,
+            'min': low,
+            'max': high,
+            'mean': mean,
+            'std': max(0.0, squares / count - mean * mean) ** 0.5,
+            'quantiles': q,
+            'histogram': {
+                'edges': numpy.linspace(0.0, 1.0, bins + 1).tolist(),
+                'counts': counts.tolist()
+            }
+        }
+
+    def get_shades(self, data, levels=256):
+        """Map similarity values to grey levels.
+
+        Args:
+            data (numpy.array): values from 0.0 to 1.0. Values outside that
+                                range are clipped.
+            levels (int): number of distinct shades.
+
+        Returns:
+            numpy.array: shade numbers from 0 (white, for 0.0) to levels - 1
+            (black, for 1.0).
+        """
+        data = numpy.clip(numpy.nan_to_num(data), 0.0, 1.0)
+        return numpy.floor(data * (levels - 1) + 0.5).astype(numpy.intp)
+
+    def get_cluster_ranges(self, n_clusters, axis=0):
+        """Get the (start, stop) positions of clusters from a stored linkage.
+
+        Args:
+            n_clusters (int): the number of clusters.
+            axis (int): 0 for rows, 1 for columns.
+
+        Returns:
+            list: (start, stop) tuples, in order.
+        """
+        return [self.get_node_range(c, axis)
+                for c in self.get_cluster_nodes(n_clusters, axis)]
+
+    def png(self, f, cell_size=1, clusters=None):
+        """Write the matrix as a PNG image.
+
+        Notes:
+            The image is compressed and written one block of rows at a time,
+            so memory stays at a block of pixels even for very large
+            matrices. Darker pixels mean higher values.
+
+        Args:
+            f: a file-like object, opened for writing bytes.
+            cell_size (int): size of each cell in pixels.
+            clusters (int): outline this many clusters from the stored
+                            linkage, see get_cluster_ranges().
+        """
+        def chunk(kind, data):
+            f.write(struct.pack('>I', len(data)))
+            f.write(kind + data)
+            f.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+        width = self.width() * cell_size
+        height = self.height() * cell_size
+        y_bounds = x_bounds = None
+        if clusters:
+            y_bounds = numpy.array(self.get_cluster_ranges(clusters, 0)) * \
+                cell_size
+            x_bounds = numpy.array(self.get_cluster_ranges(clusters, 1)) * \
+                cell_size
+        symmetric = self.is_symmetric()
+
+        # an indexed image: 255 shades of grey, then red for outlines.
+        palette = 255 - numpy.round(numpy.arange(255) * 255.0 / 254)
+        palette = numpy.repeat(palette.astype(numpy.uint8), 3).tobytes()
+        palette += b'\xff\x00\x00'
+
+        f.write(b'\x89PNG\r\n\x1a\n')
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0))
+        chunk(b'PLTE', palette)
+        compressor = zlib.compressobj()
+        for start in range(0, self.height(), self.block_size):
+            stop = min(self.height(), start + self.block_size)
+            pixels = self.get_shades(self.data[start:stop], 255).astype(
+                numpy.uint8)
+            pixels = numpy.repeat(numpy.repeat(pixels, cell_size, axis=0),
+                                  cell_size, axis=1)
+
+            if clusters:
+                rows = numpy.arange(start * cell_size, stop * cell_size)
+                outline = numpy.zeros(pixels.shape, dtype=bool)
+                if symmetric:
+                    # squares along the diagonal.
+                    c = numpy.searchsorted(y_bounds[:, 0], rows, 'right') - 1
+                    a = y_bounds[c, 0]
+                    b = y_bounds[c, 1] - 1
+                    r = numpy.arange(len(rows))
+                    outline[r, a] = True
+                    outline[r, b] = True
+                    for i in numpy.nonzero((rows == a) | (rows == b))[0]:
+                        outline[i, a[i]:b[i] + 1] = True
+                else:
+                    # lines between row clusters and between column clusters.
+                    edges = numpy.concatenate((y_bounds[1:, 0],
+                                               y_bounds[1:, 0] - 1))
+                    outline[numpy.isin(rows, edges)] = True
+                    outline[:, x_bounds[1:, 0]] = True
+                    outline[:, x_bounds[1:, 0] - 1] = True
+                pixels[outline] = 255
+
+            scanlines = numpy.zeros((len(pixels), width + 1),
+                                    dtype=numpy.uint8)
+            scanlines[:, 1:] = pixels
+            data = compressor.compress(scanlines.tobytes())
+            if data:
+                chunk(b'IDAT', data)
+        chunk(b'IDAT', compressor.flush())
+        chunk(b'IEND', b'')
+
+    def svg(self, cell_size=10, levels=11, clusters=None, raster=None):
+        """Get the matrix as an SVG image.
+
+        Notes:
+            Values are mapped to a number of grey levels, and runs of
+            same-coloured cells in a row are drawn as a single rectangle.
+            White cells aren't drawn at all. With raster=True, or for
+            matrices with more than a million cells, the cells are embedded as
+            a PNG image instead, see png(). Cluster outlines are always
+            vector shapes.
+
+        Args:
+            cell_size (int): size of each cell, in pixels.
+            levels (int): number of grey levels for vector output.
+            clusters (int): outline this many clusters from the stored
+                            linkage, see get_cluster_ranges().
+            raster (bool): embed cells as a PNG image, or None to decide
+                           based on size.
+
+        Returns:
+            str: SVG data.
+        """
+        width = self.width() * cell_size
+        height = self.height() * cell_size
+        if raster is None:
+            raster = self.width() * self.height() > 1000000
+
+        output = io.StringIO()
+        output.write(
+            '<svg xmlns="http://www.w3.org/2000/svg" '
+            'xmlns:xlink="http://www.w3.org/1999/xlink" version="1.1" '
+            'width="{0}" height="{1}" viewBox="0 0 {0} {1}">\n'.format(
+                width, height))
+        output.write('<rect width="{}" height="{}" fill="#fff"/>\n'.format(
+            width, height))
+
+        if raster:
+            image = io.BytesIO()
+            self.png(image)
+            output.write(
+                '<image width="{}" height="{}" '
+                'style="image-rendering: pixelated" preserveAspectRatio="none" '
+                'xlink:href="data:image/png;base64,{}"/>\n'.format(
+                    width, height,
+                    base64.b64encode(image.getvalue()).decode('ascii')))
+        else:
+            output.write('<style>\n')
+            for level in range(1, levels):
+                grey = 255 - int(round(level * 255.0 / (levels - 1)))
+                output.write('.s{} {{ fill: #{:02x}{:02x}{:02x}; }}\n'.format(
+                    level, grey, grey, grey))
+            output.write('</style>\n')
+            for start in range(0, self.height(), self.block_size):
+                shades = self.get_shades(
+                    self.data[start:start + self.block_size], levels)
+                h, w = shades.shape
+                # a run starts at each row start and at each change of shade.
+                change = numpy.ones((h, w), dtype=bool)
+                change[:, 1:] = shades[:, 1:] != shades[:, :-1]
+                runs = numpy.flatnonzero(change)
+                lengths = numpy.diff(numpy.append(runs, h * w))
+                y, x = numpy.divmod(runs, w)
+                shade = shades[y, x]
+                keep = shade > 0
+                output.writelines(
+                    '<rect class="s{}" x="{}" y="{}" width="{}" '
+                    'height="{}"/>\n'.format(
+                        s, x * cell_size, (start + y) * cell_size,
+                        length * cell_size, cell_size)
+                    for s, x, y, length in zip(
+                        shade[keep].tolist(), x[keep].tolist(),
+                        y[keep].tolist(), lengths[keep].tolist()))
+
+        if clusters:
+            output.write('<g fill="none" stroke="#f00" stroke-width="{}">'
+                         '\n'.format(max(1, cell_size // 5)))
+            y_ranges = self.get_cluster_ranges(clusters, 0)
+            x_ranges = self.get_cluster_ranges(clusters, 1)
+            if self.is_symmetric():
+                for a, b in y_ranges:
+                    output.write(
+                        '<rect x="{0}" y="{0}" width="{1}" height="{1}"/>'
+                        '\n'.format(a * cell_size, (b - a) * cell_size))
+            else:
+                for a, _ in y_ranges[1:]:
+                    output.write('<line x1="0" y1="{0}" x2="{1}" y2="{0}"/>'
+                                 '\n'.format(a * cell_size, width))
+                for a, _ in x_ranges[1:]:
+                    output.write('<line x1="{0}" y1="0" x2="{0}" y2="{1}"/>'
+                                 '\n'.format(a * cell_size, height))
+            output.write('</g>\n')
+
+        output.write('</svg>\n')
+        return output.getvalue()
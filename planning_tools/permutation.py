@@ -0,0 +1,150 @@
+import numpy
+import os
+
+from .matrix import Matrix
+
+
+def _permutation_statistics(source, linkage_method, n_clusters, seeds):
+    """Get clustering statistics for shuffled copies of a source.
+
+    Notes:
+        This runs in PermutationTest worker processes, so it lives at module
+        level where it can be pickled.
+
+    Returns:
+        list: (cophenetic correlation, cohesion) tuples, one per seed.
+    """
+    return [
+        PermutationTest.get_statistics(
+            source.shuffled(numpy.random.default_rng(seed)),
+            linkage_method,
+            n_clusters
+        )
+        for seed in seeds
+    ]
+
+
+class PermutationTest:
+    """Test whether the cluster structure of a source is stronger than chance.
+
+    Notes:
+        The source is clustered as Matrix.cluster() would cluster its
+        similarity matrix, and two statistics are computed: the cophenetic
+        correlation, which measures how well the dendrogram fits the
+        distances, and the cohesion, which is the mean similarity of pairs
+        of items in the same cluster when the dendrogram is cut into
+        n_clusters clusters. The same statistics are computed for many
+        shuffled copies of the source (see CardSort.shuffled() and
+        Similarity.shuffled()), and each p-value is the fraction of shuffled
+        copies that score at least as high.
+
+        Shuffles are spread across a pool of worker processes. Every shuffle
+        gets its own seed from numpy.random.SeedSequence, so results only
+        depend on the seed, not on the number of workers.
+
+    Args:
+        source: a CardSort or Similarity object.
+        linkage_method (str): see Matrix.cluster(), except for the insight
+                              methods.
+        n_permutations (int): the number of shuffled copies.
+        n_clusters (int): the number of clusters for cohesion, or None for
+                          the square root of half the number of items.
+        seed (int): seed for the shuffles, or None for a random seed.
+        workers (int): worker processes, or None for one per CPU.
+    """
+    def __init__(self, source, linkage_method='complete', n_permutations=1000,
+                 n_clusters=None, seed=None, workers=None):
+        self.source = source
+        self.linkage_method = linkage_method
+        self.n_permutations = n_permutations
+        self.n_clusters = n_clusters
+        self.seed = seed
+        self.workers = workers
+
+        # set by run().
+        self.observed = None  # (cophenetic correlation, cohesion).
+        self.null = None      # n_permutations x 2 numpy.array.
+        self.p_values = None  # (cophenetic correlation, cohesion).
+
+    @staticmethod
+    def get_statistics(source, linkage_method, n_clusters):
+        """Cluster a source and measure the strength of its clusters.
+
+        Args:
+            source: a CardSort or Similarity object.
+            linkage_method (str): see Matrix.cluster().
+            n_clusters (int): the number of clusters for cohesion.
+
+        Returns:
+            tuple: cophenetic correlation and cohesion, as floats.
+        """
+        from scipy.cluster.hierarchy import cophenet, fcluster, linkage
+
+        n = len(source.get_elements())
+        m = Matrix()
+        m.data = source.get_similarity_block(numpy.arange(n), numpy.arange(n))
+        distances = m.get_condensed_distances(0)
+        z = linkage(distances, linkage_method)
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            c = float(cophenet(z, distances)[0])
+
+        clusters = fcluster(z, n_clusters, 'maxclust')
+        same = clusters[:, None] == clusters[None, :]
+        numpy.fill_diagonal(same, False)
+        cohesion = float(m.data[same].mean()) if same.any() else 0.0
+        return (0.0 if numpy.isnan(c) else c), cohesion
+
+    def run(self):
+        """Run the test, setting observed, null and p_values."""
+        from concurrent.futures import ProcessPoolExecutor
+
+        n = len(self.source.get_elements())
+        n_clusters = self.n_clusters or max(1, int(round((n / 2) ** 0.5)))
+        self.observed = self.get_statistics(
+            self.source, self.linkage_method, n_clusters)
+
+        seeds = numpy.random.SeedSequence(self.seed).spawn(self.n_permutations)
+        workers = self.workers or os.cpu_count() or 1
+        if workers == 1:
+            results = _permutation_statistics(
+                self.source, self.linkage_method, n_clusters, seeds)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # a few chunks per worker, so each copy of the source is
+                # pickled once per chunk rather than once per shuffle.
+                chunk = max(1, -(-len(seeds) // (workers * 4)))
+                futures = [
+                    executor.submit(_permutation_statistics, self.source,
+                                    self.linkage_method, n_clusters,
+                                    seeds[i:i + chunk])
+                    for i in range(0, len(seeds), chunk)
+                ]
+                results = [r for f in futures for r in f.result()]
+
+        self.null = numpy.array(results).reshape(-1, 2)
+        self.p_values = tuple(
+            float((1 + numpy.sum(self.null[:, i] >= self.observed[i])) /
+                  (1 + len(self.null)))
+            for i in range(2)
+        )
+
+    def report(self):
+        """Get the results of run() as a dictionary, e.g. for JSON output.
+
+        Returns:
+            dict: observed statistics, p-values and null distribution
+            summaries for cophenetic correlation and cohesion.
+        """
+        report = {
+            'linkage_method': self.linkage_method,
+            'permutations': self.n_permutations,
+            'seed': self.seed
+        }
+        for i, name in enumerate(('cophenetic_correlation', 'cohesion')):
+            report[name] = {
+                'observed': self.observed[i],
+                'p_value': self.p_values[i],
+                'null_mean': float(self.null[:, i].mean()),
+                'null_std': float(self.null[:, i].std())
+            }
+        return report
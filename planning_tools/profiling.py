@@ -0,0 +1,189 @@
+import contextlib
+import json
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+
+_active = None  # the Profiler in its with statement, if there is one.
+
+
+def section(name):
+    """Record a section of code in the active Profiler, if there is one.
+
+    Notes:
+        This costs almost nothing when no profiler is active, so library
+        code can mark its expensive steps, e.g.:
+
+            with section('linkage'):
+                z = linkage(distances, method)
+
+    Args:
+        name (str): the section name.
+
+    Returns:
+        a context manager.
+    """
+    profiler = _active
+    if profiler is None or threading.get_ident() != profiler.thread:
+        return contextlib.nullcontext()
+    return profiler.section(name)
+
+
+class Profiler:
+    """Record wall time, CPU time and peak memory for sections of a run.
+
+    Notes:
+        Use the profiler in a with statement around a run. While it is
+        active, section() records named sections. Sections may be nested: a
+        section started inside another is named "outer/inner".
+
+        Memory is traced with tracemalloc, which includes numpy arrays.
+        peak_memory is the most memory allocated at once during a section,
+        beyond what was allocated when it started. Tracing slows down code
+        that allocates many small Python objects, so compare profiled runs
+        with each other rather than with unprofiled runs. CPU time is for
+        every thread of this process, so it can be more than wall time, and
+        leaves out worker processes. Sections are only recorded in the
+        thread that started the profiler.
+
+    Args:
+        cprofile (bool): also collect cProfile statistics for the whole run,
+                         see dump_stats().
+    """
+    version = 1  # of the report format.
+
+    def __init__(self, cprofile=False):
+        self.sections = []
+        self.thread = None
+        self.total = None
+        self._stack = []
+        self._started_tracing = False
+        self._cprofile = None
+        if cprofile:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+
+    def __enter__(self):
+        global _active
+        if _active is not None:
+            raise RuntimeError('a profiler is already active.')
+        self.thread = threading.get_ident()
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+        self._start(None)
+        _active = self
+        if self._cprofile is not None:
+            self._cprofile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _active
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        _active = None
+        while self._stack:
+            self._stop()  # sections left open by an exception.
+        if self._started_tracing:
+            tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def section(self, name):
+        """Record a section of code, see section()."""
+        self._start(name)
+        try:
+            yield
+        finally:
+            self._stop()
+
+    def _start(self, name):
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            parent = self._stack[-1]
+            parent['peak'] = max(parent['peak'], peak)
+            name = '/'.join(filter(None, (parent['result']['name'], name)))
+        tracemalloc.reset_peak()
+        result = {'name': name}
+        if name is None:
+            self.total = result
+        else:
+            self.sections.append(result)
+        self._stack.append({
+            'result': result,
+            'wall': time.perf_counter(),
+            'cpu': time.process_time(),
+            'memory': current,
+            'peak': current
+        })
+
+    def _stop(self):
+        entry = self._stack.pop()
+        peak = max(entry['peak'], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        if self._stack:
+            self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+        entry['result'].update({
+            'wall_seconds': time.perf_counter() - entry['wall'],
+            'cpu_seconds': time.process_time() - entry['cpu'],
+            'peak_memory': peak - entry['memory']
+        })
+
+    def report(self, **extra):
+        """Get a report of the run.
+
+        Args:
+            extra: more items for the report, e.g. the command line.
+
+        Returns:
+            dict: the report format version, the Python version and
+            platform, wall_seconds, cpu_seconds and peak_memory for the
+            whole run, max_rss (the most memory the process has used, in
+            bytes, or None if unknown), and a list of sections in the order
+            they started, each with a name, wall_seconds, cpu_seconds and
+            peak_memory.
+        """
+        report = {
+            'version': self.version,
+            'python': platform.python_version(),
+            'platform': platform.platform()
+        }
+        report.update(extra)
+        report.update({k: v for k, v in self.total.items() if k != 'name'})
+        report['max_rss'] = get_max_rss()
+        report['sections'] = self.sections
+        return report
+
+    def write_report(self, path, **extra):
+        """Write the report as JSON, see report()."""
+        from .tables import AtomicFile
+
+        with AtomicFile(path) as f:
+            json.dump(self.report(**extra), f, indent=2)
+            f.write('\n')
+
+    def dump_stats(self, path):
+        """Write cProfile statistics, for pstats or a viewer like snakeviz.
+
+        Args:
+            path (str): the file to write.
+        """
+        assert self._cprofile is not None, 'create the Profiler with cprofile.'
+        self._cprofile.dump_stats(path)
+
+
+def get_max_rss():
+    """Get the most memory this process has used.
+
+    Returns:
+        int: bytes, or None where the resource module is unavailable.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS.
+    return rss if sys.platform == 'darwin' else rss * 1024
@@ -0,0 +1,80 @@
+import sys
+import threading
+import time
+
+
+class Cancelled(Exception):
+    """Raised by long computations when their CancellationToken is
+    cancelled."""
+
+
+class CancellationToken:
+    """A flag to stop a long computation from another thread.
+
+    Notes:
+        Computations that accept a token check it at block boundaries, e.g.
+        between blocks of rows of a similarity matrix, and raise Cancelled
+        when it is set. Objects are left as they were before the call, or
+        partly filled, so throw them away after cancelling.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Ask computations that check this token to stop."""
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        """Raise Cancelled if the token was cancelled."""
+        if self._event.is_set():
+            raise Cancelled()
+
+
+def step(progress, cancel, done, total):
+    """Report progress and check for cancellation at a block boundary.
+
+    Args:
+        progress: a function of (done, total), or None.
+        cancel (CancellationToken): a token, or None.
+        done (int): units of work done so far, e.g. rows.
+        total (int): units of work in all.
+
+    Raises:
+        Cancelled: if the token was cancelled.
+    """
+    if cancel is not None:
+        cancel.check()
+    if progress is not None:
+        progress(done, total)
+
+
+class ProgressBar:
+    """Show the progress of a computation on one line of a terminal.
+
+    Args:
+        label (str): what is being computed, e.g. 'matrix'.
+        f: a text file-like object, defaults to sys.stderr.
+        interval (float): minimum seconds between updates.
+    """
+    def __init__(self, label, f=None, interval=0.1):
+        self.label = label
+        self.f = f or sys.stderr
+        self.interval = interval
+        self.updated = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self, done, total):
+        with self.lock:
+            now = time.monotonic()
+            if done < total and now - self.updated < self.interval:
+                return
+            self.updated = now
+            percent = 100 * done // total if total else 100
+            self.f.write('\r{}: {:3d}%'.format(self.label, percent))
+            if done >= total:
+                self.f.write('\n')
+            self.f.flush()
@@ -0,0 +1,309 @@
+import csv
+import io
+import numpy
+import re
+
+from .tables import _get_matrix_rows, _get_xlsx_rows, _write_csv_blocks, \
+    _write_xlsx_rows
+
+
+class Similarity:
+    """Build a similarity matrix from fielded data.
+
+    Notes:
+        This class takes a .csv as input and produces a similarity matrix as
+        output. CSV data for input should include one record per row. Fields
+        may be continuous data, like floating point numbers from 0.0 to 1.0;
+        discrete data, like integers from 1 to 10; or categorical data, like 
+        'suv', 'compact', 'sport', or 'sedan'.
+
+        Weights can be assigned to different fields to alter their relative
+        importance. 
+    """
+    def __init__(self):
+        """Constructor"""
+        self.records = None
+        self.fields = None
+        self._field_arrays = None
+
+    def import_from_csv(self, csv_file):
+        """Load similarity data from a .csv file.
+
+        Args:
+            csv_file: a file-like object.
+        """
+        self.import_from_rows(csv.reader(csv_file))
+
+    def import_from_xlsx(self, f, sheet=None):
+        """Load similarity data from an Excel workbook laid out like a .csv
+        file. The workbook is read in openpyxl's read-only mode.
+
+        Args:
+            f: a path or a file-like object, opened for reading bytes.
+            sheet (str): a worksheet title, or None for the first worksheet.
+        """
+        self.import_from_rows(_get_xlsx_rows(f, sheet))
+
+    def import_from_rows(self, reader):
+        """Load similarity data from rows of strings, e.g. from a
+        csv.reader.
+
+        Args:
+            reader: an iterable of lists.
+        """
+        reader = iter(reader)
+        self._field_arrays = None
+        fields = next(reader, None)[1:]
+        self.fields = {f: {} for f in fields}
+        self.records = {}
+
+        data_mode = True
+        for row in reader:
+            if not any(row):
+                if data_mode:
+                    data_mode = False
+                    continue
+            else:
+                if data_mode:
+                    self.records[row[0]] = {}
+                    for f in range(len(fields)):
+                        if re.match('^[0-9]+$', row[f + 1]):
+                            self.records[row[0]][fields[f]] = int(row[f + 1])
+                        elif re.match('^[0-9.]+$', row[f + 1]):
+                            self.records[row[0]][fields[f]] = float(row[f + 1])
+                        else:
+                            self.records[row[0]][fields[f]] = row[f + 1]
+                else:
+                    for f in range(len(fields)):
+                        if re.match('^[0-9]+$', row[f + 1]):
+                            self.fields[fields[f]][row[0]] = int(row[f + 1])
+                        elif re.match('^[0-9.]+$', row[f + 1]):
+                            self.fields[fields[f]][row[0]] = float(row[f + 1])
+                        else:
+                            self.fields[fields[f]][row[0]] = row[f + 1]
+
+    def field_similarity(self, a, b, field):
+        """Get an unweighted similarity score between two fields.
+
+        Args:
+            a (str): a field label for the first record.
+            b (str): a field label for the second record.
+
+        Returns:
+            float: a number between 0.0 and 1.0, inclusive. 
+        """
+        if self.fields[field]['field_type'] == 'discrete':
+            return float(self.records[a][field] == self.records[b][field])
+        else:
+            d = self.fields[field]['no_match_difference'] - \
+                self.fields[field]['match_difference']
+            n = self.fields[field]['no_match_difference'] - \
+                abs(float(self.records[a][field]) -
+                    float(self.records[b][field]))
+            if n < 0.0:
+                n = 0.0
+            if n > d:
+                n = d
+            return n / d
+
+    def record_similarity(self, a, b, mode='01'):
+        """Get a weighted similarity score between two records.
+
+        Args:
+            a (str): a field label for the first record.
+            b (str): a field label for the second record.
+            mode (str): alternate formulas for calculating similarity, see S.P.
+            p. 157.
+
+        Returns:
+            float: a float between 0.0 and 1.0, inclusive. 
+        """
+        scores = []
+        for field in self.records[a].keys():
+            scores.append(
+                (
+                    self.field_similarity(a, b, field),
+                    self.fields[field]['weight']
+                )
+            )
+
+        match = sum([score * weight for score, weight in scores])
+        no_match = sum([(1.0 - score) * weight for score, weight in scores])
+
+        if mode == '01':
+            return match / (match + no_match)
+        elif mode == '02':
+            return match / (match + 2 * no_match)
+        elif mode == '03':
+            return 2 * match / (2 * match + no_match)
+        else:
+            raise ValueError
+
+    def get_elements(self):
+        """Get a sorted list of record labels.
+
+        Returns:
+            list: record labels, in the order used for similarity matrices.
+        """
+        return sorted(self.records.keys())
+
+    def get_field_arrays(self):
+        """Get per-field numpy arrays for vectorized similarity scores.
+
+        Notes:
+            Discrete fields are encoded as integer codes so that equality can
+            be tested with arrays. Continuous fields are converted to floats.
+            The arrays are cached until new data is imported.
+
+        Returns:
+            list: a list of (field_type, values, field) tuples, where values
+            is a numpy.array in the order of get_elements().
+        """
+        if self._field_arrays is None:
+            elements = self.get_elements()
+            self._field_arrays = []
+            for field in self.records[elements[0]].keys():
+                values = [self.records[e][field] for e in elements]
+                if self.fields[field]['field_type'] == 'discrete':
+                    codes = {}
+                    values = numpy.array(
+                        [codes.setdefault(v, len(codes)) for v in values],
+                        dtype=numpy.int64
+                    )
+                    self._field_arrays.append(('discrete', values, field))
+                else:
+                    values = numpy.array([float(v) for v in values])
+                    self._field_arrays.append(('continuous', values, field))
+        return self._field_arrays
+
+    def get_similarity_block(self, y_indices, x_indices, mode='01'):
+        """Get weighted similarity scores for a block of record pairs.
+
+        Notes:
+            This computes the same scores as record_similarity(), one field
+            at a time across the whole block.
+
+        Args:
+            y_indices (list): record indices for the rows of the block.
+            x_indices (list): record indices for the columns of the block.
+            mode (str): alternate formulas for calculating similarity, see S.P.
+            p. 157.
+
+        Returns:
+            numpy.array: a len(y_indices) x len(x_indices) array of floats.
+        """
+        y_indices = numpy.asarray(y_indices, dtype=numpy.intp)
+        x_indices = numpy.asarray(x_indices, dtype=numpy.intp)
+
+        match = numpy.zeros((len(y_indices), len(x_indices)))
+        no_match = numpy.zeros((len(y_indices), len(x_indices)))
+        for field_type, values, field in self.get_field_arrays():
+            a = values[y_indices][:, None]
+            b = values[x_indices][None, :]
+            if field_type == 'discrete':
+                score = (a == b).astype(float)
+            else:
+                d = self.fields[field]['no_match_difference'] - \
+                    self.fields[field]['match_difference']
+                n = self.fields[field]['no_match_difference'] - numpy.abs(a - b)
+                n = numpy.minimum(numpy.maximum(n, 0.0), d)
+                score = n / d
+            weight = self.fields[field]['weight']
+            match += score * weight
+            no_match += (1.0 - score) * weight
+
+        if mode == '01':
+            return match / (match + no_match)
+        elif mode == '02':
+            return match / (match + 2 * no_match)
+        elif mode == '03':
+            return 2 * match / (2 * match + no_match)
+        else:
+            raise ValueError
+
+    def shuffled(self, rng):
+        """Get a copy of the data with each field shuffled across records.
+
+        Notes:
+            Each field's values are permuted independently, so every field
+            keeps its distribution but the fields of a record no longer
+            belong together. This is the null model for PermutationTest.
+
+        Args:
+            rng (numpy.random.Generator): the source of randomness.
+
+        Returns:
+            Similarity: a new Similarity object, sharing field settings with
+            this one.
+        """
+        s = Similarity()
+        s.fields = self.fields
+        elements = self.get_elements()
+        s.records = {e: {} for e in elements}
+        for field in self.records[elements[0]].keys():
+            order = rng.permutation(len(elements))
+            for e, o in zip(elements, order.tolist()):
+                s.records[e][field] = self.records[elements[o]][field]
+        return s
+
+    def write_csv(self, f, precision=None, block_size=1024, mode='01',
+                  progress=None, cancel=None):
+        """Write a similarity matrix in CSV format, one block of rows at a
+        time.
+
+        Args:
+            f: a file-like object, opened for writing text.
+            precision (int): decimal places to round values to, or None for
+                             full precision.
+            block_size (int): rows to compute and write at once.
+            mode (str): see record_similarity().
+            progress: a function of (rows done, rows), called after each
+                      block of rows, or None.
+            cancel (CancellationToken): checked after each block of rows, or
+                                        None.
+        """
+        _write_csv_blocks(
+            f,
+            self.get_elements(),
+            lambda y, x: self.get_similarity_block(y, x, mode),
+            precision,
+            block_size,
+            progress=progress,
+            cancel=cancel
+        )
+
+    def csv(self):
+        """Output a similarity matrix in CSV format.
+
+        Returns:
+            str: a string with CSV data.
+        """
+        output = io.StringIO()
+        self.write_csv(output)
+        return output.getvalue()
+
+    def write_xlsx(self, f, precision=None, block_size=1024, mode='01',
+                   progress=None, cancel=None):
+        """Write a similarity matrix to an Excel workbook, laid out like
+        write_csv(). The workbook is written in openpyxl's write-only mode.
+
+        Args:
+            f: a path or a file-like object, opened for writing bytes.
+            precision (int): decimal places to round values to, or None for
+                             full precision.
+            block_size (int): rows to compute and write at once.
+            mode (str): see record_similarity().
+            progress: a function of (rows done, rows), called after each
+                      block of rows, or None.
+            cancel (CancellationToken): checked after each block of rows, or
+                                        None.
+        """
+        _write_xlsx_rows(f, _get_matrix_rows(
+            self.get_elements(),
+            lambda y, x: self.get_similarity_block(y, x, mode),
+            precision,
+            block_size,
+            empty=None,
+            progress=progress,
+            cancel=cancel
+        ), 'similarity')
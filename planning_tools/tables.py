@@ -0,0 +1,224 @@
+import csv
+import gzip
+import numpy
+import os
+import secrets
+import sys
+
+from .progress import step
+
+
+class AtomicFile:
+    """A file that only appears at its path once it is completely written.
+
+    Notes:
+        Data is written to a temporary file next to path, which replaces
+        path when the file is closed. If writing fails, call discard(), or
+        use the file in a with statement, and the temporary file is deleted
+        so no partial output is left behind, e.g. when a computation is
+        cancelled. Other attributes are those of the underlying file.
+
+    Args:
+        path (str): the final path. Paths ending in .gz are gzip-compressed.
+        mode (str): 'w' for text, or 'wb' for bytes.
+    """
+    def __init__(self, path, mode='w'):
+        self.path = path
+        self.temp = '{}.{}.tmp'.format(path, secrets.token_hex(4))
+        # level 6 compresses about as well as the default 9, twice as fast.
+        if path.endswith('.gz') and 'b' in mode:
+            self.f = gzip.open(self.temp, 'wb', compresslevel=6)
+        elif path.endswith('.gz'):
+            self.f = gzip.open(self.temp, 'wt', compresslevel=6, newline='')
+        elif 'b' in mode:
+            self.f = open(self.temp, 'wb')
+        else:
+            self.f = open(self.temp, 'w', newline='')
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def close(self):
+        """Finish writing and move the file into place."""
+        if not self.f.closed:
+            self.f.close()
+            os.replace(self.temp, self.path)
+
+    def discard(self):
+        """Stop writing and delete the temporary file."""
+        if not self.f.closed:
+            self.f.close()
+            os.remove(self.temp)
+
+
+def open_output(path=None, mode='w'):
+    """Open a file for CSV or other output.
+
+    Args:
+        path (str): a path, or None or '-' for stdout. Paths ending in .gz
+                    are gzip-compressed.
+        mode (str): 'w' for text, or 'wb' for bytes.
+
+    Returns:
+        a file-like object. Files are AtomicFile objects: close them when
+        done, or use them in a with statement, so that output only appears
+        when it's complete. sys.stdout is returned as is.
+    """
+    if path is None or path == '-':
+        return sys.stdout.buffer if 'b' in mode else sys.stdout
+    return AtomicFile(path, mode)
+
+
+def _get_matrix_rows(x_labels, get_block, precision=None, block_size=1024,
+                     lower=False, y_labels=None, empty='', progress=None,
+                     cancel=None):
+    """Get the rows of a matrix for writing, one block of rows at a time.
+
+    Args:
+        x_labels (list): column labels.
+        get_block: a function of (y indices, x indices) that returns a block
+                   of the matrix as a numpy.array.
+        precision (int): decimal places to round values to, or None.
+        block_size (int): rows per block.
+        lower (bool): only include the lower triangle and diagonal, leaving
+                      the upper triangle empty.
+        y_labels (list): row labels, if different from x_labels.
+        empty: the value for cells left empty.
+        progress: a function of (rows done, rows), called after each block,
+                  or None.
+        cancel (CancellationToken): checked after each block, or None.
+
+    Returns:
+        generator: a header row of labels, then one list per row, starting
+        with the row's label.
+    """
+    if y_labels is None:
+        y_labels = x_labels
+    yield [empty] + list(x_labels)
+    for start in range(0, len(y_labels), block_size):
+        stop = min(len(y_labels), start + block_size)
+        width = stop if lower else len(x_labels)
+        block = get_block(numpy.arange(start, stop), numpy.arange(width))
+        if precision is not None:
+            block = numpy.round(block, precision)
+        # convert a few rows to Python floats at a time, since they take
+        # several times the memory of the array.
+        chunk = max(1, 65536 // max(1, width))
+        for i in range(0, stop - start, chunk):
+            rows = block[i:i + chunk].tolist()
+            for y, row in enumerate(rows, start + i):
+                if lower:
+                    del row[y + 1:]
+                    row.extend([empty] * (len(x_labels) - len(row)))
+                yield [y_labels[y]] + row
+        step(progress, cancel, stop, len(y_labels))
+
+
+def _write_csv_blocks(f, *args, **kwargs):
+    """Write a matrix in CSV format, one block of rows at a time.
+
+    Args:
+        f: a file-like object, opened for writing text.
+        args, kwargs: see _get_matrix_rows().
+    """
+    csv.writer(f).writerows(_get_matrix_rows(*args, **kwargs))
+
+
+def _write_xlsx_rows(f, rows, title, bands=None, symmetric=False):
+    """Write rows to an Excel workbook with openpyxl's write-only mode.
+
+    Notes:
+        Rows are streamed to the file as they are written. Clusters are
+        shown with two alternating named styles, so the workbook holds two
+        shared styles rather than one style object per cell.
+
+    Args:
+        f: a path or a file-like object, opened for writing bytes.
+        rows: an iterable of lists, e.g. from _get_matrix_rows().
+        title (str): the worksheet title.
+        bands (tuple): (y ranges, x ranges) of clusters, as from
+                       Matrix.get_cluster_ranges(), or None. Labels are
+                       shaded by cluster, and for symmetric matrices so are
+                       the blocks along the diagonal.
+        symmetric (bool): whether the matrix is symmetric.
+    """
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import NamedStyle, PatternFill
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    rows = iter(rows)
+
+    if bands is None:
+        for row in rows:
+            sheet.append(row)
+        workbook.save(f)
+        return
+
+    names = []
+    for i, colour in enumerate(('DDEBF7', 'FCE4D6')):
+        style = NamedStyle(name='cluster {}'.format(i + 1))
+        style.fill = PatternFill('solid', fgColor=colour)
+        workbook.add_named_style(style)
+        names.append(style.name)
+
+    def styled(value, band):
+        cell = WriteOnlyCell(sheet, value)
+        cell.style = names[band % 2]
+        return cell
+
+    y_ranges, x_ranges = bands
+    header = next(rows)
+    for band, (a, b) in enumerate(x_ranges):
+        for x in range(a, b):
+            header[x + 1] = styled(header[x + 1], band)
+    sheet.append(header)
+
+    for band, (a, b) in enumerate(y_ranges):
+        for y in range(a, b):
+            row = next(rows)
+            row[0] = styled(row[0], band)
+            if symmetric:
+                for x in range(a + 1, b + 1):
+                    row[x] = styled(row[x], band)
+            sheet.append(row)
+    workbook.save(f)
+
+
+def _get_xlsx_rows(f, sheet=None):
+    """Read the rows of an Excel worksheet with openpyxl's read-only mode.
+
+    Notes:
+        Cells are returned as strings, like rows from a csv.reader, and
+        empty cells at the end of a row are dropped, so CSV import code can
+        read the rows unchanged.
+
+    Args:
+        f: a path or a file-like object, opened for reading bytes.
+        sheet (str): a worksheet title, or None for the first worksheet.
+
+    Returns:
+        generator: lists of strings.
+    """
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(f, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+        for values in worksheet.iter_rows(values_only=True):
+            row = ['' if v is None else str(v) for v in values]
+            while row and row[-1] == '':
+                row.pop()
+            yield row
+    finally:
+        workbook.close()
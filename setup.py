@@ -16,9 +16,14 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     url='https://github.com/johnjung/planning_tools',
-    scripts=[
-        'planning_tools/cardsort',
-        'planning_tools/matrix',
-        'planning_tools/similarity',
-    ]
+    entry_points={
+        'console_scripts': [
+            'cardsort=planning_tools.cli:cardsort',
+            'pairwise=planning_tools.cli:pairwise',
+            'planning-tools=planning_tools.cli:main',
+            'planning-tools-client=planning_tools.daemon:client',
+            'planning-tools-daemon=planning_tools.daemon:main',
+            'similarity=planning_tools.cli:similarity',
+        ]
+    }
 )
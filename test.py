@@ -1,6 +1,28 @@
+import csv
+import gzip
 import io
+import json
+import numpy
+import openpyxl
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
 import unittest
-from planning_tools import CardSort, Interactions, Matrix
+import unittest.mock
+from scipy.cluster.hierarchy import dendrogram, linkage
+from planning_tools import ApproximateCluster, CardSort, Consensus, \
+    DisjointSet, InsightCluster, Interactions, Matrix, PermutationTest, \
+    Similarity, SimilarityGraph, SyntheticMatrix
+from planning_tools import cli, daemon, generate
+from planning_tools.cache import Cache
+from planning_tools.classes import AtomicFile, CancellationToken, \
+    Cancelled, Profiler, open_output
+from planning_tools.profiling import section
+import web
 
 
 class TestCardSort(unittest.TestCase):
@@ -18,6 +40,30 @@ class TestCardSort(unittest.TestCase):
                          'C,01,sherry\n'))
         )
 
+    def test_write_csv(self):
+        output = io.StringIO()
+        self.cardsort.write_csv(output, precision=2, block_size=2)
+        self.assertEqual(output.getvalue(), (
+            ',leather,sherry,tobacco\r\n'
+            'leather,1.0,,\r\n'
+            'sherry,0.0,1.0,\r\n'
+            'tobacco,0.33,0.25,1.0\r\n'
+        ))
+
+    def test_xlsx(self):
+        workbook = openpyxl.Workbook()
+        for row in csv.reader(io.StringIO('A,01,sherry\nA,01,tobacco\n'
+                                          'A,02,leather\nB,01,sherry\n'
+                                          'B,02,tobacco\nB,02,leather\n'
+                                          'C,01,sherry\n')):
+            workbook.active.append(row)
+        output = io.BytesIO()
+        workbook.save(output)
+        output.seek(0)
+        c = CardSort()
+        c.import_from_xlsx(output)
+        self.assertEqual(c.tests, self.cardsort.tests)
+
     def test_get_groups(self):
         self.assertEqual(
             self.cardsort.get_groups(),
@@ -50,6 +96,14 @@ class TestCardSort(unittest.TestCase):
             0.0
         )
 
+    def test_get_similarity_block(self):
+        data = self.cardsort.get_similarity_data()
+        block = self.cardsort.get_similarity_block([0, 1, 2], [0, 1, 2])
+        for y, x in self.cardsort.get_lower_triangle_indices():
+            self.assertEqual(block[y, x], data[y][x])
+            self.assertEqual(block[x, y], data[y][x])
+        self.assertEqual(block[1, 1], 1.0)
+
 
 class TestInteractions(unittest.TestCase):
     def __init__(self, *args, **kwargs):
@@ -81,6 +135,14 @@ class TestInteractions(unittest.TestCase):
                          ',2,2,2,2,2,2,4\n'))
         )
 
+    def test_get_interactions(self):
+        calls = []
+        result = self.interactions.get_interactions(
+            progress=lambda done, total: calls.append((done, total)))
+        self.assertEqual(result.shape, (6, 6))
+        self.assertEqual(result[1, 3], self.interactions.interaction(1, 3))
+        self.assertEqual(calls[-1], (6, 6))
+
     def test_symmetrical_mappings(self):
         """mappings should be symmetrical: e.g., for every ('a_pos', 'b_neg') there
         should be an ('a_neg', 'p_pos').
@@ -293,6 +355,317 @@ class TestMatrix(unittest.TestCase):
             [(0, 0), (1, 0), (1, 1), (2, 0), (2, 1), (2, 2)]
         )
 
+    def test_cluster_nonsymmetric(self):
+        original = {
+            (y, x): self.nonsymmetric_matrix.data[i, j]
+            for i, y in enumerate(self.nonsymmetric_matrix.y_labels)
+            for j, x in enumerate(self.nonsymmetric_matrix.x_labels)
+        }
+        self.nonsymmetric_matrix.cluster('average')
+        self.assertEqual(self.nonsymmetric_matrix.x_labels, ['good', 'cheap'])
+        self.assertEqual(self.nonsymmetric_matrix.y_labels[-1], 'whole foods')
+        for i, y in enumerate(self.nonsymmetric_matrix.y_labels):
+            for j, x in enumerate(self.nonsymmetric_matrix.x_labels):
+                self.assertEqual(self.nonsymmetric_matrix.data[i, j],
+                                 original[(y, x)])
+
+    def test_get_leaf_order(self):
+        m = Matrix()
+        with open('sample_data/fruits_and_vegetables.csv') as f:
+            m.import_from_csv(f)
+        for method in ('single', 'complete', 'ward'):
+            z = linkage(m.data, method)
+            self.assertEqual(
+                Matrix.get_leaf_order(z).tolist(),
+                dendrogram(z, distance_sort='descending', no_plot=True)['leaves']
+            )
+
+    def test_recluster(self):
+        m = Matrix()
+        with open('sample_data/fruits_and_vegetables.csv') as f:
+            m.import_from_csv(f)
+        original = m.data.copy()
+        original_labels = list(m.y_labels)
+        m.cluster('complete')
+
+        node = m.get_cluster_nodes(4)[1]
+        start, stop = m.get_node_range(node)
+        sub = m.submatrix(node)
+        self.assertTrue(numpy.shares_memory(sub.data, m.data))
+        self.assertEqual(sub.y_labels, m.y_labels[start:stop])
+
+        before = list(m.y_labels)
+        m.recluster(node, 'single')
+        self.assertEqual(m.y_labels[:start], before[:start])
+        self.assertEqual(m.y_labels[stop:], before[stop:])
+        self.assertEqual(sorted(m.y_labels[start:stop]),
+                         sorted(before[start:stop]))
+        self.assertEqual(m.get_leaf_order(m.y_linkage).tolist(),
+                         m.y_leaves.tolist())
+
+        order = [original_labels.index(l) for l in m.y_labels]
+        self.assertTrue(numpy.array_equal(
+            m.data, original[numpy.ix_(order, order)]))
+
+    def test_collapse(self):
+        m = Matrix()
+        with open('sample_data/fruits_and_vegetables.csv') as f:
+            m.import_from_csv(f)
+        original = m.data.copy()
+        original_labels = list(m.y_labels)
+
+        groups = m.collapse(0.75)
+        self.assertIn(['lemons', 'limes'], groups)
+        self.assertEqual(m.height(), 30 - sum(len(g) - 1 for g in groups))
+        self.assertNotIn('limes', m.y_labels)
+
+        m.cluster('average')
+        m.expand()
+        self.assertEqual(sorted(m.y_labels), sorted(original_labels))
+        for g in groups:
+            positions = sorted(m.y_labels.index(l) for l in g)
+            self.assertEqual(positions[-1] - positions[0], len(g) - 1)
+        self.assertEqual(m.get_leaf_order(m.y_linkage).tolist(),
+                         m.y_leaves.tolist())
+        order = [original_labels.index(l) for l in m.y_labels]
+        self.assertTrue(numpy.array_equal(
+            m.data, original[numpy.ix_(order, order)]))
+
+    def test_export_graph(self):
+        m = Matrix()
+        with open('sample_data/fruits_and_vegetables.csv') as f:
+            m.import_from_csv(f)
+        m.block_size = 7
+
+        expected = set(
+            (m.y_labels[y], m.x_labels[x])
+            for y in range(m.height()) for x in range(y)
+            if m.data[y, x] >= 0.75
+        )
+        output = io.StringIO()
+        self.assertEqual(
+            m.export_graph(output, 'edgelist', cutoff=0.75), len(expected))
+        rows = list(csv.reader(io.StringIO(output.getvalue())))
+        self.assertEqual(rows[0], ['source', 'target', 'weight'])
+        self.assertEqual(set((r[0], r[1]) for r in rows[1:]), expected)
+
+        # with top_k, every pair appears once.
+        pairs = []
+        for y, x, _ in m.get_edges(top_k=3):
+            pairs.extend(tuple(sorted(p)) for p in zip(y, x))
+        self.assertEqual(len(pairs), len(set(pairs)))
+        self.assertGreaterEqual(len(pairs), 3 * m.height() / 2)
+
+        output = io.StringIO()
+        m.export_graph(output, 'dot', cutoff=0.75)
+        self.assertTrue(output.getvalue().startswith('graph {'))
+        self.assertIn('"limes" -- "lemons"', output.getvalue())
+
+    def test_fill(self):
+        # only the lower triangle is given, with different values in every
+        # cell, and text that isn't a number.
+        m = Matrix()
+        m.import_from_csv(io.StringIO(
+            ',a,b,c,d\n'
+            'a,1,x\n'
+            'b,0.1,1\n'
+            'c,0.2,0.3,1\n'
+            'd,0.4,0.5,0.6,1\n'))
+        lower = numpy.array([[1.0, 0.0, 0.0, 0.0],
+                             [0.1, 1.0, 0.0, 0.0],
+                             [0.2, 0.3, 1.0, 0.0],
+                             [0.4, 0.5, 0.6, 1.0]])
+        self.assertTrue(numpy.array_equal(
+            m.data, lower + numpy.tril(lower, -1).T))
+
+        m.data = numpy.triu(lower.T) + numpy.tril(numpy.full((4, 4), 9.0), -1)
+        m.fill(upper=False)
+        self.assertTrue(numpy.array_equal(
+            m.data, lower + numpy.tril(lower, -1).T))
+
+    def test_downsample(self):
+        m = Matrix()
+        m.data = numpy.arange(36, dtype=float).reshape(6, 6)
+        grid, y_starts, x_starts = m.downsample(3, 2, samples=None)
+        self.assertEqual(y_starts.tolist(), [0, 2, 4])
+        self.assertEqual(x_starts.tolist(), [0, 3])
+        self.assertEqual(grid[0, 0], m.data[0:2, 0:3].mean())
+        self.assertEqual(grid[2, 1], m.data[4:6, 3:6].mean())
+
+        grid, _, _ = m.downsample(3, 2, 'max', samples=None)
+        self.assertEqual(grid[1, 0], m.data[2:4, 0:3].max())
+
+        # sampled blocks read at most samples rows and columns per block.
+        grid, _, _ = m.downsample(1, 1, samples=2)
+        self.assertEqual(grid[0, 0], m.data[numpy.ix_([0, 3], [0, 3])].mean())
+
+        # and the cells read don't depend on the size of the matrix.
+        class CountingArray:
+            def __init__(self, data):
+                self.data = data
+                self.shape = data.shape
+                self.cells = 0
+
+            def __getitem__(self, key):
+                result = self.data[key]
+                self.cells += result.size
+                return result
+
+        cells = []
+        for n in (100, 400):
+            m.data = CountingArray(numpy.zeros((n, n)))
+            m.downsample(4, 4, samples=8)
+            cells.append(m.data.cells)
+        self.assertEqual(cells, [32 * 32, 32 * 32])
+
+    def test_ascii(self):
+        m = Matrix()
+        with open('sample_data/fruits_and_vegetables.csv') as f:
+            m.import_from_csv(f)
+        full = m.ascii().splitlines()
+        self.assertEqual(len(full), max(len(l) for l in m.x_labels) + 1 + 30)
+        small = m.ascii(width=40, height=20).splitlines()
+        self.assertLessEqual(len(small), 20)
+        self.assertLessEqual(max(len(l) for l in small), 40)
+
+    def test_import_labels(self):
+        m = Matrix()
+        m.import_labels(['cheap', 'good'], ['aldi', 'trader joes', 'whole foods'])
+        self.assertEqual(m.data.shape, (3, 2))
+        self.assertEqual(m.y_index['whole foods'], 2)
+
+    def test_import_data(self):
+        m = Matrix()
+        m.import_labels(['a', 'b', 'c'], ['a', 'b', 'c'])
+        m.import_data([('a', 'b', 0.5), ('c', 'b', 0.2)], mirror=True)
+        self.assertEqual(m.data[1].tolist(), [0.5, 1.0, 0.2])
+        with self.assertRaises(ValueError):
+            m.import_data([('a', 'd', 0.1)])
+
+        m.y_labels = ['c', 'b', 'a']
+        m.import_comparisons(numpy.array(['a']), ['a'], [0.0])
+        self.assertEqual(m.data[2, 0], 0.0)
+
+    def test_import_comparisons_from_csv(self):
+        m = Matrix()
+        m.import_comparisons_from_csv(
+            io.StringIO('apples,pears,0.5\npears,limes,0.25\n'))
+        self.assertEqual(m.y_labels, ['apples', 'pears', 'limes'])
+        self.assertEqual(m.x_labels, m.y_labels)
+        self.assertEqual(m.data[2].tolist(), [0.0, 0.25, 1.0])
+
+    def test_write_csv(self):
+        m = Matrix()
+        with open('sample_data/fruits_and_vegetables.csv') as f:
+            m.import_from_csv(f)
+        m.block_size = 7
+        output = io.StringIO()
+        m.write_csv(output)
+        self.assertEqual(output.getvalue(), m.csv())
+
+        output = io.StringIO()
+        m.write_csv(output, precision=2)
+        rows = list(csv.reader(io.StringIO(output.getvalue())))
+        self.assertEqual(rows[0][1:], m.x_labels)
+        self.assertTrue(all(len(c) <= 4 for row in rows[1:] for c in row[1:]))
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'fruits.csv.gz')
+            out = open_output(path)
+            m.write_csv(out)
+            out.close()
+            with gzip.open(path, 'rt', newline='') as f:
+                self.assertEqual(f.read(), m.csv())
+
+    def test_xlsx(self):
+        m = Matrix()
+        with open('sample_data/fruits_and_vegetables.csv') as f:
+            m.import_from_csv(f)
+        m.cluster('complete')
+        output = io.BytesIO()
+        m.write_xlsx(output, clusters=3)
+        output.seek(0)
+        n = Matrix()
+        n.import_from_xlsx(output)
+        self.assertEqual(n.y_labels, m.y_labels)
+        self.assertTrue(numpy.array_equal(n.data, m.data))
+
+        output.seek(0)
+        workbook = openpyxl.load_workbook(output)
+        self.assertEqual(workbook.named_styles[-2:], ['cluster 1', 'cluster 2'])
+        self.assertEqual(workbook.active['B2'].style, 'cluster 1')
+        self.assertEqual(workbook.active.cell(2, 31).style, 'Normal')
+
+    def test_statistics(self):
+        m = Matrix()
+        with open('sample_data/fruits_and_vegetables.csv') as f:
+            m.import_from_csv(f)
+        values = m.data[numpy.tril_indices(m.height(), -1)]
+        statistics = m.statistics(bins=10, quantiles=(0.5, 0.9))
+        self.assertEqual(statistics['count'], len(values))
+        self.assertAlmostEqual(statistics['mean'], values.mean())
+        self.assertAlmostEqual(statistics['std'], values.std())
+        self.assertEqual(statistics['max'], values.max())
+        self.assertEqual(statistics['quantiles'],
+                         {0.5: numpy.median(values),
+                          0.9: numpy.quantile(values, 0.9)})
+        self.assertEqual(statistics['histogram']['counts'],
+                         numpy.histogram(values, 10, (0, 1))[0].tolist())
+
+    def test_get_triangle_blocks(self):
+        m = Matrix()
+        m.import_from_source(SyntheticMatrix(1000, 10))
+        m.block_size = 100
+        values = numpy.concatenate(list(m.get_triangle_blocks()))
+        self.assertTrue(numpy.array_equal(
+            values, m.data[numpy.tril_indices(1000, -1)]))
+
+        # each block takes about as much memory as its values, and the loop
+        # holds on to the previous block while the next one is read.
+        tracemalloc.start()
+        for _ in m.get_triangle_blocks():
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.assertLess(peak, 2.5 * m.block_size * m.width() * 8)
+
+    def test_npy(self):
+        m = Matrix()
+        with open('sample_data/fruits_and_vegetables.csv') as f:
+            m.import_from_csv(f)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'fruits.npy')
+            m.export_npy(path)
+            n = Matrix()
+            n.import_from_npy(path)
+            self.assertEqual(n.y_labels, m.y_labels)
+            self.assertTrue(numpy.array_equal(n.data, m.data))
+            self.assertEqual(n.statistics(), m.statistics())
+            del n
+
+    def test_png(self):
+        m = Matrix()
+        with open('sample_data/fruits_and_vegetables.csv') as f:
+            m.import_from_csv(f)
+        m.cluster('complete')
+        out = io.BytesIO()
+        m.png(out, cell_size=2, clusters=3)
+        png = out.getvalue()
+        self.assertEqual(png[:8], b'\x89PNG\r\n\x1a\n')
+        self.assertEqual(png[12:16], b'IHDR')
+        self.assertEqual(png[16:24], b'\x00\x00\x00\x3c\x00\x00\x00\x3c')
+        self.assertEqual(png[-8:-4], b'IEND')
+
+    def test_svg(self):
+        m = Matrix()
+        with open('sample_data/fruits_and_vegetables.csv') as f:
+            m.import_from_csv(f)
+        m.cluster('complete')
+        svg = m.svg(clusters=3)
+        self.assertLess(svg.count('<rect class='), m.width() * m.height())
+        self.assertEqual(svg.count('<rect x='), 3)
+        self.assertIn('<image', m.svg(raster=True))
+
     def test_randomize(self):
         fruits_and_vegetables = Matrix()
         f = open('sample_data/fruits_and_vegetables.csv')
@@ -305,5 +678,718 @@ class TestMatrix(unittest.TestCase):
         )
 
 
+class TestConsensus(unittest.TestCase):
+    def test_matrix(self):
+        a = Matrix()
+        a.import_from_csv(io.StringIO(',a,b,c\na,1,,\nb,0.5,1,\nc,0,0.2,1\n'))
+        b = Matrix()
+        b.import_from_csv(io.StringIO(',c,d,a\nc,1,,\nd,1,1,\na,0.4,0,1\n'))
+        c = Consensus()
+        c.add(a)
+        c.add(b, 3.0)
+        m = c.matrix()
+        self.assertEqual(m.y_labels, ['a', 'b', 'c', 'd'])
+        self.assertEqual(m.x_labels, m.y_labels)
+        self.assertAlmostEqual(m.data[0, 2], 0.3)
+        self.assertAlmostEqual(m.data[2, 0], 0.3)
+        self.assertEqual(m.data[1, 3], 0.0)
+        self.assertEqual(c.get_weights()[1].tolist(), [1.0, 1.0, 1.0, 0.0])
+
+    def test_memory(self):
+        matrices = []
+        for i in range(5):
+            m = Matrix()
+            m.import_from_source(SyntheticMatrix(200, 5, seed=i))
+            m.y_labels = m.x_labels = \
+                ['{} {}'.format(l, i) for l in m.y_labels]
+            matrices.append(m)
+
+        # the sums, the weights, and the old sums while growing.
+        c = Consensus()
+        tracemalloc.start()
+        for m in matrices:
+            c.add(m, 0.1)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.assertLess(peak, 3 * 1000 * 1000 * 8)
+        self.assertEqual(c.get_weights().max(), 0.1)
+
+    def test_fractional_weights(self):
+        a = Matrix()
+        a.import_from_csv(io.StringIO(',a,b\na,1,\nb,0.3,1\n'))
+        c = Consensus()
+        for _ in range(1000):
+            c.add(a, 0.1)
+        self.assertAlmostEqual(c.matrix().data[0, 1], 0.3, places=12)
+
+    def test_mixed(self):
+        a = Matrix()
+        a.import_from_csv(io.StringIO(',a,b\na,1,\nb,0.5,1\n'))
+        b = Matrix()
+        b.import_from_csv(io.StringIO(',cheap,good\naldi,1,0\n'))
+        c = Consensus()
+        c.add(a)
+        with self.assertRaises(ValueError):
+            c.add(b)
+
+
+class TestDisjointSet(unittest.TestCase):
+    def test_union(self):
+        d = DisjointSet(6)
+        d.union(0, 3)
+        d.union(5, 4)
+        d.union(2, 4)
+        self.assertEqual(d.find(3), d.find(0))
+        self.assertNotEqual(d.find(1), d.find(0))
+        self.assertEqual(d.get_groups(), [[0, 3], [1], [2, 4, 5]])
+
+
+class TestSimilarity(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.similarity = Similarity()
+        with open('sample_data/chairs.csv') as f:
+            self.similarity.import_from_csv(f)
+
+    def test_get_similarity_block(self):
+        elements = self.similarity.get_elements()
+        block = self.similarity.get_similarity_block(
+            range(len(elements)), range(len(elements)))
+        for y, a in enumerate(elements):
+            for x, b in enumerate(elements):
+                self.assertEqual(
+                    block[y, x], self.similarity.record_similarity(a, b))
+
+
+class TestApproximateCluster(unittest.TestCase):
+    def test_cluster(self):
+        cardsort = CardSort()
+        with open('sample_data/beer_flavor_wheel.csv') as f:
+            cardsort.import_from_csv(f)
+        elements = cardsort.get_elements()
+
+        a = ApproximateCluster(cardsort, sample_size=20, n_clusters=4,
+                               block_size=16, seed=0)
+        a.cluster()
+        self.assertEqual(sorted(a.order.tolist()),
+                         list(range(len(elements))))
+        self.assertEqual(sorted(a.labels), elements)
+        self.assertEqual(set(a.assignments.tolist()), set(range(4)))
+
+        # items in the same cluster should be contiguous in the new order.
+        clusters = a.assignments[a.order].tolist()
+        self.assertEqual(clusters, sorted(clusters))
+
+    def test_cluster_empty(self):
+        a = ApproximateCluster(CardSort())
+        a.cluster()
+        self.assertEqual(a.order.tolist(), [])
+        self.assertEqual(a.assignments.tolist(), [])
+        self.assertEqual(a.labels, [])
+        self.assertEqual(a.csv(), 'label,cluster\r\n')
+
+
+class TestInsightCluster(unittest.TestCase):
+    def test_get_delta_matrix(self):
+        insight = InsightCluster([[1, 3, 2, 3, 3],
+                                  [2, 1, 1, 3, 3],
+                                  [3, 3, 2, 1, 2]])
+        self.assertEqual(
+            insight.get_delta_matrix(1).tolist(),
+            [[0, 3, 3, 5, 4],
+             [3, 0, 2, 4, 3],
+             [3, 2, 0, 4, 3],
+             [5, 4, 4, 0, 1],
+             [4, 3, 3, 1, 0]]
+        )
+        self.assertEqual(
+            insight.get_delta_matrix(0).tolist(),
+            [[0, 4, 5],
+             [4, 0, 7],
+             [5, 7, 0]]
+        )
+
+    def test_cluster(self):
+        order, z = InsightCluster([[0], [10], [1], [11]]).cluster()
+        self.assertEqual(order, [0, 2, 1, 3])
+        self.assertEqual(z[:, :3].tolist(),
+                         [[0, 2, 1], [1, 3, 1], [4, 5, 10]])
+
+    def test_matrix_cluster(self):
+        m = Matrix()
+        with open('sample_data/fruits_and_vegetables.csv') as f:
+            m.import_from_csv(f)
+        m.cluster('insight')
+        self.assertEqual(sorted(m.y_labels), sorted(m.x_labels))
+        self.assertEqual(m.y_labels, m.x_labels)
+        self.assertEqual(m.y_labels[:4],
+                         ['cucumbers', 'celery', 'tomatoes', 'peppers'])
+        for node in m.get_cluster_nodes(4):
+            m.get_node_range(node)
+
+
+class TestPermutationTest(unittest.TestCase):
+    def test_shuffled(self):
+        c = CardSort()
+        with open('sample_data/beer_flavor_wheel.csv') as f:
+            c.import_from_csv(f)
+        s = c.shuffled(numpy.random.default_rng(0))
+        self.assertEqual(s.get_elements(), c.get_elements())
+        self.assertEqual(
+            [sorted(len(g) for g in t.values()) for t in s.tests.values()],
+            [sorted(len(g) for g in t.values()) for t in c.tests.values()]
+        )
+        self.assertNotEqual(s.get_groups(), c.get_groups())
+
+    def test_run(self):
+        c = CardSort()
+        with open('sample_data/beer_flavor_wheel.csv') as f:
+            c.import_from_csv(f)
+        p = PermutationTest(c, 'average', 50, seed=0, workers=1)
+        p.run()
+        self.assertEqual(p.null.shape, (50, 2))
+        self.assertLess(p.p_values[0], 0.05)
+        q = PermutationTest(c, 'average', 50, seed=0, workers=2)
+        q.run()
+        self.assertTrue(numpy.array_equal(p.null, q.null))
+
+
+class TestSimilarityGraph(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.matrix = Matrix()
+        self.matrix.import_from_csv(
+            io.StringIO((',a,b,c,d,e\n'
+                         'a,1.0,,,,\n'
+                         'b,0.9,1.0,,,\n'
+                         'c,0.8,0.9,1.0,,\n'
+                         'd,0.0,0.1,0.0,1.0,\n'
+                         'e,0.0,0.0,0.1,0.9,1.0\n'))
+        )
+
+    def test_threshold_graph(self):
+        g = SimilarityGraph()
+        g.import_from_source(self.matrix, threshold=0.5)
+        self.assertEqual(g.adjacency.nnz, 8)
+        self.assertEqual(g.get_components().tolist(), [0, 0, 0, 1, 1])
+
+    def test_knn_graph(self):
+        g = SimilarityGraph()
+        g.import_from_source(self.matrix, k=1)
+        self.assertTrue((g.adjacency != g.adjacency.T).nnz == 0)
+        self.assertEqual(g.adjacency[3, 4], 0.9)
+
+    def test_louvain(self):
+        g = SimilarityGraph()
+        g.import_from_source(self.matrix, threshold=0.05)
+        communities = g.louvain(seed=0).tolist()
+        self.assertEqual(communities, [0, 0, 0, 1, 1])
+        self.assertGreater(g.modularity(communities),
+                           g.modularity([0, 0, 0, 0, 0]))
+        self.assertEqual(g.get_order().tolist()[3:], [3, 4])
+
+
+class TestProgress(unittest.TestCase):
+    def setUp(self):
+        self.cardsort = CardSort()
+        with open('sample_data/beer_flavor_wheel.csv') as f:
+            self.cardsort.import_from_csv(f)
+
+    def test_progress(self):
+        calls = []
+        m = Matrix()
+        m.block_size = 10
+        m.import_from_source(self.cardsort,
+                             lambda done, total: calls.append((done, total)))
+        n = len(m.y_labels)
+        self.assertEqual(calls[-1], (n, n))
+        self.assertEqual(len(calls), (n + 9) // 10)
+
+        calls = []
+        m.cluster('average', lambda done, total: calls.append((done, total)))
+        self.assertEqual(calls, [(1, 2), (2, 2)])
+
+    def test_cancel(self):
+        cancel = CancellationToken()
+        cancel.cancel()
+        m = Matrix()
+        with self.assertRaises(Cancelled):
+            m.import_from_source(self.cardsort, cancel=cancel)
+        m.import_from_source(self.cardsort)
+        y_labels = m.y_labels
+        for method in ('average', 'insight'):
+            with self.assertRaises(Cancelled):
+                m.cluster(method, cancel=cancel)
+            self.assertEqual(m.y_labels, y_labels)
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'beer.csv')
+            with self.assertRaises(Cancelled):
+                with AtomicFile(path) as out:
+                    m.write_csv(out, cancel=cancel)
+            self.assertEqual(os.listdir(d), [])
+            with self.assertRaises(Cancelled):
+                cli.run([['matrix', 'sample_data/fruits_and_vegetables.csv'],
+                         ['cluster', 'average'],
+                         ['csv', '--output=' + path]], cancel=cancel)
+            self.assertEqual(os.listdir(d), [])
+
+
+class TestProfiler(unittest.TestCase):
+    def test_sections(self):
+        with Profiler() as profiler:
+            with section('outer'):
+                with section('inner'):
+                    data = numpy.ones(100000)
+                del data
+        self.assertEqual([s['name'] for s in profiler.sections],
+                         ['outer', 'outer/inner'])
+        self.assertGreaterEqual(profiler.sections[1]['peak_memory'], 800000)
+        self.assertGreaterEqual(profiler.sections[0]['peak_memory'],
+                                profiler.sections[1]['peak_memory'])
+        report = profiler.report(command=['test'])
+        self.assertEqual(report['command'], ['test'])
+        self.assertGreaterEqual(report['wall_seconds'],
+                                profiler.sections[0]['wall_seconds'])
+
+        with section('inactive'):
+            pass
+        self.assertEqual(len(profiler.sections), 2)
+
+    def test_cli(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'report.json')
+            stdout = sys.stdout
+            sys.stdout = io.StringIO()
+            try:
+                cli.main(['--profile=' + path,
+                          'matrix', 'sample_data/fruits_and_vegetables.csv',
+                          '+', 'stats'])
+            finally:
+                sys.stdout = stdout
+            with open(path) as f:
+                report = json.load(f)
+        self.assertEqual([s['name'] for s in report['sections']],
+                         ['matrix', 'stats'])
+        self.assertEqual(cli.get_profile_options(['a', '--profile=p'])[0],
+                         ['a'])
+
+
+class TestGenerate(unittest.TestCase):
+    def generate(self, write, **kwargs):
+        f = io.StringIO()
+        write(f, **kwargs)
+        return f.getvalue()
+
+    def test_cardsort(self):
+        # more items than a chunk, to cover chunk boundaries.
+        data = self.generate(generate.write_cardsort, items=5000,
+                             participants=2, seed=1)
+        self.assertEqual(data, self.generate(
+            generate.write_cardsort, items=5000, participants=2, seed=1))
+        self.assertNotEqual(data, self.generate(
+            generate.write_cardsort, items=5000, participants=2, seed=2))
+        c = CardSort()
+        c.import_from_csv(io.StringIO(data))
+        self.assertEqual(len(c.get_elements()), 5000)
+        self.assertEqual(len(c.tests), 2)
+
+    def test_similarity(self):
+        s = Similarity()
+        s.import_from_csv(io.StringIO(self.generate(
+            generate.write_similarity, items=50, group_sizes='zipf')))
+        m = Matrix()
+        m.import_from_source(s)
+        self.assertEqual(m.data.shape, (50, 50))
+        self.assertTrue(((m.data >= 0.0) & (m.data <= 1.0)).all())
+
+    def test_interactions(self):
+        i = Interactions()
+        i.import_from_csv(io.StringIO(self.generate(
+            generate.write_interactions, items=10, variables=4)))
+        self.assertEqual(len(i.element_labels), 10)
+        self.assertEqual(len(i.weights), 4)
+        self.assertEqual(i.get_interactions().shape, (10, 10))
+
+    def test_matrix(self):
+        s = SyntheticMatrix(200, 4, noise=0.1, seed=3)
+        m = Matrix()
+        m.import_from_source(s)
+        self.assertTrue(numpy.array_equal(m.data, m.data.T))
+        self.assertTrue(numpy.array_equal(
+            s.get_similarity_block(numpy.arange(5, 9), numpy.arange(200)),
+            m.data[5:9]))
+        same = s.clusters[:, None] == s.clusters[None, :]
+        self.assertGreater(m.data[same].min(), m.data[~same].max())
+
+        output = io.StringIO()
+        s.write_csv(output, precision=None, block_size=7)
+        n = Matrix()
+        n.import_from_csv(io.StringIO(output.getvalue()))
+        self.assertTrue(numpy.allclose(n.data, m.data))
+
+    def test_cli(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'cards.csv.gz')
+            cli.main(['generate', 'cardsort', '--items=20', '--seed=4',
+                      '--output=' + path])
+            with gzip.open(path, 'rt', newline='') as f:
+                self.assertEqual(f.read(), self.generate(
+                    generate.write_cardsort, items=20, seed=4))
+
+
+class TestCli(unittest.TestCase):
+    def test_split_stages(self):
+        self.assertEqual(
+            cli.split_stages(['matrix', 'a.csv', '+', 'cluster', 'ward']),
+            [['matrix', 'a.csv'], ['cluster', 'ward']]
+        )
+
+    def test_run(self):
+        stdout = io.StringIO()
+        p = cli.run(
+            cli.split_stages(['cardsort', 'sample_data/beer_flavor_wheel.csv',
+                              '+', 'cluster', 'average',
+                              '+', 'csv', '--precision=2']),
+            stdout=stdout
+        )
+        m = Matrix()
+        m.import_from_source(p.source)
+        m.cluster('average')
+        f = io.StringIO()
+        m.write_csv(f, 2)
+        self.assertEqual(stdout.getvalue(), f.getvalue())
+        self.assertEqual(p.matrix.y_labels, m.y_labels)
+
+    def test_louvain(self):
+        stages = [['cardsort', 'sample_data/beer_flavor_wheel.csv'],
+                  ['cluster', 'louvain', '--k=5', '--seed=1']]
+        p = cli.run(stages, stdout=io.StringIO())
+        m = Matrix()
+        m.import_from_source(p.source)
+        m.cluster_graph(k=5, seed=1)
+        self.assertEqual(p.matrix.y_labels, m.y_labels)
+
+        # seeded results are cached, and read back in the same order.
+        with tempfile.TemporaryDirectory() as d:
+            c = Cache(d)
+            for _ in range(2):
+                p = cli.run(stages, stdout=io.StringIO(), cache=c)
+                self.assertEqual(p.matrix.y_labels, m.y_labels)
+            self.assertEqual(c.info()['entries'], 2)
+
+        with self.assertRaises(cli.PipelineError):
+            cli.run([stages[0], ['cluster', 'louvain']])
+
+    def test_legacy(self):
+        arguments = cli.docopt(
+            cli.PAIRWISE_USAGE,
+            ['image', '--cluster=ward', '--output=a.png', 'a.csv']
+        )
+        self.assertEqual(
+            [s[0] for s in cli.get_pairwise_stages(arguments)],
+            ['matrix', 'cluster', 'image']
+        )
+
+    def test_errors(self):
+        with self.assertRaises(cli.PipelineError):
+            cli.run([['cluster', 'average']])
+        with self.assertRaises(cli.PipelineError):
+            cli.run([['matrix', 'sample_data/fruits_and_vegetables.csv'],
+                     ['cluster', 'bogus']])
+        with self.assertRaises(cli.PipelineError):
+            cli.run([['matrix', 'a.csv'], ['csv', '--bogus']])
+        for method in ('insight', 'bogus'):
+            with self.assertRaises(cli.PipelineError):
+                cli.run([['cardsort', 'sample_data/beer_flavor_wheel.csv'],
+                         ['permutation', '--permutations=2', method]])
+            with self.assertRaises(cli.PipelineError):
+                cli.run([['cardsort', 'sample_data/beer_flavor_wheel.csv'],
+                         ['approximate', method]])
+
+
+class TestBatch(unittest.TestCase):
+    def test_run_batch(self):
+        with tempfile.TemporaryDirectory() as d:
+            for name in ('a', 'b'):
+                with open(os.path.join(d, name + '.csv'), 'w') as f:
+                    f.write('A,01,apples\nA,01,pears\nA,02,corn\n')
+            with open(os.path.join(d, 'broken.csv'), 'w') as f:
+                f.write('A,01\n')
+            inputs = cli.get_batch_inputs([d])
+            self.assertEqual([os.path.basename(p) for p in inputs],
+                             ['a.csv', 'b.csv', 'broken.csv'])
+            out = os.path.join(d, 'out')
+            results = cli.run_batch('cardsort', inputs,
+                                    [['cluster', 'average'], ['csv']],
+                                    out, workers=1)
+            self.assertEqual([r['error'] is None for r in results],
+                             [True, True, False])
+            self.assertEqual(sorted(os.listdir(out)), ['a.csv', 'b.csv'])
+            with open(os.path.join(out, 'a.csv')) as f:
+                self.assertEqual(
+                    sorted(f.read().splitlines()[0].split(',')),
+                    ['', 'apples', 'corn', 'pears'])
+            summary = cli.format_batch_summary(results)
+            self.assertIn('total: 2 ok, 1 failed', summary)
+
+
+class TestCache(unittest.TestCase):
+    def test_put(self):
+        with tempfile.TemporaryDirectory() as d:
+            c = Cache(d, 2000)
+            key = Cache.get_key('matrix', 'abc', 1.0)
+            self.assertNotEqual(key, Cache.get_key('matrix', 'abc', 2.0))
+            self.assertIsNone(c.get(key))
+            c.put(key, data=numpy.eye(3), labels=['a', 'b', 'c'])
+            entry = c.get(key)
+            self.assertTrue(numpy.array_equal(entry['data'], numpy.eye(3)))
+            self.assertEqual(entry['labels'].tolist(), ['a', 'b', 'c'])
+
+    def test_from_environment(self):
+        with unittest.mock.patch.dict(os.environ):
+            os.environ.pop('PLANNING_TOOLS_CACHE', None)
+            os.environ.pop('PLANNING_TOOLS_CACHE_SIZE', None)
+            self.assertIsNone(Cache.from_environment())
+            os.environ['PLANNING_TOOLS_CACHE'] = 'cache'
+            self.assertEqual(Cache.from_environment().path, 'cache')
+            os.environ['PLANNING_TOOLS_CACHE_SIZE'] = '0'
+            self.assertIsNone(Cache.from_environment())
+
+    def test_put_too_large(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'cache')
+            c = Cache(path, 2000)
+            c.put(Cache.get_key('matrix', 'abc'), data=numpy.zeros((20, 20)))
+            self.assertFalse(os.path.exists(path))
+
+    def test_evict(self):
+        with tempfile.TemporaryDirectory() as d:
+            c = Cache(d)
+            for i in range(3):
+                c.put(str(i), data=numpy.zeros(100))
+                os.utime(c.get_entry_path(str(i)), (i, i))
+            c.max_size = c.info()['size'] - 100
+            c.get('0')
+            c.put('3', data=numpy.zeros(100))
+            self.assertEqual(c.info()['entries'], 2)
+            self.assertIsNotNone(c.get('0'))
+            self.assertIsNone(c.get('1'))
+            c.clear()
+            self.assertEqual(c.info()['size'], 0)
+
+    def test_pipeline(self):
+        stages = cli.split_stages(
+            ['cardsort', 'sample_data/beer_flavor_wheel.csv',
+             '+', 'cluster', '--collapse=0.9', 'average', '+', 'csv'])
+        with tempfile.TemporaryDirectory() as d:
+            c = Cache(d)
+            outputs = []
+            for _ in range(2):
+                stdout = io.StringIO()
+                p = cli.run(stages, stdout=stdout, cache=c)
+                outputs.append(stdout.getvalue())
+            self.assertEqual(c.info()['entries'], 2)
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(p.matrix.y_leaves.tolist(),
+                         p.matrix.get_leaf_order(p.matrix.y_linkage).tolist())
+
+
+    def test_npy_key(self):
+        m = Matrix()
+        with open('sample_data/fruits_and_vegetables.csv') as f:
+            m.import_from_csv(f)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'fruits.npy')
+            m.export_npy(path)
+            c = Cache(os.path.join(d, 'cache'))
+            with unittest.mock.patch.object(
+                    Cache, 'get_file_key', wraps=Cache.get_file_key) as hashed:
+                # nothing is looked up, so nothing is hashed.
+                cli.run([['matrix', path], ['stats']], stdout=io.StringIO(),
+                        cache=c)
+                self.assertEqual(hashed.call_count, 0)
+
+                # .npy files are identified without reading them.
+                cli.run([['matrix', path], ['cluster', 'average'], ['csv']],
+                        stdout=io.StringIO(), cache=c)
+                self.assertEqual([call.args[0] for call in hashed.mock_calls],
+                                 [path + '.labels.json'])
+            self.assertEqual(c.info()['entries'], 1)
+
+class TestStartup(unittest.TestCase):
+    # seconds of imports allowed before any work is done.
+    budget = 0.1
+    heavy = ('graphviz', 'numpy', 'openpyxl', 'scipy')
+
+    def get_import_time(self, code):
+        p = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                           capture_output=True, text=True, check=True)
+        microseconds = 0
+        for line in p.stderr.splitlines():
+            fields = line.split('|')
+            if len(fields) == 3 and fields[1].strip().isdigit() and \
+                    not fields[2][1:].startswith(' '):
+                microseconds += int(fields[1])
+        return p.stdout, microseconds / 1e6
+
+    def test_import(self):
+        stdout, seconds = self.get_import_time(
+            'import planning_tools, sys; '
+            'print(sorted(m for m in {} if m in sys.modules))'.format(
+                self.heavy))
+        self.assertEqual(stdout, '[]\n')
+        self.assertLess(seconds, self.budget)
+
+    def test_help(self):
+        stdout, seconds = self.get_import_time(
+            'import sys; from planning_tools.cli import cardsort\n'
+            'try:\n    cardsort(["--help"])\n'
+            'except SystemExit:\n'
+            '    print(sorted(m for m in {} if m in sys.modules))'.format(
+                self.heavy))
+        self.assertTrue(stdout.startswith('Usage:'))
+        self.assertTrue(stdout.endswith('[]\n'))
+        self.assertLess(seconds, self.budget)
+
+
+class TestDaemon(unittest.TestCase):
+    def test_request(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'planning_tools.sock')
+            p = subprocess.Popen([
+                sys.executable, '-c',
+                'from planning_tools.daemon import main; main()',
+                '--socket=' + path, '--workers=2'
+            ], env={k: v for k, v in os.environ.items()
+                    if k != 'PLANNING_TOOLS_CACHE'})
+            try:
+                for _ in range(100):
+                    if os.path.exists(path):
+                        break
+                    time.sleep(0.1)
+                stdout = io.BytesIO()
+                status = daemon.request(
+                    ['cardsort', 'average',
+                     'sample_data/beer_flavor_wheel.csv'],
+                    path, stdout=stdout)
+                self.assertEqual(status, 0)
+                c = CardSort()
+                c.import_from_csv(open('sample_data/beer_flavor_wheel.csv'))
+                m = Matrix()
+                m.import_from_source(c)
+                m.cluster('average')
+                self.assertEqual(stdout.getvalue().decode('utf-8'), m.csv())
+
+                stdout = io.BytesIO()
+                status = daemon.request(
+                    ['planning-tools', 'matrix', '-', '+', 'csv'], path,
+                    io.BytesIO(b',a,b\na,1,\nb,0.5,1\n'), stdout)
+                self.assertEqual(status, 0)
+                self.assertEqual(stdout.getvalue(),
+                                 b',a,b\r\na,1.0,0.5\r\nb,0.5,1.0\r\n')
+
+                stderr = io.BytesIO()
+                status = daemon.request(['planning-tools', 'cluster', 'ward'],
+                                        path, stderr=stderr)
+                self.assertEqual(status, 1)
+                self.assertIn(b'no data', stderr.getvalue())
+
+                # jobs get the client's environment, and only for that job.
+                cache = os.path.join(d, 'cache')
+                stdout = io.BytesIO()
+                status = daemon.request(
+                    ['planning-tools', 'cache', 'info'], path, stdout=stdout,
+                    env=dict(os.environ, PLANNING_TOOLS_CACHE=cache))
+                self.assertEqual(status, 0)
+                self.assertEqual(json.loads(stdout.getvalue())['path'], cache)
+                env = dict(os.environ)
+                env.pop('PLANNING_TOOLS_CACHE', None)
+                for _ in range(2):  # on both workers.
+                    stderr = io.BytesIO()
+                    status = daemon.request(['planning-tools', 'cache', 'info'],
+                                            path, stderr=stderr, env=env)
+                    self.assertEqual(status, 1)
+                    self.assertIn(b'turned off', stderr.getvalue())
+            finally:
+                p.terminate()
+                p.wait()
+            self.assertFalse(os.path.exists(path))
+
+
+class TestWeb(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'insightmatrix.db')
+        web.app.config['DATABASE'] = self.path
+        self.client = web.app.test_client()
+
+    def tearDown(self):
+        web._connections.conn.close()
+        web._connections.conn = None
+        self.directory.cleanup()
+
+    def compare(self, label_one, label_two, comparison):
+        response = self.client.post('/compare', data={
+            'label_one': label_one,
+            'label_two': label_two,
+            'comparison': comparison
+        })
+        self.assertEqual(response.status_code, 200)
+
+    def get_comparisons(self):
+        return [c for c in self.client.get('/json').get_json()['comparisons']
+                if c[0] != c[1]]
+
+    def test_compare(self):
+        self.client.get('/reset')
+        self.compare('apples', 'pears', 2)
+        self.compare('apples', 'pears', 4)
+        self.compare('pears', 'apples', 5)
+        self.assertEqual(self.get_comparisons(), [['apples', 'pears', 2]])
+
+    def test_migrate(self):
+        # a database from before the comparison_pair index, with a pair
+        # stored three times.
+        conn = sqlite3.connect(self.path)
+        conn.executescript("""
+            CREATE TABLE label (id INTEGER NOT NULL, label VARCHAR(250) NOT NULL,
+                                test_id INTEGER NOT NULL, PRIMARY KEY (id));
+            CREATE TABLE comparison (id INTEGER NOT NULL,
+                                     label_one_id INTEGER NOT NULL,
+                                     label_two_id INTEGER NOT NULL,
+                                     comparison INTEGER NOT NULL,
+                                     PRIMARY KEY (id));
+            INSERT INTO label VALUES (1, 'apples', 1), (2, 'pears', 1),
+                                     (3, 'corn', 1);
+            INSERT INTO comparison VALUES (1, 1, 1, 3), (2, 2, 2, 3),
+                                          (3, 3, 3, 3), (4, 2, 1, 1),
+                                          (5, 1, 2, 4), (6, 2, 1, 5);
+        """)
+        conn.close()
+
+        # the app counts the pair once, so pairs are left to compare.
+        response = self.client.get('/compare')
+        self.assertIn(b'corn', response.data)
+        self.compare('corn', 'apples', 2)
+        self.compare('apples', 'corn', 4)
+        self.assertEqual(len(self.get_comparisons()), 4)
+
+        result = web.migrate(self.path)
+        self.assertEqual((result['reordered'], result['removed']), (2, 2))
+        self.assertTrue(os.path.exists(result['backup']))
+        self.assertEqual(sorted(self.get_comparisons()),
+                         [['apples', 'corn', 2], ['apples', 'pears', 1]])
+        conn = sqlite3.connect(self.path)
+        self.assertEqual(
+            conn.execute("""SELECT label_one_id, label_two_id FROM comparison
+                            WHERE id=4;""").fetchone(), (1, 2))
+        with self.assertRaises(sqlite3.IntegrityError):
+            conn.execute("INSERT INTO comparison VALUES (NULL, 1, 2, 1);")
+        conn.close()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -2,63 +2,154 @@ import os
 import random
 import sqlite3
 import sys
+import threading
+import time
 
-from flask import Flask, flash, jsonify, render_template, request
+from flask import Flask, flash, g, jsonify, render_template, request
 from planning_tools.classes import Matrix
 
 app = Flask(__name__)
+app.config['DATABASE'] = os.environ.get(
+    'PLANNING_TOOLS_DATABASE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'insightmatrix.db')
+)
+
+# One connection per worker thread, reused by every request that thread
+# serves. sqlite3 caches prepared statements per connection, so reusing
+# connections also reuses the statements below.
+_connections = threading.local()
+
+INDEXES = """CREATE UNIQUE INDEX IF NOT EXISTS comparison_pair
+                 ON comparison (label_one_id, label_two_id);
+             CREATE INDEX IF NOT EXISTS label_label ON label (label);"""
+
+def connect(path):
+    """Open a connection to the database.
+
+    Notes:
+        WAL journaling lets phones read the matrix while another uwsgi
+        process writes a comparison, and synchronous=NORMAL is safe with WAL.
+        The schema isn't changed here: see migrate() for databases created
+        before the comparison_pair index.
+    """
+    conn = sqlite3.connect(path, timeout=10, cached_statements=64)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    return conn
+
+def get_db():
+    """Get the connection for this request."""
+    if 'db' not in g:
+        path = app.config['DATABASE']
+        conn = getattr(_connections, 'conn', None)
+        # uwsgi forks workers, and connections can't be shared across a fork.
+        if conn is None or _connections.pid != os.getpid() or \
+                _connections.path != path:
+            conn = connect(path)
+            _connections.conn = conn
+            _connections.pid = os.getpid()
+            _connections.path = path
+        g.db = conn
+    return g.db
+
+@app.teardown_appcontext
+def release_db(exception):
+    conn = g.pop('db', None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+def migrate(path):
+    """Bring a database created before the comparison_pair index up to date.
+
+    Notes:
+        The database is backed up first, next to the original. Pairs are
+        then stored with the lower label id first, and where a pair was
+        compared more than once, in either order, only the first comparison
+        is kept, as add_comparison() does. Run this once, with the app
+        stopped:
+
+            flask --app web migrate
+
+    Args:
+        path (str): the database file.
+
+    Returns:
+        dict: the backup path, and the number of pairs reordered and
+        duplicate comparisons removed.
+    """
+    backup = '{}.{}.bak'.format(path, time.strftime('%Y%m%d%H%M%S'))
+    conn = sqlite3.connect(path, timeout=10)
+    try:
+        b = sqlite3.connect(backup)
+        conn.backup(b)
+        b.close()
+        with conn:
+            conn.execute("DROP INDEX IF EXISTS comparison_pair;")
+            reordered = conn.execute("""UPDATE comparison
+                                        SET label_one_id=label_two_id, label_two_id=label_one_id
+                                        WHERE label_one_id > label_two_id;""").rowcount
+            removed = conn.execute("""DELETE FROM comparison WHERE id NOT IN (
+                                          SELECT MIN(id) FROM comparison
+                                          GROUP BY label_one_id, label_two_id
+                                      );""").rowcount
+        conn.executescript(INDEXES)
+    finally:
+        conn.close()
+    return {'backup': backup, 'reordered': reordered, 'removed': removed}
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Add indexes to an older database, see migrate()."""
+    result = migrate(app.config['DATABASE'])
+    print('backed up to {}.'.format(result['backup']))
+    print('reordered {} pairs, removed {} duplicate comparisons.'.format(
+        result['reordered'], result['removed']))
 
 def all_labels():
-    conn = sqlite3.connect(
-        os.path.join(
-            os.path.dirname(os.path.abspath(__file__)),
-            'insightmatrix.db'
-        )
-    )
-    cur = conn.cursor()
-    cur.execute("SELECT label.label FROM label;")
-    labels = []
-    for label in cur.fetchall():
-        labels.append(label[0])
-    conn.close()
-    return labels
+    cur = get_db().execute("SELECT label FROM label ORDER BY id;")
+    return [label[0] for label in cur.fetchall()]
 
 def all_comparisons():
-    conn = sqlite3.connect(
-        os.path.join(
-            os.path.dirname(os.path.abspath(__file__)),
-            'insightmatrix.db'
-        )
-    )
-    cur = conn.cursor()
-    cur.execute("""SELECT label_one.label, label_two.label, comparison.comparison
-                   FROM comparison 
-                   JOIN label label_one 
-                   ON comparison.label_one_id=label_one.id 
-                   JOIN label label_two 
-                   ON comparison.label_two_id=label_two.id;""")
-    comparisons = []
-    for c in cur.fetchall():
-        comparisons.append((c[0], c[1], c[2]))
-    conn.close()
-    return comparisons
+    cur = get_db().execute("""SELECT label_one.label, label_two.label, comparison.comparison
+                              FROM comparison
+                              JOIN label label_one
+                              ON comparison.label_one_id=label_one.id
+                              JOIN label label_two
+                              ON comparison.label_two_id=label_two.id;""")
+    return [(c[0], c[1], c[2]) for c in cur.fetchall()]
+
+def count_comparisons():
+    """Count the pairs that have been compared, in either order, so pairs
+    stored twice in databases that haven't been migrated count once."""
+    return get_db().execute("""SELECT COUNT(*) FROM (
+                                   SELECT DISTINCT MIN(label_one_id, label_two_id), MAX(label_one_id, label_two_id)
+                                   FROM comparison
+                               );""").fetchone()[0]
 
 def add_comparison(label_one, label_two, comparison):
-    conn = sqlite3.connect(
-        os.path.join(
-            os.path.dirname(os.path.abspath(__file__)),
-            'insightmatrix.db'
+    """Add a comparison, unless the pair has been compared already.
+
+    Notes:
+        Pairs are stored with the lower label id first, so the unique index
+        on the pair catches comparisons in either order. The check for an
+        existing pair also looks for the other order, for databases that
+        haven't been migrated, and takes the write lock first so two
+        processes can't both pass it.
+    """
+    conn = get_db()
+    conn.execute("BEGIN IMMEDIATE;")
+    with conn:
+        conn.execute("""INSERT OR IGNORE INTO comparison (id, label_one_id, label_two_id, comparison)
+                        SELECT NULL, MIN(label_one.id, label_two.id), MAX(label_one.id, label_two.id), ?
+                        FROM label label_one, label label_two
+                        WHERE label_one.label=? AND label_two.label=?
+                        AND NOT EXISTS (
+                            SELECT 1 FROM comparison
+                            WHERE (label_one_id=label_one.id AND label_two_id=label_two.id)
+                            OR (label_one_id=label_two.id AND label_two_id=label_one.id)
+                        );""",
+            (comparison, label_one, label_two)
         )
-    )
-    cur = conn.cursor()
-    cur.execute("""INSERT INTO comparison (id, label_one_id, label_two_id, comparison)
-                   SELECT NULL, label_one.id, label_two.id, ?
-                   FROM label label_one, label label_two
-                   WHERE label_one.label=? AND label_two.label=?;""", 
-        (comparison, label_one, label_two)
-    )
-    conn.commit()
-    conn.close()
 
 # Display the current state of the matrix on the homepage. (look at this part
 # on a projector.)
@@ -70,34 +161,14 @@ def home():
 # smartphones.)
 @app.route('/compare', methods=['GET', 'POST'])
 def compare():
-    conn = sqlite3.connect(
-        os.path.join(
-            os.path.dirname(os.path.abspath(__file__)),
-            'insightmatrix.db'
-        )
-    )
-    cur = conn.cursor()
-
-    def all_comparisons_present():
-        return len(all_comparisons()) == sum([i + 1 for i in range(len(all_labels()))])
-
-    def comparison_present(label_one, label_two):
-        for c in all_comparisons():
-            if c[0] == request.form.get('label_one') and c[1] == request.form.get('label_two'):
-                return True
-            if c[0] == request.form.get('label_two') and c[1] == request.form.get('label_one'):
-                return True
-        return False
- 
     if request.method == 'POST':
-        if not comparison_present(request.form.get('label_one'), request.form.get('label_two')):
-            add_comparison(request.form.get('label_one'), request.form.get('label_two'), request.form.get('comparison'))
+        add_comparison(request.form.get('label_one'), request.form.get('label_two'), request.form.get('comparison'))
 
-    if all_comparisons_present():
+    labels = all_labels()
+    if count_comparisons() >= len(labels) * (len(labels) + 1) // 2:
         return render_template('compare_no_more_comparisons.html')
     else:
         m = Matrix()
-        labels = all_labels()
 
         # m.import_labels(labels, labels)
 
@@ -107,9 +178,11 @@ def compare():
             for label_two in labels:
                 comparisons.add((label_one, label_two))
 
-        # remove the comparisons that are present in the database.
+        # remove the comparisons that are present in the database, in
+        # either order.
         for c in all_comparisons():
             comparisons.discard((c[0], c[1]))
+            comparisons.discard((c[1], c[0]))
 
         # select two remaining elements at random.
         comparisons = list(comparisons)
@@ -160,12 +233,7 @@ def reset():
         'peaches', 'strawberries', 'raspberries', 'grapes', 'figs',
         'cherries']
 
-    conn = sqlite3.connect(
-        os.path.join(
-            os.path.dirname(os.path.abspath(__file__)),
-            'insightmatrix.db'
-        )
-    )
+    conn = get_db()
     c = conn.cursor()
     c.execute("DROP TABLE IF EXISTS test;")
     c.execute("""CREATE TABLE test (
@@ -190,18 +258,13 @@ def reset():
                      FOREIGN KEY(label_one_id) REFERENCES label (id), 
                      FOREIGN KEY(label_two_id) REFERENCES label (id)
                  );""")
-    conn.commit()
-    c.execute("INSERT INTO test (id) VALUES (?);", (1,))
-    conn.commit()
-    for l in labels:
-        c.execute("INSERT INTO label (id, label, test_id) VALUES (?, ?, ?);", (None, l, 1))
-    conn.commit()
-
-    for l in labels:
-        c.execute("INSERT INTO comparison (id, label_one_id, label_two_id, comparison) SELECT NULL, id, id, 3 FROM label WHERE label='{}';".format(l))
-    conn.commit()
-
-    conn.close()
+    c.executescript(INDEXES)
+    with conn:
+        c.execute("INSERT INTO test (id) VALUES (?);", (1,))
+        c.executemany("INSERT INTO label (id, label, test_id) VALUES (?, ?, ?);",
+            [(None, l, 1) for l in labels])
+        c.execute("""INSERT INTO comparison (id, label_one_id, label_two_id, comparison)
+                     SELECT NULL, id, id, 3 FROM label;""")
     return render_template('reset.html')
 
 